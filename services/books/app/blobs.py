@@ -0,0 +1,116 @@
+"""Content addressed blobs store on the local file system."""
+import os
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+
+BLOBS_DIRECTORY = os.environ.get("BLOBS_DIRECTORY", "data/blobs")
+READ_CHUNK_SIZE = 64 * 1024
+
+# Magic bytes prefix -> media type, of the supported images formats.
+IMAGES_SIGNATURES = ((b"\xff\xd8\xff", "image/jpeg"),
+                     (b"\x89PNG\r\n\x1a\n", "image/png"),
+                     (b"GIF87a", "image/gif"),
+                     (b"GIF89a", "image/gif"))
+
+
+def get_image_media_type(content):
+    """Get the media type of image by its magic bytes.
+
+    Args:
+        content (bytes): Image content (or its first bytes).
+
+    Returns:
+        str. Media type, None if the format is not supported.
+    """
+    for signature, media_type in IMAGES_SIGNATURES:
+        if content.startswith(signature):
+            return media_type
+
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class BlobStore:
+    """Blobs stored in files named by their SHA-256 hash.
+
+    Attributes:
+        directory (str): Store root directory.
+
+    Notes:
+        Equal contents are stored once, and a stored blob never changes, so
+        the hash can be used as its ETag.
+    """
+
+    def __init__(self, directory=BLOBS_DIRECTORY):
+        self.directory = directory
+
+    def get_path(self, blob_hash):
+        """Get the file path of a blob.
+
+        Args:
+            blob_hash (str): Blob SHA-256 hex digest.
+
+        Returns:
+            str. Blob file path.
+        """
+        return os.path.join(self.directory, blob_hash[:2], blob_hash)
+
+    def put(self, content):
+        """Store blob.
+
+        Args:
+            content (bytes): Blob content.
+
+        Returns:
+            str. Blob SHA-256 hex digest.
+        """
+        blob_hash = sha256(content).hexdigest()
+        path = self.get_path(blob_hash)
+        if os.path.exists(path):
+            return blob_hash
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to temporary file and renamed, so readers never see a
+        # partial blob.
+        with NamedTemporaryFile(dir=os.path.dirname(path),
+                                delete=False) as blob_file:
+            blob_file.write(content)
+        os.replace(blob_file.name, path)
+        return blob_hash
+
+    def get_size(self, blob_hash):
+        """Get blob size in bytes, None if it does not exist."""
+        try:
+            return os.path.getsize(self.get_path(blob_hash))
+
+        except FileNotFoundError:
+            return None
+
+    def read(self, blob_hash, start=0, end=None):
+        """Iterate blob content in chunks.
+
+        Args:
+            blob_hash (str): Blob SHA-256 hex digest.
+            start (int): First byte offset.
+            end (int): Last byte offset (inclusive), None for the blob end.
+
+        Returns:
+            generator. Content chunks (bytes).
+        """
+        with open(self.get_path(blob_hash), "rb") as blob_file:
+            blob_file.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = READ_CHUNK_SIZE if remaining is None else \
+                    min(READ_CHUNK_SIZE, remaining)
+                chunk = blob_file.read(size)
+                if not chunk:
+                    break
+
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+blobs = BlobStore()
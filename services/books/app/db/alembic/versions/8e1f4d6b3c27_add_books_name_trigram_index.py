@@ -0,0 +1,27 @@
+"""Add books name trigram index
+
+Revision ID: 8e1f4d6b3c27
+Revises: 5b7e0c2a9d41
+Create Date: 2026-10-18 14:09:45.113562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1f4d6b3c27'
+down_revision = '5b7e0c2a9d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_books_name_trgm', 'books', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_books_name_trgm', table_name='books')
@@ -0,0 +1,85 @@
+"""Move books images to blobs store
+
+Revision ID: c41a7f9e2b58
+Revises: 8e1f4d6b3c27
+Create Date: 2026-10-18 15:21:37.402918
+
+"""
+import os
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a7f9e2b58'
+down_revision = '8e1f4d6b3c27'
+branch_labels = None
+depends_on = None
+
+# NOTE: Duplication of the app blobs store layout, at this revision.
+BLOBS_DIRECTORY = os.environ.get("BLOBS_DIRECTORY", "data/blobs")
+# Books read per query, so the images are never loaded at once.
+BATCH_SIZE = 100
+
+
+def get_blob_path(blob_hash):
+    return os.path.join(BLOBS_DIRECTORY, blob_hash[:2], blob_hash)
+
+
+def put_blob(content):
+    """Store blob, written to temporary file and renamed so an interrupted
+    upgrade never leaves a partial blob."""
+    blob_hash = sha256(content).hexdigest()
+    path = get_blob_path(blob_hash)
+    if os.path.exists(path):
+        return blob_hash
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with NamedTemporaryFile(dir=os.path.dirname(path),
+                            delete=False) as blob_file:
+        blob_file.write(content)
+    os.replace(blob_file.name, path)
+    return blob_hash
+
+
+def iter_books(connection, column):
+    """Iterate (id, column) of the books the column is set for, in batches
+    by id."""
+    query = sa.text(f"SELECT id, {column} FROM books WHERE {column} IS NOT "
+                    f"NULL AND id > :after_id ORDER BY id LIMIT :limit")
+    after_id = -1
+    while True:
+        books = connection.execute(query, after_id=after_id,
+                                   limit=BATCH_SIZE).fetchall()
+        yield from books
+        if len(books) < BATCH_SIZE:
+            return
+        after_id = books[-1][0]
+
+
+def upgrade():
+    op.add_column('books', sa.Column('image_hash', sa.String(length=64),
+                                     nullable=True))
+    connection = op.get_bind()
+    for id, image in iter_books(connection, "image"):
+        connection.execute(sa.text("UPDATE books SET image_hash = :hash "
+                                   "WHERE id = :id"),
+                           hash=put_blob(image), id=id)
+
+    op.drop_column('books', 'image')
+
+
+def downgrade():
+    op.add_column('books', sa.Column('image', sa.LargeBinary(),
+                                     nullable=True))
+    connection = op.get_bind()
+    for id, image_hash in iter_books(connection, "image_hash"):
+        with open(get_blob_path(image_hash), "rb") as blob_file:
+            connection.execute(sa.text("UPDATE books SET image = :image "
+                                       "WHERE id = :id"),
+                               image=blob_file.read(), id=id)
+
+    op.drop_column('books', 'image_hash')
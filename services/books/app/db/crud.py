@@ -1,21 +1,73 @@
 """Books CRUD db operations."""
+import os
+from collections import defaultdict
 
-from app.db.tables import Book
+from sqlalchemy import select, update, delete, and_, or_, join, literal
+from sqlalchemy.dialects.postgresql import insert
 
+from app.db.tables import Book, FeedUser, FeedItem
+from app.geo import get_bounding_box
 
-def get_all_books(session):
-    """Get all books from DB.
+# Book response fields.
+BOOK_COLUMNS = (Book.id, Book.name, Book.author, Book.user_id,
+                Book.description, Book.publication_date, Book.categories_ids)
+# Rows fetched from the server side cursor per round trip when streaming.
+STREAM_BATCH_SIZE = 1000
+# Books per INSERT statement, bounded by the statement parameters limit.
+INSERT_BATCH_SIZE = 1000
+# Books of the users in this radius (KM) are in the user feed.
+FEED_RADIUS = float(os.environ.get("FEED_RADIUS", "10"))
+MIN_DB_INTEGER, MAX_DB_INTEGER = -2 ** 31, 2 ** 31 - 1
+
+
+def _escape_like(text: str):
+    """Escape LIKE wildcards, so the text is matched literally."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace(
+        "_", "\\_")
+
+
+def _is_db_integer(value):
+    """Check if value is in the Integer columns range, the async driver
+    can't bind integers out of it."""
+    return MIN_DB_INTEGER <= value <= MAX_DB_INTEGER
+
+
+def _list_books(query, limit=None, after_id=None, stream=False):
+    """Get a page of books query rows, ordered by id.
 
     Args:
-       session (Session): DB session.
+        query (Query): Books columns query.
+        limit (int): Max amount of books, None for no limit.
+        after_id (int): Get only books after this id (keyset pagination).
+        stream (bool): Iterate the rows from a server side cursor in batches
+            instead of loading all of them.
 
     Returns:
-        list. Book objects.
+        list. Books rows (or iterator of them when streaming).
+    """
+    if after_id is not None:
+        query = query.filter(Book.id > after_id)
 
-    Notes:
-        Internal endpoint for tests.
+    query = query.order_by(Book.id).limit(limit)
+    if stream:
+        return iter(query.yield_per(STREAM_BATCH_SIZE))
+    return query.all()
+
+
+def get_all_books(session, limit=None, after_id=None, stream=False):
+    """Get all books from DB, without their images.
+
+    Args:
+       session (Session): DB session.
+       limit (int): Max amount of books.
+       after_id (int): Get only books after this id.
+       stream (bool): Iterate the books in batches.
+
+    Returns:
+        list. Books rows ordered by id.
     """
-    return session.query(Book).all()
+    return _list_books(session.query(*BOOK_COLUMNS), limit, after_id,
+                       stream)
 
 
 def add_book(session, name, author, user_id, description, publication_date,
@@ -35,12 +87,44 @@ def add_book(session, name, author, user_id, description, publication_date,
                     categories_ids=categories_ids)
 
     session.add(new_book)
+    # Generating the id, for the feeds items.
+    session.flush()
+    _add_books_to_feeds(session, user_id, [new_book.id])
     session.commit()
     # Retrieving new data like generated id.
     session.refresh(new_book)
     return new_book
 
 
+def insert_books(session, books):
+    """Insert many books and commit them together.
+
+    Args:
+        session (Session): DB session.
+        books (list): Books columns dicts.
+
+    Returns:
+        list. Generated ids, in the order of the books.
+
+    Notes:
+        Uses multi-row INSERT ... RETURNING, PostgreSQL returns the rows in
+        the VALUES order.
+    """
+    ids = []
+    for start in range(0, len(books), INSERT_BATCH_SIZE):
+        ids.extend(id for id, in session.execute(
+            insert(Book).values(books[start:start + INSERT_BATCH_SIZE])
+            .returning(Book.id)))
+
+    owners_books = defaultdict(list)  # user id -> books ids
+    for book, id in zip(books, ids):
+        owners_books[book["user_id"]].append(id)
+    for user_id, books_ids in owners_books.items():
+        _add_books_to_feeds(session, user_id, books_ids)
+    session.commit()
+    return ids
+
+
 def delete_book(session, id: int):
     """Delete specific book.
 
@@ -51,13 +135,11 @@ def delete_book(session, id: int):
     Returns:
         bool. If the book was found and deleted or not.
     """
-    book = session.query(Book).filter_by(id=id).first()
-    if book is None:
-        return False
-
-    session.delete(book)
+    deleted = session.query(Book).filter(Book.id == id).delete(
+        synchronize_session=False)
+    session.execute(delete(FeedItem).where(FeedItem.book_id == id))
     session.commit()
-    return True
+    return deleted > 0
 
 
 def get_book_by_id(session, id: str):
@@ -68,47 +150,290 @@ def get_book_by_id(session, id: str):
         session (Session): DB session.
 
     Returns:
-        Book. Founded book.
+        tuple. Founded book row.
     """
-    return session.query(Book).filter_by(id=id).first()
+    return session.query(*BOOK_COLUMNS).filter(Book.id == id).first()
 
 
-def get_books_by_user_id(session, user_id: str):
-    """Get specific book by user_id.
+def get_books_by_user_id(session, user_id: int, limit=None, after_id=None,
+                         stream=False):
+    """Get user books, without their images.
 
     Args:
         user_id (int): User id.
         session (Session): DB session.
+        limit (int): Max amount of books.
+        after_id (int): Get only books after this id.
+        stream (bool): Iterate the books in batches.
 
     Returns:
-        Book. Founded books.
+        list. Founded books rows ordered by id.
     """
-    return session.query(Book).filter_by(user_id=user_id).all()
+    query = session.query(*BOOK_COLUMNS).filter(Book.user_id == user_id)
+    return _list_books(query, limit, after_id, stream)
 
 
-def get_category_books_by_user_id(session, user_id: str, category_id: list):
-    """Get specific book by user_id.
+def get_category_books_by_user_id(session, user_id: int, category_id: list,
+                                  limit=None, after_id=None, stream=False):
+    """Get user books of specific categories, without their images.
 
     Args:
         user_id (int): User id.
         session (Session): DB session.
-        category_id (int): Specific category id.
+        category_id (list): Categories ids the books should have.
+        limit (int): Max amount of books.
+        after_id (int): Get only books after this id.
+        stream (bool): Iterate the books in batches.
 
     Returns:
-        Book. Founded books.
+        list. Founded books rows ordered by id.
     """
-    return session.query(Book).filter_by(user_id=user_id).filter(
-        Book.categories_ids.contains(category_id)).all()
+    query = session.query(*BOOK_COLUMNS).filter(
+        Book.user_id == user_id, Book.categories_ids.contains(category_id))
+    return _list_books(query, limit, after_id, stream)
 
 
-def get_books_by_name(session, filter: str):
+def get_books_by_name(session, filter: str, limit=None, after_id=None,
+                      stream=False):
     """Get all books that match to specific name filter from DB.
 
     Args:
-        filter (str): Contains filter.
+        filter (str): Contains filter (case insensitive).
         session (Session): Current DB session.
+        limit (int): Max amount of books.
+        after_id (int): Get only books after this id.
+        stream (bool): Iterate the books in batches.
 
     Returns:
-        list. Filtered books.
+        list. Filtered books rows ordered by id.
+
+    Notes:
+        ILIKE is served by the name trigram index.
+    """
+    query = session.query(*BOOK_COLUMNS).filter(Book.name.ilike(
+        f"%{_escape_like(filter)}%", escape="\\"))
+    return _list_books(query, limit, after_id, stream)
+
+
+async def fetch_book_by_id(database, id: int):
+    """Get specific book by id, without its image (async).
+
+    Args:
+        id (int): Book id.
+        database (Database): Async DB connections pool.
+
+    Returns:
+        Record. Founded book row.
+    """
+    if not _is_db_integer(id):
+        return None
+    return await database.fetch_one(select(BOOK_COLUMNS).where(Book.id == id))
+
+
+def get_books_by_name_prefix(session, prefix: str, limit=None, after_id=None,
+                             stream=False):
+    """Get all books that their name starts with a prefix from DB.
+
+    Args:
+        prefix (str): Name prefix (case insensitive).
+        session (Session): Current DB session.
+        limit (int): Max amount of books.
+        after_id (int): Get only books after this id.
+        stream (bool): Iterate the books in batches.
+
+    Returns:
+        list. Filtered books rows ordered by id.
+    """
+    query = session.query(*BOOK_COLUMNS).filter(Book.name.ilike(
+        f"{_escape_like(prefix)}%", escape="\\"))
+    return _list_books(query, limit, after_id, stream)
+
+
+async def fetch_book_image_hash(database, id: int):
+    """Get the blob hash of a book image (async).
+
+    Args:
+        id (int): Book id.
+        database (Database): Async DB connections pool.
+
+    Returns:
+        str. Image blob hash, None if the book or its image were not found.
+    """
+    if not _is_db_integer(id):
+        return None
+    return await database.fetch_val(select([Book.image_hash]).where(
+        Book.id == id))
+
+
+async def update_book_image_hash(database, id: int, image_hash: str):
+    """Set the blob hash of a book image (async).
+
+    Args:
+        id (int): Book id.
+        image_hash (str): Image blob hash.
+        database (Database): Async DB connections pool.
+
+    Returns:
+        bool. If the book was found and updated or not.
+    """
+    if not _is_db_integer(id):
+        return False
+
+    updated_id = await database.fetch_val(
+        update(Book).where(Book.id == id).values(image_hash=image_hash)
+        .returning(Book.id))
+    return updated_id is not None
+
+
+def _in_bounding_box(latitude: float, longitude: float, radius: float):
+    """Get filter of the feed users inside the bounding box of a circle.
+
+    Args:
+        radius (float): Radius in KM.
+        latitude (float): Circle center latitude.
+        longitude (float): Circle center longitude.
+    """
+    min_latitude, max_latitude, min_longitude, max_longitude = \
+        get_bounding_box(latitude, longitude, radius)
+    latitude_filter = FeedUser.latitude.between(min_latitude, max_latitude)
+
+    if min_longitude <= max_longitude:
+        return and_(latitude_filter,
+                    FeedUser.longitude.between(min_longitude, max_longitude))
+
+    # The box crosses the 180th meridian.
+    return and_(latitude_filter, or_(FeedUser.longitude >= min_longitude,
+                                     FeedUser.longitude <= max_longitude))
+
+
+def _add_books_to_feeds(session, user_id: int, books_ids: list = None):
+    """Add books of an owner to the feeds of the users around.
+
+    Args:
+        session (Session): DB session.
+        user_id (int): Books owner id.
+        books_ids (list): Books ids, all the owner books when not given.
+
+    Notes:
+        Not committed. Books of owners that are not replicated yet are added
+        when the owner is.
+    """
+    owner = session.query(FeedUser.latitude, FeedUser.longitude).filter(
+        FeedUser.id == user_id).first()
+    if owner is None:
+        return
+
+    books_filter = Book.user_id == user_id
+    if books_ids is not None:
+        books_filter = and_(books_filter, Book.id.in_(books_ids))
+    items = select([FeedUser.id, Book.id]).where(and_(
+        books_filter, FeedUser.id != user_id,
+        _in_bounding_box(owner.latitude, owner.longitude, FEED_RADIUS),
+        FeedUser.in_range(owner.latitude, owner.longitude, FEED_RADIUS) <=
+        FEED_RADIUS,
+        FeedUser.categories_ids.overlap(Book.categories_ids)))
+    session.execute(insert(FeedItem).from_select(
+        [FeedItem.user_id, FeedItem.book_id], items).on_conflict_do_nothing())
+
+
+def update_feed_user(session, id: int, latitude: float, longitude: float,
+                     categories_ids: list):
+    """Add or update replicated user, and rebuild the user feed.
+
+    Args:
+        session (Session): DB session.
+        id (int): User id.
+        latitude (float): User location latitude.
+        longitude (float): User location longitude.
+        categories_ids (list): User categories ids.
+
+    Notes:
+        Only the user feed is rebuilt, the user books are added to the other
+        users feeds when the user is new or moved.
+    """
+    previous = session.query(FeedUser.latitude, FeedUser.longitude).filter(
+        FeedUser.id == id).first()
+    values = {"latitude": latitude, "longitude": longitude,
+              "categories_ids": categories_ids}
+    session.execute(insert(FeedUser).values(id=id, **values)
+                    .on_conflict_do_update(index_elements=[FeedUser.id],
+                                           set_=values))
+
+    session.execute(delete(FeedItem).where(FeedItem.user_id == id))
+    # The feed users are the books owners here.
+    items = select([literal(id), Book.id]).select_from(join(
+        Book, FeedUser, FeedUser.id == Book.user_id)).where(and_(
+            FeedUser.id != id,
+            _in_bounding_box(latitude, longitude, FEED_RADIUS),
+            FeedUser.in_range(latitude, longitude, FEED_RADIUS) <=
+            FEED_RADIUS,
+            Book.categories_ids.overlap(categories_ids)))
+    session.execute(insert(FeedItem).from_select(
+        [FeedItem.user_id, FeedItem.book_id], items))
+
+    if previous != (latitude, longitude):
+        session.execute(delete(FeedItem).where(FeedItem.book_id.in_(
+            select([Book.id]).where(Book.user_id == id))))
+        _add_books_to_feeds(session, id)
+    session.commit()
+
+
+def get_feed_users_ids(session):
+    """Get the ids of the replicated users.
+
+    Args:
+        session (Session): DB session.
+
+    Returns:
+        list. Users ids.
+    """
+    return [id for id, in session.query(FeedUser.id)]
+
+
+def delete_feed_user(session, id: int):
+    """Delete replicated user, the user feed and books from the feeds.
+
+    Args:
+        session (Session): DB session.
+        id (int): User id.
+
+    Returns:
+        bool. If the user was found and deleted or not.
+    """
+    deleted = session.execute(delete(FeedUser).where(
+        FeedUser.id == id)).rowcount
+    session.execute(delete(FeedItem).where(FeedItem.user_id == id))
+    session.execute(delete(FeedItem).where(FeedItem.book_id.in_(
+        select([Book.id]).where(Book.user_id == id))))
+    session.commit()
+    return deleted > 0
+
+
+def get_feed_books(session, user_id: int, limit=None, after_id=None,
+                   stream=False):
+    """Get the books in the feed of a user, without their images.
+
+    Args:
+        session (Session): DB session.
+        user_id (int): User id.
+        limit (int): Max amount of books, None for no limit.
+        after_id (int): Get only books after this id (keyset pagination).
+        stream (bool): Iterate the rows from a server side cursor.
+
+    Returns:
+        list. Books rows.
+
+    Notes:
+        A range scan of the feed items primary key, joined to the books by
+        their primary key.
     """
-    return session.query(Book).filter(Book.name.contains(filter)).all()
+    query = session.query(*BOOK_COLUMNS).join(
+        FeedItem, FeedItem.book_id == Book.id).filter(
+        FeedItem.user_id == user_id)
+    if after_id is not None:
+        query = query.filter(FeedItem.book_id > after_id)
+
+    query = query.order_by(FeedItem.book_id).limit(limit)
+    if stream:
+        return iter(query.yield_per(STREAM_BATCH_SIZE))
+    return query.all()
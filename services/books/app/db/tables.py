@@ -1,9 +1,16 @@
 """Books service db models."""
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import (Column, Integer, String, ARRAY, LargeBinary, Date)
+from sqlalchemy import (Column, Integer, String, Date, Float, Index, DDL,
+                        event)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.hybrid import hybrid_method
 
 Base = declarative_base()
 
+# Trigram indexes operators, for the name contains search.
+event.listen(Base.metadata, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 
 class Book(Base):
     __tablename__ = 'books'
@@ -11,10 +18,78 @@ class Book(Base):
     name = Column(String, nullable=False)
     author = Column(String, nullable=False)
     user_id = Column(Integer, nullable=False)
-    image = Column(LargeBinary, nullable=True)
+    # SHA-256 of the cover image in the blobs store.
+    image_hash = Column(String(64), nullable=True)
     description = Column(String, nullable=False)
     publication_date = Column(Date, nullable=False)
     id = Column(Integer, primary_key=True, autoincrement=True)
 
+    # The owner index serves the feeds of the books around a user.
+    __table_args__ = (Index('ix_books_name_trgm', 'name',
+                            postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'}),
+                      Index('ix_books_user_id', 'user_id'))
+
+    def __repr__(self):
+        return f"Book ({self.id}), User {self.user_id}: {self.name}"
+
+
+class FeedUser(Base):
+    """Replica of the users locations and categories, for the books feeds.
+
+    Notes:
+        Kept up to date by the users service.
+    """
+    __tablename__ = 'feed_users'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    categories_ids = Column(ARRAY(Integer))
+
+    __table_args__ = (Index('ix_feed_users_latitude_longitude', 'latitude',
+                            'longitude'),
+                      Index('ix_feed_users_categories_ids', 'categories_ids',
+                            postgresql_using='gin'))
+
+    def __repr__(self):
+        return f"Feed user {self.id}"
+
+    @hybrid_method
+    def in_range(self, latitude, longitude, radius):
+        """Check if user in range (radius in KM)."""
+        from ..geo import get_distance
+        return get_distance(self.latitude, self.longitude, latitude,
+                            longitude) <= radius
+
+    @in_range.expression
+    def in_range(cls, latitude, longitude, radius):
+        """Get the user distance (KM) from a location."""
+        from sqlalchemy import func
+        from ..geo import EARTH_RADIUS as R
+        lat1 = func.radians(cls.latitude)
+        lon1 = func.radians(cls.longitude)
+        lat2 = func.radians(latitude)
+        lon2 = func.radians(longitude)
+        dlon = lon2 - lon1
+        dlat = lat2 - lat1
+        a = func.pow(func.sin(dlat / 2), 2) + func.cos(lat1) * func.cos(lat2) \
+            * func.pow(func.sin(dlon / 2), 2)
+        c = R * 2 * func.atan2(func.sqrt(a), func.sqrt(1 - a))
+        return c
+
+
+class FeedItem(Base):
+    """Book in the feed of a user: owned by a user in the feed radius and in
+    one of the user categories.
+
+    Notes:
+        The primary key serves the feed pages, sorted by book id.
+    """
+    __tablename__ = 'feed_items'
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    book_id = Column(Integer, primary_key=True, autoincrement=False)
+
+    __table_args__ = (Index('ix_feed_items_book_id', 'book_id'),)
+
     def __repr__(self):
-        return f"Book ({self.id}), User {self.user_id}: {self.name}"
\ No newline at end of file
+        return f"Feed item, User {self.user_id}: Book {self.book_id}"
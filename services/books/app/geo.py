@@ -0,0 +1,59 @@
+"""Geographic calculations utils."""
+from math import asin, atan2, cos, degrees, radians, sin, sqrt
+
+EARTH_RADIUS = 6373.0  # approximate radius of earth in km
+MIN_LATITUDE, MAX_LATITUDE = -90.0, 90.0
+MIN_LONGITUDE, MAX_LONGITUDE = -180.0, 180.0
+
+
+def get_bounding_box(latitude, longitude, radius):
+    """Get the smallest coordinates box that contains a circle.
+
+    Args:
+        radius (float): Circle radius in KM.
+        latitude (float): Circle center latitude.
+        longitude (float): Circle center longitude.
+
+    Returns:
+        tuple. (min_latitude, max_latitude, min_longitude, max_longitude).
+
+    Notes:
+        When the box crosses the 180th meridian min_longitude is bigger than
+        max_longitude, and the box is the union of the two sides.
+    """
+    angular_radius = radius / EARTH_RADIUS
+    min_latitude = latitude - degrees(angular_radius)
+    max_latitude = latitude + degrees(angular_radius)
+
+    # A pole is inside the circle, all the longitudes are relevant.
+    if min_latitude <= MIN_LATITUDE or max_latitude >= MAX_LATITUDE:
+        return (max(min_latitude, MIN_LATITUDE),
+                min(max_latitude, MAX_LATITUDE),
+                MIN_LONGITUDE, MAX_LONGITUDE)
+
+    longitude_ratio = sin(angular_radius) / cos(radians(latitude))
+    if longitude_ratio >= 1:
+        return min_latitude, max_latitude, MIN_LONGITUDE, MAX_LONGITUDE
+
+    longitude_delta = degrees(asin(longitude_ratio))
+    min_longitude = longitude - longitude_delta
+    max_longitude = longitude + longitude_delta
+    if min_longitude < MIN_LONGITUDE:
+        min_longitude += 360
+    if max_longitude > MAX_LONGITUDE:
+        max_longitude -= 360
+    return min_latitude, max_latitude, min_longitude, max_longitude
+
+
+def get_distance(base_latitude, base_longitude, target_latitude,
+                 target_longitude):
+    """Get distance between two coordinates in KM (haversine formula)."""
+    lat1 = radians(base_latitude)
+    lon1 = radians(base_longitude)
+    lat2 = radians(target_latitude)
+    lon2 = radians(target_longitude)
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS * c
@@ -0,0 +1,127 @@
+"""Bulk books ingestion from NDJSON."""
+import os
+import logging
+
+from pydantic import ValidationError
+from sqlalchemy.exc import DataError, SQLAlchemyError
+
+from .db.crud import insert_books
+from .schemas import NewBookRequest
+
+# Books committed together, a failure rolls back only the current chunk.
+INGESTION_CHUNK_SIZE = int(os.environ.get("INGESTION_CHUNK_SIZE", "5000"))
+LINE_SEPARATOR = b"\n"
+
+logger = logging.getLogger(__name__)
+
+
+async def iter_lines(chunks):
+    """Split async stream of bytes chunks to text lines.
+
+    Args:
+        chunks (AsyncIterable): Bytes chunks, like request body stream.
+
+    Returns:
+        AsyncGenerator. Lines (str) without the line separator.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(LINE_SEPARATOR)
+        for line in lines:
+            yield line.decode(errors="replace")
+
+    if buffer:
+        yield buffer.decode(errors="replace")
+
+
+class BooksIngestion:
+    """Bulk books ingestion state: parsing, chunks and report.
+
+    Attributes:
+        resume_from (int): First input line to ingest, the previous lines
+            were committed by a failed ingestion.
+        chunk_size (int): Books committed together.
+        books (list): (line number, id) tuples of the committed books.
+        errors (list): (line number, error) tuples of the skipped lines.
+        failed_line (int): First line of the chunk that failed to commit,
+            None if nothing failed.
+    """
+
+    def __init__(self, resume_from=1, chunk_size=INGESTION_CHUNK_SIZE):
+        self.resume_from = resume_from
+        self.chunk_size = chunk_size
+        self.books = []
+        self.errors = []
+        self.failed_line = None
+        self._line_number = 0
+        self._chunk = []  # (line number, book columns) tuples
+
+    def add_line(self, line):
+        """Parse and validate input line.
+
+        Args:
+            line (str): Book JSON line.
+
+        Returns:
+            bool. If the chunk is full and should be committed.
+        """
+        self._line_number += 1
+        if self._line_number < self.resume_from or not line.strip():
+            return False
+
+        try:
+            book = NewBookRequest.parse_raw(line)
+            self._chunk.append((self._line_number, book.dict()))
+
+        except ValidationError as error:
+            self.errors.append((self._line_number, "; ".join(
+                f"{'.'.join(map(str, field_error['loc']))}: "
+                f"{field_error['msg']}" for field_error in error.errors())))
+
+        return len(self._chunk) >= self.chunk_size
+
+    def commit_chunk(self, session):
+        """Insert and commit the parsed books chunk.
+
+        Returns:
+            bool. If the chunk was committed, on failure the ingestion
+            should stop.
+        """
+        chunk, self._chunk = self._chunk, []
+        return self._commit(session, chunk)
+
+    def _commit(self, session, chunk):
+        """Commit books, isolating the books the DB rejects by bisection."""
+        if not chunk:
+            return True
+
+        try:
+            ids = insert_books(session, [book for _, book in chunk])
+
+        # The driver rejects NUL characters with ValueError, before the DB.
+        except (DataError, ValueError) as error:
+            session.rollback()
+            if len(chunk) == 1:
+                reason = str(getattr(error, "orig", error)).strip()
+                self.errors.append((chunk[0][0], "Book was rejected: " +
+                                    reason.splitlines()[0]))
+                return True
+
+            middle = len(chunk) // 2
+            return self._commit(session, chunk[:middle]) and \
+                self._commit(session, chunk[middle:])
+
+        except SQLAlchemyError:
+            logger.exception("Books ingestion failed, from line %d",
+                             chunk[0][0])
+            session.rollback()
+            self.failed_line = chunk[0][0]
+            # Errors of the lines that will be sent again are reported again.
+            self.errors = [error for error in self.errors
+                           if error[0] < self.failed_line]
+            return False
+
+        self.books.extend(zip((line_number for line_number, _ in chunk),
+                              ids))
+        return True
@@ -1,14 +1,415 @@
 """Books service app."""
-from fastapi import FastAPI, Depends, HTTPException
+import os
+import re
+from typing import List
+
+from fastapi import (FastAPI, Response, HTTPException, Query, Depends,
+                     Request)
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse, JSONResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from starlette.status import (HTTP_200_OK, HTTP_404_NOT_FOUND,
+                              HTTP_400_BAD_REQUEST, HTTP_304_NOT_MODIFIED,
+                              HTTP_206_PARTIAL_CONTENT,
+                              HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                              HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                              HTTP_503_SERVICE_UNAVAILABLE)
 
 from .db.tables import Base
-from .db.config import transaction, engine
+from .blobs import blobs, get_image_media_type
+from .ingestion import BooksIngestion, iter_lines
+from .schemas import (BookResponse, BooksPage, IngestionReport, IngestedBook,
+                      IngestionLineError, FeedUserRequest)
+from .pagination import encode_cursor, decode_cursor
+from .metrics import MetricsMiddleware
+from .db.config import engine, database, transaction, Session
+from .db.crud import (fetch_book_by_id, get_all_books, get_books_by_user_id,
+                      get_category_books_by_user_id, get_books_by_name,
+                      get_books_by_name_prefix, fetch_book_image_hash,
+                      update_book_image_hash, get_feed_books,
+                      update_feed_user, delete_feed_user,
+                      get_feed_users_ids)
+
 
+BOOKS_DEFAULT_LIMIT = 50
+BOOKS_MAX_LIMIT = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+BOOK_IMAGE_MAX_SIZE = int(os.environ.get("BOOK_IMAGE_MAX_SIZE",
+                                         str(5 * 1024 * 1024)))  # Bytes.
+# Bytes needed to recognize the image format.
+IMAGE_SIGNATURE_SIZE = 12
+RANGE_REGEX = re.compile(r"bytes=(\d*)-(\d*)")
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics")
+def metrics():
+    """Runtime metrics in Prometheus text format."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initiating DB."""
     Base.metadata.create_all(engine)
+    await database.connect()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Closing async DB connections."""
+    await database.disconnect()
+
+
+def to_book_response(book):
+    """Create response of book row."""
+    return BookResponse(id=book["id"], name=book["name"],
+                        author=book["author"], user_id=book["user_id"],
+                        description=book["description"],
+                        publication_date=book["publication_date"],
+                        categories_ids=book["categories_ids"] or [])
+
+
+@app.get("/book/{id}", response_model=BookResponse, status_code=HTTP_200_OK)
+async def get_book(id: int):
+    """Get book by id.
+
+    Args:
+        id (int): Book id.
+    """
+    book = await fetch_book_by_id(database, id)
+    if book is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND,
+                            detail="Book was not found.")
+    return to_book_response(book)
+
+
+def decode_after_id(cursor):
+    """Get the last returned book id of a page cursor."""
+    if cursor is None:
+        return None
+
+    try:
+        return decode_cursor(cursor, keys_amount=1)[0]
+
+    except ValueError:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Cursor is invalid.")
+
+
+def stream_books(get_books, *args, after_id=None):
+    """Generate NDJSON lines of all the books after id.
+
+    Args:
+        get_books (function): Books listing CRUD function.
+        args (tuple): CRUD function arguments after the session.
+        after_id (int): Stream only books after this id.
+
+    Notes:
+        The generator outlives the request handler, so it uses its own
+        session, closed when the response is done.
+    """
+    session = Session()
+    try:
+        for book in get_books(session, *args, after_id=after_id,
+                              stream=True):
+            yield to_book_response(book._asdict()).json() + "\n"
+
+    finally:
+        session.close()
+
+
+def list_books(get_books, *args, session, limit, cursor, stream):
+    """Create page of books or stream of all of them.
+
+    Args:
+        get_books (function): Books listing CRUD function.
+        args (tuple): CRUD function arguments after the session.
+        session (Session): DB session.
+        limit (int): Max amount of books in the page.
+        cursor (str): Next page cursor from the previous page.
+        stream (bool): Stream all the books after the cursor as NDJSON.
+    """
+    after_id = decode_after_id(cursor)
+    if stream:
+        return StreamingResponse(stream_books(get_books, *args,
+                                              after_id=after_id),
+                                 media_type=NDJSON_MEDIA_TYPE)
+
+    # Fetching one more book to know if there is a next page.
+    books = get_books(session, *args, limit=limit + 1, after_id=after_id)
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_cursor(books[-1].id)
+
+    return BooksPage(books=[to_book_response(book._asdict())
+                            for book in books],
+                     next_cursor=next_cursor)
+
+
+@app.get("/books", response_model=BooksPage)
+def get_books(limit: int = Query(BOOKS_DEFAULT_LIMIT, gt=0,
+                                 le=BOOKS_MAX_LIMIT),
+              cursor: str = None, stream: bool = False,
+              session=Depends(transaction)):
+    """Get all books, sorted by id.
+
+    Args:
+        limit (int): Max amount of books in the page.
+        cursor (str): Next page cursor from the previous page.
+        stream (bool): Stream all the books after the cursor as NDJSON.
+        session (Session): DB session.
+    """
+    return list_books(get_all_books, session=session, limit=limit,
+                      cursor=cursor, stream=stream)
+
+
+@app.get("/books/search", response_model=BooksPage)
+def search_books(filter: str = None, prefix: str = None,
+                 limit: int = Query(BOOKS_DEFAULT_LIMIT, gt=0,
+                                    le=BOOKS_MAX_LIMIT),
+                 cursor: str = None, stream: bool = False,
+                 session=Depends(transaction)):
+    """Get books by name, sorted by id.
+
+    Args:
+        filter (str): Text the name should contain (case insensitive).
+        prefix (str): Text the name should start with (case insensitive).
+        limit (int): Max amount of books in the page.
+        cursor (str): Next page cursor from the previous page.
+        stream (bool): Stream all the books after the cursor as NDJSON.
+        session (Session): DB session.
+    """
+    if (filter is None) == (prefix is None):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Either filter or prefix is required.")
+
+    if filter is not None:
+        return list_books(get_books_by_name, filter, session=session,
+                          limit=limit, cursor=cursor, stream=stream)
+    return list_books(get_books_by_name_prefix, prefix, session=session,
+                      limit=limit, cursor=cursor, stream=stream)
+
+
+@app.get("/users/{user_id}/books", response_model=BooksPage)
+def get_user_books(user_id: int, category_id: int = None,
+                   limit: int = Query(BOOKS_DEFAULT_LIMIT, gt=0,
+                                      le=BOOKS_MAX_LIMIT),
+                   cursor: str = None, stream: bool = False,
+                   session=Depends(transaction)):
+    """Get user books, sorted by id.
+
+    Args:
+        user_id (int): User id.
+        category_id (int): Get only books of this category.
+        limit (int): Max amount of books in the page.
+        cursor (str): Next page cursor from the previous page.
+        stream (bool): Stream all the books after the cursor as NDJSON.
+        session (Session): DB session.
+    """
+    if category_id is None:
+        return list_books(get_books_by_user_id, user_id, session=session,
+                          limit=limit, cursor=cursor, stream=stream)
+    return list_books(get_category_books_by_user_id, user_id, [category_id],
+                      session=session, limit=limit, cursor=cursor,
+                      stream=stream)
+
+
+@app.get("/users/{user_id}/feed", response_model=BooksPage)
+def get_user_feed(user_id: int,
+                  limit: int = Query(BOOKS_DEFAULT_LIMIT, gt=0,
+                                     le=BOOKS_MAX_LIMIT),
+                  cursor: str = None, stream: bool = False,
+                  session=Depends(transaction)):
+    """Get the books near user in the user categories, sorted by id.
+
+    Args:
+        user_id (int): User id.
+        limit (int): Max amount of books in the page.
+        cursor (str): Next page cursor from the previous page.
+        stream (bool): Stream all the books after the cursor as NDJSON.
+        session (Session): DB session.
+
+    Notes:
+        The feed is maintained when books and users change, so reading it
+        is a single indexed query.
+    """
+    return list_books(get_feed_books, user_id, session=session, limit=limit,
+                      cursor=cursor, stream=stream)
+
+
+@app.get("/feed/users", response_model=List[int])
+def get_feed_users(session=Depends(transaction)):
+    """Get the ids of the replicated users, for the users service resync.
+
+    Args:
+        session (Session): DB session.
+    """
+    return get_feed_users_ids(session)
+
+
+@app.put("/feed/users/{id}", status_code=HTTP_200_OK)
+def update_feed_user_data(id: int, user_data: FeedUserRequest,
+                          session=Depends(transaction)):
+    """Replicate added or updated user, called by the users service.
+
+    Args:
+        id (int): User id.
+        user_data (FeedUserRequest): User location and categories.
+        session (Session): DB session.
+    """
+    update_feed_user(session, id, user_data.latitude, user_data.longitude,
+                     user_data.categories_ids)
+
+
+@app.delete("/feed/users/{id}", status_code=HTTP_200_OK)
+def remove_feed_user(id: int, session=Depends(transaction)):
+    """Remove deleted user, called by the users service.
+
+    Args:
+        id (int): User id.
+        session (Session): DB session.
+    """
+    if not delete_feed_user(session, id):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND,
+                            detail="User was not found.")
+
+
+def get_byte_range(range_header, size):
+    """Get the requested bytes range of a content.
+
+    Args:
+        range_header (str): Range header value, like "bytes=0-1023".
+        size (int): Content size in bytes.
+
+    Returns:
+        tuple. (start, end) offsets (inclusive), None for the whole content.
+
+    Notes:
+        Malformed and multiple ranges are ignored, as allowed by RFC 7233,
+        and the whole content is sent.
+    """
+    match = RANGE_REGEX.fullmatch(range_header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+
+    start, end = match.groups()
+    if start == "":  # Suffix range, the last bytes.
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = size - 1 if end == "" else min(int(end), size - 1)
+
+    if start > end:
+        raise HTTPException(
+            status_code=HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range is not satisfiable.",
+            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@app.put("/book/{id}/image", status_code=HTTP_200_OK)
+async def upload_book_image(id: int, request: Request):
+    """Set book cover image, sent as the raw request body.
+
+    Args:
+        id (int): Book id.
+        request (Request): Request with JPEG, PNG, GIF or WebP body.
+    """
+    image = bytearray()
+    async for chunk in request.stream():
+        image.extend(chunk)
+        if len(image) > BOOK_IMAGE_MAX_SIZE:
+            raise HTTPException(status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail="Image is too large.")
+
+    if get_image_media_type(bytes(image[:IMAGE_SIGNATURE_SIZE])) is None:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Image format is not supported.")
+
+    image_hash = await run_in_threadpool(blobs.put, bytes(image))
+    if not await update_book_image_hash(database, id, image_hash):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND,
+                            detail="Book was not found.")
+    return {"image_hash": image_hash}
+
+
+@app.get("/book/{id}/image")
+async def get_book_image(id: int, request: Request):
+    """Get book cover image, supporting single range requests.
+
+    Args:
+        id (int): Book id.
+        request (Request): Request, with optional Range and If-None-Match
+            headers.
+    """
+    image_hash = await fetch_book_image_hash(database, id)
+    size = None if image_hash is None else blobs.get_size(image_hash)
+    if size is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND,
+                            detail="Image was not found.")
+
+    # Blobs never change, so their hash is a strong ETag.
+    headers = {"ETag": f'"{image_hash}"', "Accept-Ranges": "bytes"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+
+    signature = await run_in_threadpool(
+        lambda: next(blobs.read(image_hash, 0, IMAGE_SIGNATURE_SIZE - 1), b""))
+    media_type = get_image_media_type(signature)
+
+    byte_range = None
+    if "range" in request.headers:
+        byte_range = get_byte_range(request.headers["range"], size)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(blobs.read(image_hash), headers=headers,
+                                 media_type=media_type)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(blobs.read(image_hash, start, end),
+                             status_code=HTTP_206_PARTIAL_CONTENT,
+                             headers=headers, media_type=media_type)
+
+
+@app.post("/books/ingest", response_model=IngestionReport)
+async def ingest_books(request: Request, resume_from: int = Query(1, gt=0),
+                       session=Depends(transaction)):
+    """Add books from NDJSON request body, line per book.
+
+    Args:
+        request (Request): Request with books lines body, the books fields
+            are like the book response fields without the id.
+        resume_from (int): First line to add, to send again the input of
+            failed ingestion.
+        session (Session): DB session.
+
+    Notes:
+        The body is streamed and committed in chunks. Books the DB rejects
+        are reported as line errors. When a chunk fails to commit otherwise
+        the ingestion stops, and the response (503) tells the line to resume
+        from.
+    """
+    ingestion = BooksIngestion(resume_from)
+    async for line in iter_lines(request.stream()):
+        if ingestion.add_line(line) and \
+                not await run_in_threadpool(ingestion.commit_chunk, session):
+            break
+    else:
+        await run_in_threadpool(ingestion.commit_chunk, session)
+
+    report = IngestionReport(
+        books=[IngestedBook(line=line, id=id) for line, id in ingestion.books],
+        errors=[IngestionLineError(line=line, error=error)
+                for line, error in sorted(ingestion.errors)],
+        resume_from=ingestion.failed_line)
+    if ingestion.failed_line is not None:
+        return JSONResponse(status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                            content=report.dict())
+    return report
@@ -0,0 +1,41 @@
+"""Keyset pagination cursors."""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+
+
+def encode_cursor(*keys):
+    """Encode the sort keys of the last returned item to opaque cursor.
+
+    Args:
+        keys (tuple): JSON serializable sort keys (like distance and id).
+
+    Returns:
+        str. URL safe cursor.
+    """
+    return urlsafe_b64encode(json.dumps(keys).encode()).decode()
+
+
+def decode_cursor(cursor, keys_amount):
+    """Decode cursor to the sort keys of the last returned item.
+
+    Args:
+        cursor (str): Cursor created by encode_cursor.
+        keys_amount (int): Expected amount of sort keys.
+
+    Returns:
+        tuple. Sort keys.
+
+    Raises:
+        ValueError. The cursor is malformed.
+    """
+    try:
+        keys = json.loads(urlsafe_b64decode(cursor.encode()))
+
+    except (DecodeError, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+    if not isinstance(keys, list) or len(keys) != keys_amount or \
+            not all(isinstance(key, (int, float)) for key in keys):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return tuple(keys)
@@ -1,2 +1,73 @@
 """Books API endpoints models."""
-from pydantic import BaseModel
\ No newline at end of file
+import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, conint, validator
+
+# Integer columns range.
+DBInteger = conint(ge=-2 ** 31, le=2 ** 31 - 1)
+
+
+class NewBookRequest(BaseModel):
+    """New book request."""
+    name: str
+    author: str
+    user_id: DBInteger
+    description: str
+    publication_date: datetime.date
+    categories_ids: List[DBInteger] = []
+
+    @validator("name", "author", "description")
+    def check_no_nul(cls, value):
+        """The DB text columns can't store NUL characters."""
+        if "\x00" in value:
+            raise ValueError("NUL characters are not allowed.")
+        return value
+
+
+class BookResponse(BaseModel):
+    """Book as response."""
+    id: int
+    name: str
+    author: str
+    user_id: int
+    description: str
+    publication_date: datetime.date
+    categories_ids: List[int]
+
+
+class FeedUserRequest(BaseModel):
+    """Replicated user location and categories, from the users service."""
+    latitude: float
+    longitude: float
+    categories_ids: List[int] = []
+
+
+class BooksPage(BaseModel):
+    """Page of books, sorted by id."""
+    books: List[BookResponse]
+    next_cursor: Optional[str]
+
+
+class IngestedBook(BaseModel):
+    """Book that was ingested from input line."""
+    line: int
+    id: int
+
+
+class IngestionLineError(BaseModel):
+    """Skipped input line of books ingestion."""
+    line: int
+    error: str
+
+
+class IngestionReport(BaseModel):
+    """Books ingestion results.
+
+    Notes:
+        When the ingestion failed, resume_from is the first line that was not
+        committed, the same input can be sent again from it.
+    """
+    books: List[IngestedBook]
+    errors: List[IngestionLineError]
+    resume_from: Optional[int]
@@ -0,0 +1,75 @@
+"""Benchmark bulk books ingestion against adding books one by one.
+
+Usage (from the books service directory):
+    python -m benchmarks.bench_ingestion [sizes...]
+"""
+import sys
+import json
+import datetime
+from time import perf_counter
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from testing.postgresql import Postgresql
+
+from app.db.tables import Base
+from app.db.crud import add_book
+from app.ingestion import BooksIngestion
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def create_books(count):
+    """Create books columns dicts."""
+    return [dict(name=f"Book {index}", author="Author", user_id=index % 100,
+                 description="Description",
+                 publication_date=datetime.date(2020, 1, 1),
+                 categories_ids=[1, 2]) for index in range(count)]
+
+
+def add_books_one_by_one(session, books):
+    """Add books like the per-row add_book loop."""
+    for book in books:
+        add_book(session, **book)
+
+
+def ingest_books(session, books):
+    """Add books by the NDJSON ingestion."""
+    ingestion = BooksIngestion()
+    for book in books:
+        line = json.dumps(book, default=str)
+        if ingestion.add_line(line):
+            ingestion.commit_chunk(session)
+    ingestion.commit_chunk(session)
+
+
+def measure(engine, Session, add_books, books):
+    """Get the rows per second of adding books to empty table."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = Session()
+    try:
+        start = perf_counter()
+        add_books(session, books)
+        return len(books) / (perf_counter() - start)
+
+    finally:
+        session.close()
+
+
+def main(sizes):
+    with Postgresql() as database:
+        engine = create_engine(database.url())
+        Session = sessionmaker(bind=engine)
+        print(f"{'books':>10} {'add_book (rows/s)':>18} "
+              f"{'ingestion (rows/s)':>19}")
+        for size in sizes:
+            books = create_books(size)
+            one_by_one = measure(engine, Session, add_books_one_by_one,
+                                 books)
+            ingestion = measure(engine, Session, ingest_books, books)
+            print(f"{size:>10} {one_by_one:>18.0f} {ingestion:>19.0f}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,84 @@
+"""Benchmark books name search with and without the trigram index.
+
+Usage (from the books service directory):
+    python -m benchmarks.bench_name_search [sizes...]
+"""
+import sys
+import random
+import datetime
+from time import perf_counter
+
+from faker import Faker
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from psycopg2.extras import execute_values
+from testing.postgresql import Postgresql
+
+from app.db.tables import Base, Book
+from app.db.crud import get_books_by_name
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+INSERT_CHUNK_SIZE = 10000
+SEARCHES = 20
+
+
+def seed_books(engine, count, words):
+    """Insert books with random names."""
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            for start in range(0, count, INSERT_CHUNK_SIZE):
+                rows = [(" ".join(random.sample(words, 3)), "author", 1,
+                         "description", datetime.date(2020, 1, 1), [1])
+                        for _ in range(min(INSERT_CHUNK_SIZE,
+                                           count - start))]
+                execute_values(cursor, "INSERT INTO books (name, author, "
+                                       "user_id, description, "
+                                       "publication_date, categories_ids) "
+                                       "VALUES %s", rows)
+        connection.commit()
+    finally:
+        connection.close()
+    engine.execute("ANALYZE books")
+
+
+def contains_search(session, filter):
+    """Name search as it was before the trigram index (LIKE '%x%')."""
+    return session.query(Book).filter(Book.name.contains(filter)).all()
+
+
+def measure(session, search, filters):
+    """Get the average search latency in milliseconds."""
+    start = perf_counter()
+    for filter in filters:
+        search(session, filter)
+    return (perf_counter() - start) / len(filters) * 1000
+
+
+def main(sizes):
+    random.seed(0)
+    words = list(set(Faker().words(2000)))
+    filters = [word[:5] for word in random.sample(words, SEARCHES)]
+    with Postgresql() as database:
+        engine = create_engine(database.url())
+        Session = sessionmaker(bind=engine)
+        print(f"{'books':>10} {'contains (ms)':>14} {'trigram (ms)':>13}")
+        for size in sizes:
+            Base.metadata.drop_all(engine)
+            Base.metadata.create_all(engine)
+            engine.execute("DROP INDEX ix_books_name_trgm")
+            seed_books(engine, size, words)
+            session = Session()
+            try:
+                contains = measure(session, contains_search, filters)
+                for index in Book.__table__.indexes:
+                    index.create(engine)
+                engine.execute("ANALYZE books")
+                trigram = measure(session, get_books_by_name, filters)
+            finally:
+                session.close()
+            print(f"{size:>10} {contains:>14.2f} {trigram:>13.2f}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
@@ -1,8 +1,341 @@
 """Testing API calls."""
+import json
+from collections import namedtuple
+from unittest.mock import AsyncMock, MagicMock
+
 from faker import Faker
 from starlette.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy.exc import OperationalError
 
 from app.main import app
+from app.blobs import BlobStore
 
 fake = Faker()
-client = TestClient(app)
\ No newline at end of file
+client = TestClient(app)
+
+
+class MockedBook:
+    """Mocked book object."""
+
+    def __init__(self, id, name, author, user_id, description,
+                 publication_date, categories_ids):
+        self.id = id
+        self.name = name
+        self.author = author
+        self.user_id = user_id
+        self.description = description
+        self.publication_date = publication_date
+        self.categories_ids = categories_ids
+
+
+def create_mocked_book(id):
+    """Create mocked book with fake data."""
+    return MockedBook(id, fake.catch_phrase(), fake.name(), 1, fake.text(),
+                      fake.date_object(), [1, 2])
+
+
+BookRow = namedtuple("BookRow", ["id", "name", "author", "user_id",
+                                 "description", "publication_date",
+                                 "categories_ids"])
+
+
+def create_book_rows(ids):
+    """Create books listing rows with fake data."""
+    return [BookRow(**create_mocked_book(id).__dict__) for id in ids]
+
+
+def to_json_book(book):
+    """Get the expected JSON of book row."""
+    return dict(book._asdict(),
+                publication_date=book.publication_date.isoformat())
+
+
+# Test /book/{id} endpoint.
+
+def test_get_exists_book(mocker):
+    """Test get exists book by id functionality."""
+    mocked_book = create_mocked_book(1)
+    mocker.patch('app.main.fetch_book_by_id', new_callable=AsyncMock,
+                 return_value=mocked_book.__dict__)
+    response = client.get("/book/1")
+    assert response.status_code == 200
+    assert response.json() == dict(
+        mocked_book.__dict__,
+        publication_date=mocked_book.publication_date.isoformat())
+
+
+def test_get_not_exists_book(mocker):
+    """Test get not exists book by id functionality."""
+    mocker.patch('app.main.fetch_book_by_id', new_callable=AsyncMock,
+                 return_value=None)
+    response = client.get("/book/1")
+    assert response.status_code == 404
+
+
+# Test /books endpoints.
+
+def test_get_books_pages(mocker):
+    """Test getting books pages by cursor."""
+    books = create_book_rows([1, 2, 3])
+    get_books = mocker.patch('app.main.get_all_books', return_value=books)
+    response = client.get("/books", params={"limit": 2})
+    assert response.status_code == 200
+    assert response.json()["books"] == \
+        [to_json_book(book) for book in books[:2]]
+    cursor = response.json()["next_cursor"]
+    assert cursor is not None
+    get_books.assert_called_with(mocker.ANY, limit=3, after_id=None)
+
+    get_books.return_value = books[2:]
+    response = client.get("/books", params={"limit": 2, "cursor": cursor})
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] is None
+    get_books.assert_called_with(mocker.ANY, limit=3, after_id=2)
+
+
+def test_get_books_invalid_cursor():
+    """Test getting books page with malformed cursor."""
+    response = client.get("/books", params={"cursor": "invalid"})
+    assert response.status_code == 400
+
+
+def test_stream_books(mocker):
+    """Test streaming books as NDJSON."""
+    books = create_book_rows([1, 2, 3])
+    mocker.patch('app.main.Session', return_value=MagicMock())
+    get_books = mocker.patch('app.main.get_all_books',
+                             return_value=iter(books))
+    response = client.get("/books", params={"stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == \
+        [to_json_book(book) for book in books]
+    get_books.assert_called_with(mocker.ANY, after_id=None, stream=True)
+
+
+def test_search_books(mocker):
+    """Test searching books by name filter or prefix."""
+    books = create_book_rows([1])
+    get_books = mocker.patch('app.main.get_books_by_name',
+                             return_value=books)
+    response = client.get("/books/search", params={"filter": "lord"})
+    assert response.status_code == 200
+    assert response.json()["books"] == [to_json_book(books[0])]
+    get_books.assert_called_with(mocker.ANY, "lord", limit=51,
+                                 after_id=None)
+
+    get_books = mocker.patch('app.main.get_books_by_name_prefix',
+                             return_value=[])
+    response = client.get("/books/search", params={"prefix": "the"})
+    assert response.status_code == 200
+    assert response.json() == {"books": [], "next_cursor": None}
+
+    response = client.get("/books/search")
+    assert response.status_code == 400
+
+
+def test_get_user_books(mocker):
+    """Test getting user books, optionally of a category."""
+    books = create_book_rows([1, 2])
+    get_books = mocker.patch('app.main.get_books_by_user_id',
+                             return_value=books)
+    response = client.get("/users/1/books")
+    assert response.status_code == 200
+    assert len(response.json()["books"]) == 2
+    get_books.assert_called_with(mocker.ANY, 1, limit=51, after_id=None)
+
+    get_books = mocker.patch('app.main.get_category_books_by_user_id',
+                             return_value=books[:1])
+    response = client.get("/users/1/books", params={"category_id": 2})
+    assert response.status_code == 200
+    assert len(response.json()["books"]) == 1
+    get_books.assert_called_with(mocker.ANY, 1, [2], limit=51,
+                                 after_id=None)
+
+
+# Test /users/{user_id}/feed endpoint.
+
+def test_get_user_feed(mocker):
+    """Test getting the books feed of user."""
+    books = create_book_rows([1, 2])
+    get_books = mocker.patch('app.main.get_feed_books', return_value=books)
+    response = client.get("/users/1/feed", params={"limit": 1})
+    assert response.status_code == 200
+    assert [book["id"] for book in response.json()["books"]] == [1]
+    assert response.json()["next_cursor"] is not None
+    get_books.assert_called_with(mocker.ANY, 1, limit=2, after_id=None)
+
+
+# Test /feed/users/{id} endpoints.
+
+def test_update_feed_user(mocker):
+    """Test replicating user for the books feeds."""
+    update_feed_user = mocker.patch('app.main.update_feed_user')
+    response = client.put("/feed/users/1",
+                          json={"latitude": 32.8, "longitude": 35.1,
+                                "categories_ids": [1, 2]})
+    assert response.status_code == 200
+    update_feed_user.assert_called_with(mocker.ANY, 1, 32.8, 35.1, [1, 2])
+    response = client.put("/feed/users/1", json={"latitude": 32.8})
+    assert response.status_code == 422
+
+
+def test_get_feed_users(mocker):
+    """Test listing the replicated users ids."""
+    mocker.patch('app.main.get_feed_users_ids', return_value=[1, 3])
+    response = client.get("/feed/users")
+    assert response.status_code == 200
+    assert response.json() == [1, 3]
+
+
+def test_delete_feed_user(mocker):
+    """Test removing replicated user."""
+    mocker.patch('app.main.delete_feed_user', return_value=True)
+    assert client.delete("/feed/users/1").status_code == 200
+    mocker.patch('app.main.delete_feed_user', return_value=False)
+    assert client.delete("/feed/users/1").status_code == 404
+
+
+# Test /book/{id}/image endpoints.
+
+PNG_IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def test_upload_book_image(mocker, tmp_path):
+    """Test uploading book image to the blobs store."""
+    store = BlobStore(str(tmp_path))
+    mocker.patch('app.main.blobs', store)
+    update = mocker.patch('app.main.update_book_image_hash',
+                          new_callable=AsyncMock, return_value=True)
+    response = client.put("/book/1/image", data=PNG_IMAGE)
+    assert response.status_code == 200
+    image_hash = response.json()["image_hash"]
+    assert b"".join(store.read(image_hash)) == PNG_IMAGE
+    update.assert_called_with(mocker.ANY, 1, image_hash)
+
+    update.return_value = False
+    response = client.put("/book/1/image", data=PNG_IMAGE)
+    assert response.status_code == 404
+
+
+def test_upload_invalid_book_image(mocker, tmp_path):
+    """Test uploading not supported or too large image."""
+    mocker.patch('app.main.blobs', BlobStore(str(tmp_path)))
+    mocker.patch('app.main.update_book_image_hash',
+                 new_callable=AsyncMock, return_value=True)
+    response = client.put("/book/1/image", data=b"plain text")
+    assert response.status_code == 400
+
+    mocker.patch('app.main.BOOK_IMAGE_MAX_SIZE', 100)
+    response = client.put("/book/1/image", data=PNG_IMAGE)
+    assert response.status_code == 413
+
+
+def test_get_book_image(mocker, tmp_path):
+    """Test getting book image, whole and by ranges."""
+    store = BlobStore(str(tmp_path))
+    image_hash = store.put(PNG_IMAGE)
+    mocker.patch('app.main.blobs', store)
+    mocker.patch('app.main.fetch_book_image_hash', new_callable=AsyncMock,
+                 return_value=image_hash)
+    response = client.get("/book/1/image")
+    assert response.status_code == 200
+    assert response.content == PNG_IMAGE
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["content-length"] == str(len(PNG_IMAGE))
+    etag = response.headers["etag"]
+
+    response = client.get("/book/1/image", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get("/book/1/image", headers={"Range": "bytes=8-15"})
+    assert response.status_code == 206
+    assert response.content == PNG_IMAGE[8:16]
+    assert response.headers["content-range"] == \
+        f"bytes 8-15/{len(PNG_IMAGE)}"
+
+    response = client.get("/book/1/image", headers={"Range": "bytes=-4"})
+    assert response.status_code == 206
+    assert response.content == PNG_IMAGE[-4:]
+
+    response = client.get("/book/1/image",
+                          headers={"Range": f"bytes={len(PNG_IMAGE)}-"})
+    assert response.status_code == 416
+
+
+def test_get_not_exists_book_image(mocker):
+    """Test getting image of book without image."""
+    mocker.patch('app.main.fetch_book_image_hash', new_callable=AsyncMock,
+                 return_value=None)
+    response = client.get("/book/1/image")
+    assert response.status_code == 404
+
+
+# Test /books/ingest endpoint.
+
+def test_ingest_books(mocker):
+    """Test adding books from NDJSON body."""
+    book = create_mocked_book(1)
+    line = json.dumps(dict(book.__dict__, id=None,
+                           publication_date=book.publication_date
+                           .isoformat()))
+    mocker.patch('app.ingestion.insert_books', return_value=[7])
+    response = client.post("/books/ingest",
+                           data=f"{line}\n{{invalid\n".encode())
+    assert response.status_code == 200
+    assert response.json()["books"] == [{"line": 1, "id": 7}]
+    assert [error["line"] for error in response.json()["errors"]] == [2]
+    assert response.json()["resume_from"] is None
+
+
+def test_ingest_books_failure(mocker):
+    """Test failed ingestion tells the line to resume from."""
+    book = create_mocked_book(1)
+    line = json.dumps(dict(book.__dict__, id=None,
+                           publication_date=book.publication_date
+                           .isoformat()))
+    mocker.patch('app.ingestion.insert_books',
+                 side_effect=OperationalError("", {}, None))
+    response = client.post("/books/ingest", params={"resume_from": 2},
+                           data=f"{line}\n{line}\n".encode())
+    assert response.status_code == 503
+    assert response.json() == {"books": [], "errors": [], "resume_from": 2}
+
+
+# Test /metrics endpoint.
+
+def test_metrics():
+    """Test exposing metrics in Prometheus text format."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "db_pool_checkout_wait_seconds_count" in response.text
+
+
+def get_requests_count(route, status):
+    """Get the recorded amount of GET requests of route and status."""
+    return REGISTRY.get_sample_value(
+        "http_requests_total",
+        {"method": "GET", "route": route, "status": status}) or 0
+
+
+def test_requests_metrics(mocker):
+    """Test recording requests metrics labelled by route template."""
+    count = get_requests_count("/book/{id}", "404")
+    mocker.patch('app.main.fetch_book_by_id', new_callable=AsyncMock,
+                 return_value=None)
+    response = client.get("/book/1")
+    assert response.status_code == 404
+    assert get_requests_count("/book/{id}", "404") == count + 1
+
+    count = get_requests_count("<unmatched>", "404")
+    assert client.get("/not/a/route").status_code == 404
+    assert get_requests_count("<unmatched>", "404") == count + 1
+
+    response = client.get("/metrics")
+    for metric in ("http_request_duration_seconds_bucket",
+                   "http_requests_in_progress",
+                   "http_response_size_bytes_sum"):
+        assert metric in response.text
+    assert 'route="/book/{id}"' in response.text
@@ -0,0 +1,40 @@
+"""Testing blobs store."""
+import os
+
+from app.blobs import BlobStore, get_image_media_type, READ_CHUNK_SIZE
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def test_put_blob(tmp_path):
+    """Test storing blobs by their content hash, once."""
+    store = BlobStore(str(tmp_path))
+    blob_hash = store.put(b"content")
+    assert len(blob_hash) == 64
+    assert store.put(b"content") == blob_hash
+    assert store.put(b"other content") != blob_hash
+    assert os.path.isfile(store.get_path(blob_hash))
+    assert store.get_size(blob_hash) == len(b"content")
+    assert store.get_size("0" * 64) is None
+
+
+def test_read_blob(tmp_path):
+    """Test reading blobs in chunks and by offsets."""
+    store = BlobStore(str(tmp_path))
+    content = os.urandom(READ_CHUNK_SIZE * 2 + 10)
+    blob_hash = store.put(content)
+    chunks = list(store.read(blob_hash))
+    assert len(chunks) == 3
+    assert b"".join(chunks) == content
+    assert b"".join(store.read(blob_hash, 5, 9)) == content[5:10]
+    assert b"".join(store.read(blob_hash, READ_CHUNK_SIZE)) == \
+        content[READ_CHUNK_SIZE:]
+
+
+def test_get_image_media_type():
+    """Test recognizing images formats by magic bytes."""
+    assert get_image_media_type(PNG_SIGNATURE + b"data") == "image/png"
+    assert get_image_media_type(b"\xff\xd8\xff\xe0data") == "image/jpeg"
+    assert get_image_media_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == \
+        "image/webp"
+    assert get_image_media_type(b"plain text") is None
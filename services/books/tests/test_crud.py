@@ -1,13 +1,23 @@
 """Testing CRUD calls."""
+import asyncio
 import logging
 
 from faker import Faker
+from databases import Database
 
 from app.db.tables import Base
 from sqlalchemy import create_engine
 from contextlib2 import contextmanager
 from sqlalchemy.orm import sessionmaker
 from testing.postgresql import Postgresql
+from app.db.crud import (add_book, delete_book, get_book_by_id,
+                         fetch_book_by_id, get_books_by_name,
+                         get_books_by_name_prefix, get_all_books,
+                         get_books_by_user_id,
+                         get_category_books_by_user_id,
+                         fetch_book_image_hash, update_book_image_hash,
+                         insert_books, update_feed_user, delete_feed_user,
+                         get_feed_books, get_feed_users_ids)
 
 # Tests logger.
 logger = logging.getLogger()
@@ -36,6 +46,22 @@ def mocked_transaction():
         s.close()
 
 
+def run_async_crud(crud_function, *args):
+    """Run async CRUD function with connection to the tests temp db."""
+    async def run():
+        async with Database(temp_test_db.url()) as database:
+            return await crud_function(database, *args)
+
+    return asyncio.run(run())
+
+
+def add_fake_book(session, user_id=1, categories_ids=(1, 2), name=None):
+    """Add book with fake data."""
+    return add_book(session, name or fake.catch_phrase(), fake.name(),
+                    user_id, fake.text(), fake.date_object(),
+                    list(categories_ids))
+
+
 def setup_function():
     """Initiating tests temp db in each test.
 
@@ -55,3 +81,157 @@ def teardown_module():
     """
     temp_test_db.stop()
     logger.info("Tests temp db was stopped and deleted")
+
+
+def test_add_and_delete_book():
+    """Test adding and deleting book."""
+    with mocked_transaction() as session:
+        book = add_fake_book(session)
+        assert get_book_by_id(session, book.id) is not None
+        assert delete_book(session, book.id)
+        assert get_book_by_id(session, book.id) is None
+        assert not delete_book(session, book.id)
+
+
+def test_fetch_book_by_id():
+    """Test getting book by id (async)."""
+    with mocked_transaction() as session:
+        book = add_fake_book(session)
+        id, name = book.id, book.name
+
+    fetched_book = run_async_crud(fetch_book_by_id, id)
+    assert fetched_book["name"] == name
+    assert "image_hash" not in fetched_book.keys()
+    assert run_async_crud(fetch_book_by_id, -1) is None
+    assert run_async_crud(fetch_book_by_id, 2 ** 31) is None
+
+
+def test_get_books_by_name():
+    """Test filtering books by name, case insensitive."""
+    with mocked_transaction() as session:
+        book = add_fake_book(session, name="The Lord_Of The Rings")
+        add_fake_book(session, name="Other book")
+        books = get_books_by_name(session, "lord_of")
+        assert [element.id for element in books] == [book.id]
+        # LIKE wildcards are matched literally.
+        assert get_books_by_name(session, "lord%") == []
+
+        books = get_books_by_name_prefix(session, "the lord")
+        assert [element.id for element in books] == [book.id]
+        assert get_books_by_name_prefix(session, "lord") == []
+
+
+def test_get_all_books_pages():
+    """Test getting books pages by id, without the images."""
+    with mocked_transaction() as session:
+        ids = [add_fake_book(session).id for _ in range(5)]
+        books = get_all_books(session, limit=2)
+        assert [book.id for book in books] == ids[:2]
+        assert "image_hash" not in books[0]._fields
+        books = get_all_books(session, limit=2, after_id=ids[1])
+        assert [book.id for book in books] == ids[2:4]
+        books = get_all_books(session, after_id=ids[3], stream=True)
+        assert [book.id for book in books] == ids[4:]
+
+
+def test_get_user_books():
+    """Test getting user books, optionally of a category."""
+    with mocked_transaction() as session:
+        first = add_fake_book(session, user_id=1, categories_ids=[1])
+        second = add_fake_book(session, user_id=1, categories_ids=[2])
+        add_fake_book(session, user_id=2, categories_ids=[1])
+        books = get_books_by_user_id(session, 1)
+        assert [book.id for book in books] == [first.id, second.id]
+        books = get_category_books_by_user_id(session, 1, [2])
+        assert [book.id for book in books] == [second.id]
+        books = get_books_by_user_id(session, 1, stream=True)
+        assert [book.id for book in books] == [first.id, second.id]
+
+
+def test_update_book_image_hash():
+    """Test setting and getting book image hash (async)."""
+    with mocked_transaction() as session:
+        id = add_fake_book(session).id
+
+    assert run_async_crud(fetch_book_image_hash, id) is None
+    assert run_async_crud(update_book_image_hash, id, "a" * 64)
+    assert run_async_crud(fetch_book_image_hash, id) == "a" * 64
+    assert not run_async_crud(update_book_image_hash, -1, "a" * 64)
+    assert run_async_crud(fetch_book_image_hash, 2 ** 31) is None
+    assert not run_async_crud(update_book_image_hash, 2 ** 31, "a" * 64)
+
+
+def test_insert_books(mocker):
+    """Test inserting many books, in statements batches."""
+    mocker.patch('app.db.crud.INSERT_BATCH_SIZE', 2)
+    books = [dict(name=f"Book {index}", author=fake.name(), user_id=1,
+                  description=fake.text(),
+                  publication_date=fake.date_object(), categories_ids=[1])
+             for index in range(5)]
+    with mocked_transaction() as session:
+        ids = insert_books(session, books)
+        assert len(ids) == 5
+        assert [get_book_by_id(session, id).name for id in ids] == \
+            [book["name"] for book in books]
+        assert insert_books(session, []) == []
+
+
+def get_feed_ids(session, user_id):
+    """Get the ids of the books in user feed."""
+    return [book.id for book in get_feed_books(session, user_id)]
+
+
+def test_books_feed():
+    """Test maintaining the feeds when books and users change."""
+    base_coordinates = (32.852310, 35.096149)
+    with mocked_transaction() as session:
+        update_feed_user(session, 1, *base_coordinates, [1, 2])
+        update_feed_user(session, 2, 32.853418, 35.092406, [3])  # 0.37 KM
+        update_feed_user(session, 3, 32.0853, 34.7818, [1])  # 90 KM
+        near_book = add_fake_book(session, user_id=2, categories_ids=[1])
+        other_book = add_fake_book(session, user_id=2, categories_ids=[4])
+        far_book = add_fake_book(session, user_id=3, categories_ids=[1])
+        own_book = add_fake_book(session, user_id=1, categories_ids=[3])
+        assert get_feed_ids(session, 1) == [near_book.id]
+        assert get_feed_ids(session, 2) == [own_book.id]
+        assert get_feed_ids(session, 3) == []
+
+        # Changing categories rebuilds the user feed.
+        update_feed_user(session, 1, *base_coordinates, [4])
+        assert get_feed_ids(session, 1) == [other_book.id]
+
+        # Moving adds the user books to the feeds around the new location.
+        update_feed_user(session, 3, 32.845414, 35.078663, [1])  # 1.81 KM
+        assert get_feed_ids(session, 3) == [near_book.id]
+        assert get_feed_ids(session, 2) == [own_book.id]
+        update_feed_user(session, 1, *base_coordinates, [1])
+        assert get_feed_ids(session, 1) == [near_book.id, far_book.id]
+
+        assert delete_book(session, near_book.id)
+        assert get_feed_ids(session, 1) == [far_book.id]
+        assert set(get_feed_users_ids(session)) >= {1, 2, 3}
+        assert delete_feed_user(session, 3)
+        assert get_feed_ids(session, 1) == []
+        assert 3 not in get_feed_users_ids(session)
+        assert not delete_feed_user(session, 3)
+
+
+def test_inserted_books_feed():
+    """Test adding inserted books to the feeds, with pages."""
+    update_feed_user_args = [(1, 32.852310, 35.096149, [1]),
+                             (2, 32.853418, 35.092406, [])]
+    with mocked_transaction() as session:
+        for args in update_feed_user_args:
+            update_feed_user(session, *args)
+        books = [dict(name=f"Book {index}", author=fake.name(), user_id=2,
+                      description=fake.text(),
+                      publication_date=fake.date_object(),
+                      categories_ids=[index % 2])
+                 for index in range(5)]
+        ids = insert_books(session, books)
+        feed_ids = [id for id, book in zip(ids, books)
+                    if book["categories_ids"] == [1]]
+        assert get_feed_ids(session, 1) == feed_ids
+        first_page = get_feed_books(session, 1, limit=1)
+        assert [book.id for book in get_feed_books(
+            session, 1, after_id=first_page[-1].id)] == feed_ids[1:]
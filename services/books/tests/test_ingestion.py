@@ -0,0 +1,102 @@
+"""Testing bulk books ingestion."""
+import json
+
+from sqlalchemy.exc import DataError, OperationalError
+
+from app.ingestion import BooksIngestion
+
+
+def create_book_line(name="Book", **fields):
+    """Create valid book JSON line."""
+    book = dict(name=name, author="Author", user_id=1,
+                description="Description", publication_date="2020-01-01",
+                categories_ids=[1, 2])
+    book.update(fields)
+    return json.dumps(book)
+
+
+def ingest(ingestion, lines, session=None):
+    """Feed lines to ingestion like the endpoint does."""
+    for line in lines:
+        if ingestion.add_line(line) and not ingestion.commit_chunk(session):
+            return
+    ingestion.commit_chunk(session)
+
+
+def test_ingest_books(mocker):
+    """Test committing books in chunks, with errors report."""
+    insert = mocker.patch('app.ingestion.insert_books',
+                          side_effect=lambda session, books: list(
+                              range(len(books))))
+    lines = [create_book_line("First"), "{invalid", "",
+             create_book_line(user_id="user"), create_book_line("Second"),
+             create_book_line("Third")]
+    ingestion = BooksIngestion(chunk_size=2)
+    ingest(ingestion, lines)
+    assert ingestion.books == [(1, 0), (5, 1), (6, 0)]
+    assert [line for line, _ in ingestion.errors] == [2, 4]
+    assert ingestion.errors[1][1] == "user_id: value is not a valid integer"
+    assert ingestion.failed_line is None
+    assert insert.call_count == 2
+    assert insert.call_args_list[0][0][1][0]["name"] == "First"
+
+
+def test_resume_failed_ingestion(mocker):
+    """Test stopping on failed chunk and resuming from it."""
+    session = mocker.MagicMock()
+    mocker.patch('app.ingestion.insert_books',
+                 side_effect=[[1, 2], OperationalError("", {}, None)])
+    lines = [create_book_line(str(index)) for index in range(6)]
+    ingestion = BooksIngestion(chunk_size=2)
+    ingest(ingestion, lines, session)
+    assert ingestion.books == [(1, 1), (2, 2)]
+    assert ingestion.failed_line == 3
+    session.rollback.assert_called_once()
+
+    insert = mocker.patch('app.ingestion.insert_books',
+                          side_effect=[[3, 4], [5, 6]])
+    ingestion = BooksIngestion(resume_from=ingestion.failed_line,
+                               chunk_size=2)
+    ingest(ingestion, lines, session)
+    assert ingestion.books == [(3, 3), (4, 4), (5, 5), (6, 6)]
+    assert insert.call_args_list[0][0][1][0]["name"] == "2"
+
+
+def test_ingest_books_out_of_db_range():
+    """Test books the DB columns can't store are rejected by the schema."""
+    lines = [create_book_line(user_id=2 ** 31),
+             create_book_line(categories_ids=[-2 ** 31 - 1]),
+             create_book_line("Book\x00")]
+    ingestion = BooksIngestion()
+    for line in lines:
+        ingestion.add_line(line)
+    assert [line for line, _ in ingestion.errors] == [1, 2, 3]
+    assert ingestion.errors[2][1] == \
+        "name: NUL characters are not allowed."
+
+
+def test_ingest_books_rejected_by_db(mocker):
+    """Test books the DB rejects are isolated and reported, and the rest of
+    the chunk is committed."""
+    session = mocker.MagicMock()
+
+    def insert_books(session, books):
+        if any(book["name"] == "Rejected" for book in books):
+            raise DataError("", {}, Exception("integer out of range"))
+        if any(book["name"] == "NUL" for book in books):
+            raise ValueError("A string literal cannot contain NUL (0x00) "
+                             "characters.")
+        return [int(book["name"]) for book in books]
+
+    mocker.patch('app.ingestion.insert_books', side_effect=insert_books)
+    lines = [create_book_line("1"), create_book_line("Rejected"),
+             create_book_line("3"), create_book_line("NUL"),
+             create_book_line("5")]
+    ingestion = BooksIngestion(chunk_size=4)
+    ingest(ingestion, lines, session)
+    assert ingestion.books == [(1, 1), (3, 3), (5, 5)]
+    assert ingestion.errors == [
+        (2, "Book was rejected: integer out of range"),
+        (4, "Book was rejected: A string literal cannot contain NUL (0x00) "
+            "characters.")]
+    assert ingestion.failed_line is None
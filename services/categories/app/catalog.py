@@ -0,0 +1,150 @@
+"""In-memory categories catalog."""
+import os
+import json
+from hashlib import sha1
+from time import monotonic
+from bisect import bisect_left
+
+# Seconds until the snapshot is reloaded, changes of other processes are
+# visible after it.
+CATALOG_TTL = float(os.environ.get("CATALOG_TTL", "300"))
+# Seconds clients and proxies may cache the responses.
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", "300"))
+NGRAM_SIZE = 3
+
+
+def get_ngrams(text):
+    """Get the set of n-grams (substrings of NGRAM_SIZE) of a text."""
+    return {text[index:index + NGRAM_SIZE]
+            for index in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def render(content):
+    """Render JSON response body and its ETag.
+
+    Returns:
+        tuple. (body, etag).
+    """
+    body = json.dumps(content, ensure_ascii=False,
+                      separators=(",", ":")).encode()
+    return body, f'"{sha1(body).hexdigest()}"'
+
+
+class CategoriesCatalog:
+    """Snapshot of the categories with pre-rendered responses.
+
+    Attributes:
+        categories (list): (id, name) tuples sorted by id.
+        body (bytes): All categories JSON response.
+        etag (str): All categories response ETag.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL):
+        self.ttl = ttl
+        self.categories = []
+        self.body, self.etag = render([])
+        self._rendered_categories = {}  # id -> (body, etag)
+        self._names = {}  # id -> name
+        self._folded_names = {}  # id -> case folded name
+        self._ngrams = {}  # n-gram -> ids of names that contain it
+        self._sorted_names = []  # (case folded name, id) for prefix search
+        self._expiration = 0
+
+    @property
+    def is_stale(self):
+        """If the snapshot should be reloaded."""
+        return monotonic() >= self._expiration
+
+    def load(self, categories):
+        """Replace the snapshot.
+
+        Args:
+            categories (iterable): (id, name) tuples.
+        """
+        categories = sorted(categories)
+        rendered_categories = {id: render({"id": id, "name": name})
+                               for id, name in categories}
+        self.body, self.etag = render([{"id": id, "name": name}
+                                       for id, name in categories])
+        folded_names = {id: name.casefold() for id, name in categories}
+        ngrams = {}
+        for id, name in folded_names.items():
+            for ngram in get_ngrams(name):
+                ngrams.setdefault(ngram, set()).add(id)
+
+        self.categories = categories
+        self._rendered_categories = rendered_categories
+        self._names = dict(categories)
+        self._folded_names = folded_names
+        self._ngrams = ngrams
+        self._sorted_names = sorted((name, id)
+                                    for id, name in folded_names.items())
+        self._expiration = monotonic() + self.ttl
+
+    def invalidate(self):
+        """Mark the snapshot as stale, so it is reloaded on next use."""
+        self._expiration = 0
+
+    def _get_ids_by_substring(self, text):
+        """Get ids of names that contain a text (case folded)."""
+        ngrams = get_ngrams(text)
+        if not ngrams:
+            return {id for id, name in self._folded_names.items()
+                    if text in name}
+
+        # The names that contain all the text n-grams are the candidates.
+        candidates = set.intersection(*(self._ngrams.get(ngram, set())
+                                        for ngram in ngrams))
+        return {id for id in candidates if text in self._folded_names[id]}
+
+    def _get_ids_by_prefix(self, prefix):
+        """Get ids of names that start with a prefix (case folded)."""
+        ids = set()
+        index = bisect_left(self._sorted_names, (prefix,))
+        while index < len(self._sorted_names) and \
+                self._sorted_names[index][0].startswith(prefix):
+            ids.add(self._sorted_names[index][1])
+            index += 1
+        return ids
+
+    def search(self, filter=None, prefix=None):
+        """Search categories by name, case insensitive.
+
+        Args:
+            filter (str): Text the name should contain.
+            prefix (str): Text the name should start with.
+
+        Returns:
+            list. (id, name) tuples sorted by id.
+        """
+        ids = None
+        if filter is not None:
+            ids = self._get_ids_by_substring(filter.casefold())
+        if prefix is not None:
+            prefix_ids = self._get_ids_by_prefix(prefix.casefold())
+            ids = prefix_ids if ids is None else ids & prefix_ids
+        if ids is None:
+            return list(self.categories)
+        return [(id, name) for id, name in self.categories if id in ids]
+
+    def get_categories(self, ids):
+        """Get many categories by id.
+
+        Args:
+            ids (iterable): Categories ids.
+
+        Returns:
+            dict. Id to name of the found categories.
+        """
+        return {id: self._names[id] for id in ids if id in self._names}
+
+    def get_rendered_category(self, id):
+        """Get pre-rendered category response.
+
+        Returns:
+            tuple. (body, etag), None if the category was not found.
+        """
+        return self._rendered_categories.get(id)
+
+
+catalog = CategoriesCatalog()
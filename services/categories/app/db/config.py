@@ -1,10 +1,16 @@
 """DB configurations and utils."""
 import os
+import logging
+from time import perf_counter
 
+from databases import Database
+from prometheus_client import Histogram
 from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker
 
 from .tables import Base
+from .query_stats import instrument_engine
 from .crud import insert_new_category, get_all_categories
 
 CATEGORIES_FILE = "app/db/categories.txt"
@@ -15,10 +21,68 @@ DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "postgres")
 DB_USERNAME = os.environ.get("DB_USERNAME", "postgres")
 DB_URL = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+DB_ASYNC_POOL_MIN_SIZE = int(os.environ.get("DB_ASYNC_POOL_MIN_SIZE", "5"))
+DB_ASYNC_POOL_MAX_SIZE = int(os.environ.get("DB_ASYNC_POOL_MAX_SIZE", "20"))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))  # Seconds.
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # Seconds.
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING",
+                                  "true").lower() == "true"
+# Milliseconds, 0 disables the timeout.
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", "30000"))
+DB_LOG_LEVEL = os.environ.get("DB_LOG_LEVEL", "WARNING")
 
-engine = create_engine(DB_URL, echo=True)
+POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds",
+                               "Time waiting for a connection from the "
+                               "DB connections pool.")
+
+
+class TimedQueuePool(QueuePool):
+    """Connections pool that reports the checkout wait time."""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+
+        finally:
+            POOL_CHECKOUT_WAIT.observe(perf_counter() - start)
+
+
+def create_db_engine(url):
+    """Create DB engine configured by the environment variables.
+
+    Args:
+        url (str): DB URL.
+
+    Returns:
+        Engine. DB engine with connections pool, and statements timing.
+    """
+    logging.getLogger("sqlalchemy.engine").setLevel(DB_LOG_LEVEL)
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT:
+        connect_args["options"] = \
+            f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+
+    return instrument_engine(create_engine(url, poolclass=TimedQueuePool,
+                                           pool_size=DB_POOL_SIZE,
+                                           max_overflow=DB_MAX_OVERFLOW,
+                                           pool_timeout=DB_POOL_TIMEOUT,
+                                           pool_recycle=DB_POOL_RECYCLE,
+                                           pool_pre_ping=DB_POOL_PRE_PING,
+                                           connect_args=connect_args))
+
+
+engine = create_db_engine(DB_URL)
 Session = sessionmaker(bind=engine)
 
+# Async connections pool (asyncpg), for the non blocking endpoints.
+database = Database(DB_URL, min_size=DB_ASYNC_POOL_MIN_SIZE,
+                    max_size=DB_ASYNC_POOL_MAX_SIZE,
+                    server_settings={"statement_timeout":
+                                     str(DB_STATEMENT_TIMEOUT)})
+
 
 def transaction():
     s = Session()
@@ -1,5 +1,16 @@
 """Categories CRUD db operations."""
+from sqlalchemy import select
+
 from .tables import Category
+from ..catalog import catalog
+
+CATEGORY_COLUMNS = (Category.id, Category.name)
+
+
+def _escape_like(text: str):
+    """Escape LIKE wildcards, so the text is matched literally."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace(
+        "_", "\\_")
 
 
 def insert_new_category(session, name: str):
@@ -14,6 +25,7 @@ def insert_new_category(session, name: str):
     session.commit()
     # Retrieving new data like generated id.
     session.refresh(new_category)
+    catalog.invalidate()
     return new_category
 
 
@@ -24,21 +36,22 @@ def get_all_categories(session):
         session (Session): Current DB session.
 
     Returns:
-        list. Fetched categories.
+        list. Fetched categories (id, name) rows.
     """
-    return session.query(Category).all()
+    return session.query(*CATEGORY_COLUMNS).all()
 
 
 def get_categories_by_name(session, filter: str):
     """Get all categories that match to specific filter from DB.
     Args:
-        filter (str): Contains filter.
+        filter (str): Contains filter (case insensitive).
         session (Session): Current DB session.
 
     Returns:
-        list. Filtered categories.
+        list. Filtered categories (id, name) rows.
     """
-    return session.query(Category).filter(Category.name.contains(filter)).all()
+    return session.query(*CATEGORY_COLUMNS).filter(Category.name.ilike(
+        f"%{_escape_like(filter)}%", escape="\\")).all()
 
 
 def get_category_by_id(session, id: int):
@@ -48,6 +61,19 @@ def get_category_by_id(session, id: int):
         session (Session): Current DB session.
 
     Returns:
-        Category. Filtered categories.
+        tuple. Category (id, name) row.
+    """
+    return session.query(*CATEGORY_COLUMNS).filter(
+        Category.id == id).first()
+
+
+async def fetch_all_categories(database):
+    """Get all categories from DB (async).
+
+    Args:
+        database (Database): Async DB connections pool.
+
+    Returns:
+        list. Fetched categories rows.
     """
-    return session.query(Category).filter_by(id=id).first()
+    return await database.fetch_all(select(CATEGORY_COLUMNS))
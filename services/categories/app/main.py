@@ -1,56 +1,120 @@
 """Categories service app."""
-from typing import List
+import os
+from typing import List, Dict, Union
 
-from fastapi import FastAPI, Depends, HTTPException
-from starlette.status import HTTP_400_BAD_REQUEST, HTTP_200_OK
+from fastapi import FastAPI, Response, HTTPException, Query
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from starlette.requests import Request
+from starlette.status import (HTTP_400_BAD_REQUEST, HTTP_200_OK,
+                              HTTP_304_NOT_MODIFIED)
 
 from .schemas import CategoryResponse
-from .db.config import transaction, init_categories, Session, engine
-from .db.crud import (get_categories_by_name, get_all_categories,
-                      get_category_by_id)
+from .metrics import MetricsMiddleware
+from .catalog import catalog, CATALOG_MAX_AGE
+from .db.config import init_categories, Session, engine, database
+from .db.crud import fetch_all_categories, get_all_categories
+
+CATEGORIES_BATCH_MAX_SIZE = int(os.environ.get("CATEGORIES_BATCH_MAX_SIZE",
+                                               "500"))
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics")
+def metrics():
+    """Runtime metrics in Prometheus text format."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initiating DB."""
+    """Initiating DB and categories catalog."""
     session = Session()
     init_categories(session=session, engine=engine)
+    catalog.load((category.id, category.name)
+                 for category in get_all_categories(session))
     session.close()
+    await database.connect()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Closing async DB connections."""
+    await database.disconnect()
+
+
+async def get_catalog():
+    """Get the categories catalog, reloading it if it is stale."""
+    if catalog.is_stale:
+        catalog.load((category["id"], category["name"])
+                     for category in await fetch_all_categories(database))
+    return catalog
+
 
+def is_etag_matching(request, etag):
+    """Check if the client cached response has the same ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
 
-@app.get("/categories", response_model=List[CategoryResponse],
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def cached_json_response(request, body, etag):
+    """Create pre-rendered JSON response with HTTP caching headers."""
+    headers = {"ETag": etag,
+               "Cache-Control": f"public, max-age={CATALOG_MAX_AGE}"}
+    if is_etag_matching(request, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json",
+                    headers=headers)
+
+
+@app.get("/categories",
+         response_model=Union[List[CategoryResponse],
+                              Dict[int, CategoryResponse]],
          status_code=HTTP_200_OK)
-def get_categories(filter: str = None, session=Depends(transaction)):
-    """Get categories from the DB with optional filter.
+async def get_categories(request: Request, filter: str = None,
+                         prefix: str = None, ids: List[int] = Query(None)):
+    """Get categories from the catalog with optional filters.
 
     Args:
-        session (Session): DB session.
-        filter (str): Categories name filter.
-
-    Notes:
-        Filtering the categories with naive contains.
+        request (Request): HTTP request.
+        filter (str): Categories name contains filter (case insensitive).
+        prefix (str): Categories name prefix filter (case insensitive).
+        ids (list): Categories ids (repeated parameter), to get a map of
+            the found categories by id instead of a list.
     """
-    if filter is not None:
-        categories = get_categories_by_name(session, filter)
-    else:
-        categories = get_all_categories(session)
-    return [CategoryResponse(id=category.id, name=category.name)
-            for category in categories]
+    catalog = await get_catalog()
+    if ids is not None:
+        if len(ids) > CATEGORIES_BATCH_MAX_SIZE:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                                detail="Too many ids.")
+
+        return {id: CategoryResponse(id=id, name=name)
+                for id, name in catalog.get_categories(ids).items()}
+
+    if filter is None and prefix is None:
+        return cached_json_response(request, catalog.body, catalog.etag)
+
+    return [CategoryResponse(id=id, name=name)
+            for id, name in catalog.search(filter, prefix)]
 
 
 @app.get("/category/{id}", response_model=CategoryResponse,
          status_code=HTTP_200_OK)
-def get_categories_by_user_id(id: int, session=Depends(transaction)):
-    """Get categories from the DB with optional filter.
+async def get_categories_by_user_id(request: Request, id: int):
+    """Get category from the catalog.
 
     Args:
+        request (Request): HTTP request.
         id (int): Category id.
-        session (Session): DB session.
     """
-    category = get_category_by_id(session, id)
+    catalog = await get_catalog()
+    category = catalog.get_rendered_category(id)
     if category is None:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
                             detail="Category was not found.")
-    return CategoryResponse(id=category.id, name=category.name)
+    return cached_json_response(request, *category)
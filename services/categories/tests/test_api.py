@@ -1,7 +1,11 @@
 """Testing API calls."""
+from unittest.mock import AsyncMock
+
 from starlette.testclient import TestClient
+from prometheus_client import REGISTRY
 
 from app.main import app
+from app.catalog import catalog
 
 client = TestClient(app)
 
@@ -14,11 +18,28 @@ class MockedCategory:
         self.name = name
 
 
+def setup_function():
+    """Reloading the catalog in each test.
+
+    Notes:
+        Startup function.
+    """
+    catalog.invalidate()
+
+
+def mock_categories(mocker, categories):
+    """Mock the categories the catalog is loaded from."""
+    return mocker.patch('app.main.fetch_all_categories',
+                        new_callable=AsyncMock,
+                        return_value=[category.__dict__
+                                      for category in categories])
+
+
 def test_get_all_categories(mocker):
     """Test get all categories functionality."""
     mocked_categories = [MockedCategory(1, "test1"),
                          MockedCategory(2, "test2")]
-    mocker.patch('app.main.get_all_categories', return_value=mocked_categories)
+    mock_categories(mocker, mocked_categories)
     response = client.get("/categories")
     assert response.status_code == 200
     categories_response = set(element["name"] for element in response.json())
@@ -29,15 +50,52 @@ def test_get_all_categories(mocker):
 def test_get_not_exists_category_by_name(mocker):
     """Test get not exists category (name search) functionality."""
     not_existing_category = "not_exist"
-    mocker.patch('app.main.get_categories_by_name', return_value=[])
+    mock_categories(mocker, [MockedCategory(1, "test1")])
     response = client.get(f"/categories?filter={not_existing_category}")
     assert response.status_code == 200
     assert response.json() == []
 
 
+def test_get_exists_category_by_name(mocker):
+    """Test get exists category (name search) functionality."""
+    mock_categories(mocker, [MockedCategory(1, "test1"),
+                             MockedCategory(2, "other")])
+    response = client.get("/categories?filter=est")
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "name": "test1"}]
+
+
+def test_get_categories_by_prefix(mocker):
+    """Test get categories by name prefix functionality."""
+    mock_categories(mocker, [MockedCategory(1, "Test1"),
+                             MockedCategory(2, "other test")])
+    response = client.get("/categories?prefix=te")
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "name": "Test1"}]
+
+
+def test_get_categories_by_ids(mocker):
+    """Test get map of categories by ids functionality."""
+    mock_categories(mocker, [MockedCategory(1, "test1"),
+                             MockedCategory(2, "test2"),
+                             MockedCategory(3, "test3")])
+    response = client.get("/categories?ids=1&ids=3&ids=404")
+    assert response.status_code == 200
+    assert response.json() == {"1": {"id": 1, "name": "test1"},
+                               "3": {"id": 3, "name": "test3"}}
+
+
+def test_get_too_many_categories_by_ids(mocker):
+    """Test get categories by ids over the batch size limit."""
+    mock_categories(mocker, [])
+    mocker.patch('app.main.CATEGORIES_BATCH_MAX_SIZE', 2)
+    response = client.get("/categories?ids=1&ids=2&ids=3")
+    assert response.status_code == 400
+
+
 def test_get_not_exists_category_by_id(mocker):
     """Test get not exists category (id search) functionality."""
-    mocker.patch('app.main.get_category_by_id', return_value=None)
+    mock_categories(mocker, [])
     response = client.get("/category/1")
     assert response.status_code == 400
 
@@ -45,7 +103,78 @@ def test_get_not_exists_category_by_id(mocker):
 def test_get_exists_category_by_id(mocker):
     """Test ge exists category (id search) functionality."""
     mocked_category = MockedCategory(1, "test1")
-    mocker.patch('app.main.get_category_by_id', return_value=mocked_category)
+    mock_categories(mocker, [mocked_category])
     response = client.get("/category/1")
     assert response.status_code == 200
     assert response.json() == mocked_category.__dict__
+
+
+def test_categories_not_modified(mocker):
+    """Test responses are cached by ETag."""
+    mock_categories(mocker, [MockedCategory(1, "test1")])
+    for url in ("/categories", "/category/1"):
+        response = client.get(url)
+        etag = response.headers["etag"]
+        assert "max-age" in response.headers["cache-control"]
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        response = client.get(url, headers={"If-None-Match": '"other"'})
+        assert response.status_code == 200
+
+
+def test_catalog_reloading(mocker):
+    """Test the catalog is loaded once until it is invalidated."""
+    fetch_all_categories = mock_categories(mocker,
+                                           [MockedCategory(1, "test1")])
+    etag = client.get("/categories").headers["etag"]
+    client.get("/category/1")
+    assert fetch_all_categories.await_count == 1
+
+    fetch_all_categories.return_value = [{"id": 1, "name": "test1"},
+                                         {"id": 2, "name": "test2"}]
+    catalog.invalidate()
+    response = client.get("/categories")
+    assert fetch_all_categories.await_count == 2
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
+
+
+# Test /metrics endpoint.
+
+def test_metrics():
+    """Test exposing metrics in Prometheus text format."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "db_pool_checkout_wait_seconds_count" in response.text
+
+
+def get_requests_count(route, status):
+    """Get the recorded amount of GET requests of route and status."""
+    return REGISTRY.get_sample_value(
+        "http_requests_total",
+        {"method": "GET", "route": route, "status": status}) or 0
+
+
+def test_requests_metrics(mocker):
+    """Test recording requests metrics labelled by route template."""
+    count = get_requests_count("/category/{id}", "200")
+    mocked_category = MockedCategory(1, "test1")
+    mock_categories(mocker, [mocked_category])
+    response = client.get("/category/1")
+    assert response.status_code == 200
+    assert get_requests_count("/category/{id}", "200") == count + 1
+
+    count = get_requests_count("<unmatched>", "404")
+    assert client.get("/not/a/route").status_code == 404
+    assert get_requests_count("<unmatched>", "404") == count + 1
+
+    response = client.get("/metrics")
+    for metric in ("http_request_duration_seconds_bucket",
+                   "http_requests_in_progress",
+                   "http_response_size_bytes_sum"):
+        assert metric in response.text
+    assert 'route="/category/{id}"' in response.text
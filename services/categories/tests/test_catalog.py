@@ -0,0 +1,56 @@
+"""Testing in-memory categories catalog."""
+from app.catalog import CategoriesCatalog
+
+CATEGORIES = [(3, "Science Fiction"), (1, "History"), (2, "Fiction"),
+              (4, "מחשבת ישראל"), (5, "100% Poetry")]
+
+
+def get_loaded_catalog():
+    """Create catalog with the tests categories."""
+    catalog = CategoriesCatalog()
+    catalog.load(CATEGORIES)
+    return catalog
+
+
+def test_search_by_substring():
+    """Test case insensitive contains search."""
+    catalog = get_loaded_catalog()
+    assert catalog.search(filter="fiction") == [(2, "Fiction"),
+                                                (3, "Science Fiction")]
+    assert catalog.search(filter="ION") == [(2, "Fiction"),
+                                            (3, "Science Fiction")]
+    # Shorter than an n-gram.
+    assert catalog.search(filter="Hi") == [(1, "History")]
+    assert catalog.search(filter="ישר") == [(4, "מחשבת ישראל")]
+    assert catalog.search(filter="%") == [(5, "100% Poetry")]
+    assert catalog.search(filter="not exists") == []
+
+
+def test_search_by_prefix():
+    """Test case insensitive prefix search."""
+    catalog = get_loaded_catalog()
+    assert catalog.search(prefix="fic") == [(2, "Fiction")]
+    assert catalog.search(prefix="") == sorted(CATEGORIES)
+    assert catalog.search(prefix="s", filter="fiction") == \
+        [(3, "Science Fiction")]
+    assert catalog.search(prefix="z") == []
+
+
+def test_catalog_rendering():
+    """Test the pre-rendered responses."""
+    catalog = get_loaded_catalog()
+    assert catalog.search() == sorted(CATEGORIES)
+    assert "מחשבת ישראל" in catalog.body.decode()
+    body, etag = catalog.get_rendered_category(1)
+    assert body == b'{"id":1,"name":"History"}'
+    assert etag.startswith('"')
+    assert catalog.get_rendered_category(10) is None
+    assert not catalog.is_stale
+
+
+def test_get_categories():
+    """Test getting many categories by id."""
+    catalog = get_loaded_catalog()
+    assert catalog.get_categories([1, 3, 404]) == {1: "History",
+                                                   3: "Science Fiction"}
+    assert catalog.get_categories([]) == {}
@@ -1,14 +1,18 @@
 """Testing CRUD calls."""
+import asyncio
 import logging
 
+from databases import Database
 from sqlalchemy import create_engine
 from contextlib2 import contextmanager
 from sqlalchemy.orm import sessionmaker
 from testing.postgresql import Postgresql
 
+from app.catalog import catalog
 from app.db.config import (init_categories, get_categories_dataset)
 from app.db.crud import (get_all_categories, get_categories_by_name,
-                         insert_new_category, get_category_by_id)
+                         insert_new_category, get_category_by_id,
+                         fetch_all_categories)
 
 # Tests logger.
 logger = logging.getLogger()
@@ -36,6 +40,15 @@ def mocked_transaction():
         s.close()
 
 
+def run_async_crud(crud_function, *args):
+    """Run async CRUD function with connection to the tests temp db."""
+    async def run():
+        async with Database(temp_test_db.url()) as database:
+            return await crud_function(database, *args)
+
+    return asyncio.run(run())
+
+
 def setup_module():
     """Initiating tests temp db.
 
@@ -79,10 +92,13 @@ def test_adding_new_category():
     """Test adding new category functionality."""
     tested_category = "test_category"
 
+    catalog.load([])
     with mocked_transaction() as session:
         insert_new_category(session, tested_category)
         categories = get_categories_by_name(session, filter=tested_category)
         assert [category.name for category in categories] == [tested_category]
+    # Catalog is reloaded after categories change.
+    assert catalog.is_stale
 
 
 def test_get_existing_category():
@@ -100,3 +116,25 @@ def test_get_existing_category():
 
         category = get_category_by_id(session, id=category.id)
         assert category.name == tested_category
+
+
+def test_fetch_categories():
+    """Test getting categories functionality (async)."""
+    tested_category = "fetched_category"
+
+    with mocked_transaction() as session:
+        insert_new_category(session, tested_category)
+
+    categories_names = set(category["name"] for category in
+                           run_async_crud(fetch_all_categories))
+    assert tested_category in categories_names
+
+
+def test_get_categories_by_name_case_insensitive():
+    """Test filtering categories by name ignores case and wildcards."""
+    with mocked_transaction() as session:
+        insert_new_category(session, "Mixed_Case")
+        categories = get_categories_by_name(session, filter="mixed_c")
+        assert [category.name for category in categories] == ["Mixed_Case"]
+        # LIKE wildcards are matched literally.
+        assert get_categories_by_name(session, filter="mixed%") == []
@@ -0,0 +1,86 @@
+"""Testing SQL statements timing and logging."""
+import json
+import logging
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from prometheus_client import REGISTRY
+
+from app.db.query_stats import instrument_engine, track_request_statements
+
+ROUTE = "/tests/{id}"
+
+
+def get_logged_events(caplog, event_name):
+    """Get the structured events that were logged."""
+    events = [json.loads(record.getMessage()) for record in caplog.records
+              if record.name == "app.db.query_stats"]
+    return [event for event in events if event["event"] == event_name]
+
+
+def test_request_statements():
+    """Test counting the statements and rows of request."""
+    engine = instrument_engine(create_engine("sqlite://"))
+    count = REGISTRY.get_sample_value("db_request_statements_count",
+                                      {"route": ROUTE}) or 0
+    with track_request_statements(ROUTE) as stats:
+        engine.execute("CREATE TABLE books (id INTEGER)")
+        engine.execute("INSERT INTO books VALUES (1), (2)")
+        engine.execute("SELECT id FROM books").fetchall()
+
+    assert stats.statements == 3
+    assert stats.rows == 2
+    assert stats.duration > 0
+    assert REGISTRY.get_sample_value("db_request_statements_count",
+                                     {"route": ROUTE}) == count + 1
+    assert REGISTRY.get_sample_value("db_statement_duration_seconds_count",
+                                     {"operation": "SELECT"}) >= 1
+
+    # Statements outside of requests are timed but not counted.
+    engine.execute("SELECT 1")
+    assert stats.statements == 3
+
+
+def test_slow_statements_log(mocker, caplog):
+    """Test logging statements slower than the threshold."""
+    engine = instrument_engine(create_engine("sqlite://"))
+    caplog.set_level(logging.WARNING)
+    mocker.patch('app.db.query_stats.DB_SLOW_STATEMENT_THRESHOLD', 10 ** 6)
+    with track_request_statements(ROUTE):
+        engine.execute("SELECT 1")
+    assert get_logged_events(caplog, "slow_statement") == []
+
+    # Any duration is above the minimal threshold.
+    mocker.patch('app.db.query_stats.DB_SLOW_STATEMENT_THRESHOLD',
+                 10 ** -9)
+    with track_request_statements(ROUTE):
+        engine.execute("SELECT 1")
+    event, = get_logged_events(caplog, "slow_statement")
+    assert event["route"] == ROUTE
+    assert event["statement"] == "SELECT 1"
+
+
+def test_repeated_statements_log(mocker, caplog):
+    """Test logging repeated identical statements in debug mode."""
+    engine = instrument_engine(create_engine("sqlite://"))
+    caplog.set_level(logging.WARNING)
+    mocker.patch('app.db.query_stats.DB_STATEMENTS_DEBUG', True)
+    mocker.patch('app.db.query_stats.DB_REPEATED_STATEMENT_THRESHOLD', 3)
+    with track_request_statements(ROUTE):
+        for id in range(3):
+            engine.execute("SELECT ?", id)
+        engine.execute("SELECT 1")
+    event, = get_logged_events(caplog, "repeated_statement")
+    assert event == {"event": "repeated_statement", "route": ROUTE,
+                     "amount": 3, "statement": "SELECT ?"}
+
+
+def test_failed_statement():
+    """Test timing statements after a failed statement."""
+    engine = instrument_engine(create_engine("sqlite://"))
+    with track_request_statements(ROUTE) as stats:
+        with pytest.raises(OperationalError):
+            engine.execute("SELECT * FROM missing")
+        engine.execute("SELECT 1")
+    assert stats.statements == 1
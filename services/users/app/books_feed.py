@@ -0,0 +1,164 @@
+"""Replicating users changes to the books service, for the books feeds.
+
+The books service keeps a feed of the books near each user, from replicas of
+the users locations and categories. The notifications are sent after the
+response (background tasks) and retried, a notification that still fails is
+logged, and the replicas are fixed by resync.
+
+Usage (from the users service directory):
+    python -m app.books_feed
+"""
+import os
+import logging
+from time import sleep
+
+import requests
+from starlette.status import HTTP_404_NOT_FOUND
+
+from .db.config import Session
+from .db.crud import get_users_locations_and_categories
+
+# Notifications are disabled when not set.
+BOOKS_SERVICE_URL = os.environ.get("BOOKS_SERVICE_URL")
+BOOKS_SERVICE_TIMEOUT = float(os.environ.get("BOOKS_SERVICE_TIMEOUT",
+                                             "5"))  # Seconds.
+BOOKS_SERVICE_RETRIES = int(os.environ.get("BOOKS_SERVICE_RETRIES", "3"))
+# Seconds, doubled after every retry.
+BOOKS_SERVICE_RETRY_DELAY = float(os.environ.get("BOOKS_SERVICE_RETRY_DELAY",
+                                                 "0.5"))
+
+logger = logging.getLogger(__name__)
+
+
+def is_replication_enabled():
+    """Check if users changes are replicated to the books service."""
+    return bool(BOOKS_SERVICE_URL)
+
+
+def _request(method, path, **kwargs):
+    """Send request to the books service, retrying connection errors,
+    timeouts and server errors.
+
+    Returns:
+        Response. Response of the last attempt.
+
+    Raises:
+        requests.RequestException. The last attempt failed to connect.
+    """
+    for attempt in range(BOOKS_SERVICE_RETRIES + 1):
+        if attempt:
+            sleep(BOOKS_SERVICE_RETRY_DELAY * 2 ** (attempt - 1))
+
+        try:
+            response = requests.request(method, f"{BOOKS_SERVICE_URL}{path}",
+                                        timeout=BOOKS_SERVICE_TIMEOUT,
+                                        **kwargs)
+
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == BOOKS_SERVICE_RETRIES:
+                raise
+            continue
+
+        if response.status_code < 500 or attempt == BOOKS_SERVICE_RETRIES:
+            return response
+
+
+def _put_user(id, latitude, longitude, categories_ids):
+    """Send user replica to the books service."""
+    _request("PUT", f"/feed/users/{id}",
+             json={"latitude": latitude, "longitude": longitude,
+                   "categories_ids": categories_ids or []}).raise_for_status()
+
+
+def _delete_user(id):
+    """Remove user replica from the books service."""
+    response = _request("DELETE", f"/feed/users/{id}")
+    # Already removed, like by an attempt that timed out.
+    if response.status_code != HTTP_404_NOT_FOUND:
+        response.raise_for_status()
+
+
+def notify_user_updated(id, latitude, longitude, categories_ids):
+    """Replicate added or updated user.
+
+    Args:
+        id (int): User id.
+        latitude (float): User location latitude.
+        longitude (float): User location longitude.
+        categories_ids (list): User categories ids.
+    """
+    if not is_replication_enabled():
+        return
+
+    try:
+        _put_user(id, latitude, longitude, categories_ids)
+
+    except requests.RequestException:
+        logger.exception("Books feed replication of user %d failed", id)
+
+
+def notify_user_deleted(id):
+    """Remove deleted user.
+
+    Args:
+        id (int): User id.
+    """
+    if not is_replication_enabled():
+        return
+
+    try:
+        _delete_user(id)
+
+    except requests.RequestException:
+        logger.exception("Books feed replication of user %d failed", id)
+
+
+def resync_users(session):
+    """Replicate all the users, and remove the replicas of deleted users.
+
+    Args:
+        session (Session): DB session.
+
+    Returns:
+        tuple. Amounts of replicated and removed users.
+
+    Raises:
+        requests.RequestException. The books service failed.
+
+    Notes:
+        The replicas are listed before the users, so users added meanwhile
+        are not removed. Users deleted meanwhile may be replicated again,
+        resync again after them.
+    """
+    response = _request("GET", "/feed/users")
+    response.raise_for_status()
+    replicated_ids = set(response.json())
+
+    users_ids = set()
+    for id, latitude, longitude, categories_ids in \
+            get_users_locations_and_categories(session):
+        _put_user(id, latitude, longitude, categories_ids)
+        users_ids.add(id)
+
+    removed_ids = replicated_ids - users_ids
+    for id in removed_ids:
+        _delete_user(id)
+    return len(users_ids), len(removed_ids)
+
+
+def main():
+    if not is_replication_enabled():
+        raise SystemExit("BOOKS_SERVICE_URL is not set.")
+
+    session = Session()
+    try:
+        replicated, removed = resync_users(session)
+
+    finally:
+        session.close()
+
+    print(f"Replicated {replicated} users, removed {removed} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""In-memory caches."""
+import os
+from threading import Lock
+from time import monotonic
+from collections import OrderedDict
+
+from prometheus_client import Counter
+
+USERS_CACHE_SIZE = int(os.environ.get("USERS_CACHE_SIZE", "10000"))
+USERS_CACHE_TTL = float(os.environ.get("USERS_CACHE_TTL", "60"))  # Seconds.
+
+CACHE_HITS = Counter("cache_hits_total", "Cache lookups that were found.",
+                     ["cache"])
+CACHE_MISSES = Counter("cache_misses_total",
+                       "Cache lookups that were not found or expired.",
+                       ["cache"])
+
+
+class TTLCache:
+    """Least recently used cache with entries expiration.
+
+    Attributes:
+        name (str): Cache name, used as the metrics label.
+        max_size (int): Max amount of entries.
+        ttl (float): Entry time to live in seconds.
+    """
+
+    def __init__(self, name, max_size, ttl):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = Lock()
+        self._entries = OrderedDict()  # key -> (expiration, value)
+        self._hits = CACHE_HITS.labels(name)
+        self._misses = CACHE_MISSES.labels(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Get cached value.
+
+        Args:
+            key (object): Entry key.
+
+        Returns:
+            object. Cached value, None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > monotonic():
+                self._entries.move_to_end(key)
+                self._hits.inc()
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+            self._misses.inc()
+            return None
+
+    def set(self, key, value):
+        """Cache value, evicting the least recently used entry when full.
+
+        Args:
+            key (object): Entry key.
+            value (object): Entry value.
+        """
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Remove entry if it exists.
+
+        Args:
+            key (object): Entry key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all the entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+class UsersCache:
+    """Users rows cache, by id and by email.
+
+    Notes:
+        Lowercased emails are mapped to ids, so invalidating the user id is
+        enough.
+        Other processes can't invalidate this cache, so the TTL bounds how
+        long a changed user can be stale.
+    """
+
+    def __init__(self, max_size=USERS_CACHE_SIZE, ttl=USERS_CACHE_TTL):
+        self._users = TTLCache("users", max_size, ttl)
+        self._ids = TTLCache("users_emails", max_size, ttl)
+
+    def get_by_id(self, id):
+        """Get cached user row by id."""
+        return self._users.get(id)
+
+    def get_by_email(self, email):
+        """Get cached user row by email."""
+        id = self._ids.get(email)
+        if id is None:
+            return None
+
+        user = self._users.get(id)
+        if user is None or user["email"].lower() != email:
+            return None
+        return user
+
+    def set(self, user):
+        """Cache user row."""
+        self._users.set(user["id"], user)
+        self._ids.set(user["email"].lower(), user["id"])
+
+    def invalidate(self, id):
+        """Remove cached user."""
+        self._users.delete(id)
+
+    def clear(self):
+        """Remove all cached users."""
+        self._users.clear()
+        self._ids.clear()
+
+
+users_cache = UsersCache()
@@ -0,0 +1,34 @@
+"""Add users lowercased email unique index
+
+Revision ID: 5d8c1e7b2a93
+Revises: 9a2f6c8e4d17
+Create Date: 2026-10-19 09:14:52.730418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8c1e7b2a93'
+down_revision = '9a2f6c8e4d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Emails that differ only by case can't get a unique lowercased index,
+    # they are reported to be resolved (merged or deleted) before upgrading.
+    collisions = op.get_bind().execute(sa.text(
+        "SELECT lower(email), array_agg(email ORDER BY id) FROM users "
+        "GROUP BY lower(email) HAVING count(*) > 1")).fetchall()
+    if collisions:
+        raise RuntimeError("Emails collide when lowercased: " + "; ".join(
+            f"{email}: {', '.join(emails)}" for email, emails in collisions))
+
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')],
+                    unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_users_email_lower', table_name='users')
@@ -1,9 +1,27 @@
 """Users CRUD db operations."""
-import hashlib
-
-from sqlalchemy import asc
+from sqlalchemy import (asc, and_, or_, tuple_, select, delete, update, any_,
+                        bindparam, func, ARRAY, Integer)
+from sqlalchemy.dialects.postgresql import insert
 
 from .tables import User
+from ..geo import get_bounding_box, get_distance, MAX_DISTANCE
+from ..geo_index import users_index
+from ..cache import users_cache
+from ..passwords import (hash_password, verify_password, needs_rehash,
+                         run_in_pool, run_in_pool_async)
+
+LOCATIONS_BATCH_SIZE = 10000
+NEAREST_INITIAL_RADIUS = 1  # KM
+# User response fields, without the password and the join date.
+USER_COLUMNS = (User.id, User.email, User.name, User.address, User.latitude,
+                User.longitude, User.categories_ids)
+MIN_DB_INTEGER, MAX_DB_INTEGER = -2 ** 31, 2 ** 31 - 1
+
+
+def _is_db_integer(value):
+    """Check if value is in the Integer columns range, the async driver
+    can't bind integers out of it."""
+    return MIN_DB_INTEGER <= value <= MAX_DB_INTEGER
 
 
 def get_all_users(session):
@@ -13,12 +31,12 @@ def get_all_users(session):
        session (Session): DB session.
 
     Returns:
-        list. User objects.
+        list. Users rows.
 
     Notes:
         Internal endpoint for tests.
     """
-    return session.query(User).all()
+    return session.query(*USER_COLUMNS).all()
 
 
 def get_user_by_id(session, id: int):
@@ -29,9 +47,9 @@ def get_user_by_id(session, id: int):
         id (int): User id.
 
     Returns:
-        list. User objects.
+        tuple. Founded user row.
     """
-    return session.query(User).filter_by(id=id).first()
+    return session.query(*USER_COLUMNS).filter(User.id == id).first()
 
 
 def get_user_by_email(session, email: str):
@@ -42,9 +60,123 @@ def get_user_by_email(session, email: str):
         session (Session): DB session.
 
     Returns:
-        User. Founded user.
+        tuple. Founded user row.
+    """
+    return session.query(*USER_COLUMNS).filter(
+        func.lower(User.email) == email).first()
+
+
+async def fetch_user_by_id(database, id: int):
+    """Get specific user by id (async, cached).
+
+    Args:
+        database (Database): Async DB connections pool.
+        id (int): User id.
+
+    Returns:
+        Record. Founded user row.
+    """
+    if not _is_db_integer(id):
+        return None
+
+    user = users_cache.get_by_id(id)
+    if user is None:
+        user = await database.fetch_one(select(USER_COLUMNS).where(
+            User.id == id))
+        if user is not None:
+            users_cache.set(user)
+    return user
+
+
+async def fetch_user_by_email(database, email: str):
+    """Get specific user by email address (async, cached).
+
+    Args:
+        email (str): User email.
+        database (Database): Async DB connections pool.
+
+    Returns:
+        Record. Founded user row.
     """
-    return session.query(User).filter_by(email=email).first()
+    user = users_cache.get_by_email(email)
+    if user is None:
+        user = await database.fetch_one(select(USER_COLUMNS).where(
+            func.lower(User.email) == email))
+        if user is not None:
+            users_cache.set(user)
+    return user
+
+
+async def fetch_users_by_ids(database, ids: list):
+    """Get many users by ids in one query (async, cached).
+
+    Args:
+        database (Database): Async DB connections pool.
+        ids (list): Users ids.
+
+    Returns:
+        dict. Id to user row of the found users.
+    """
+    users = {}
+    missing_ids = []
+    for id in set(filter(_is_db_integer, ids)):
+        user = users_cache.get_by_id(id)
+        if user is None:
+            missing_ids.append(id)
+        else:
+            users[id] = user
+
+    if missing_ids:
+        for user in await database.fetch_all(select(USER_COLUMNS).where(
+                User.id == any_(bindparam("ids", missing_ids,
+                                          type_=ARRAY(Integer))))):
+            users_cache.set(user)
+            users[user["id"]] = user
+    return users
+
+
+async def fetch_user_categories(database, id: int):
+    """Get the categories ids of specific user (async).
+
+    Args:
+        id (int): User id.
+        database (Database): Async DB connections pool.
+
+    Returns:
+        list. Categories ids, None if the user was not found.
+    """
+    user = await fetch_user_by_id(database, id)
+    if user is None:
+        return None
+    return user["categories_ids"] or []
+
+
+async def check_user_credentials(database, email: str, password: str):
+    """Check if the user is authenticated (async).
+
+    Args:
+        email (str): User email.
+        password (str): User (not hashed) password.
+        database (Database): Async DB connections pool.
+
+    Returns:
+        int. User id, None if the email or password are wrong.
+
+    Notes:
+        Hashing runs in the passwords processes pool. Passwords with legacy
+        or outdated hash are rehashed after successful check.
+    """
+    user = await database.fetch_one(select([User.id, User.password]).where(
+        func.lower(User.email) == email))
+    if user is None or not await run_in_pool_async(
+            verify_password, password, user["password"]):
+        return None
+
+    if needs_rehash(user["password"]):
+        hashed_password = await run_in_pool_async(hash_password, password)
+        await database.execute(update(User).where(
+            User.id == user["id"]).values(password=hashed_password))
+    return user["id"]
 
 
 def is_authenticated_user(session, email: str, password: str):
@@ -58,10 +190,10 @@ def is_authenticated_user(session, email: str, password: str):
     Returns:
         bool. If the user was found.
     """
-    hashed_password = hashlib.md5(password.encode()).hexdigest()
-    user = session.query(User).filter_by(email=email,
-                                         password=hashed_password).first()
-    return user is not None
+    hashed_password = session.query(User.password).filter(
+        func.lower(User.email) == email).scalar()
+    return hashed_password is not None and run_in_pool(
+        verify_password, password, hashed_password)
 
 
 def add_user(session, name: str, email: str, password: str, address: str,
@@ -78,24 +210,51 @@ def add_user(session, name: str, email: str, password: str, address: str,
         longitude (float): User home address longitude.
 
     Returns:
-        User. New user object.
-    """
-    hashed_password = hashlib.md5(password.encode()).hexdigest()
-    new_user = User(name=name,
-                    email=email,
-                    address=address,
-                    password=hashed_password,
-                    latitude=latitude,
-                    longitude=longitude,
-                    categories_ids=[])
+        tuple. New user row, None if the email is already taken.
 
-    session.add(new_user)
+    Notes:
+        Single INSERT ... ON CONFLICT DO NOTHING RETURNING statement, the
+        lowercased email unique index is the uniqueness check.
+    """
+    hashed_password = run_in_pool(hash_password, password)
+    new_user = session.execute(
+        insert(User).values(name=name, email=email, address=address,
+                            password=hashed_password, latitude=latitude,
+                            longitude=longitude, categories_ids=[])
+        .on_conflict_do_nothing(index_elements=[func.lower(User.email)])
+        .returning(*USER_COLUMNS)).first()
     session.commit()
-    # Retrieving new data like generated id.
-    session.refresh(new_user)
+    if new_user is None:
+        return None
+
+    users_index.add(new_user.id, new_user.latitude, new_user.longitude)
+    users_cache.invalidate(new_user.id)
     return new_user
 
 
+def insert_users(session, users):
+    """Insert many users in one statement, skipping taken emails.
+
+    Args:
+        session (Session): DB session.
+        users (list): Users columns dicts, with hashed passwords.
+
+    Returns:
+        list. (id, email) tuples of the inserted users.
+    """
+    if not users:
+        return []
+
+    inserted = session.execute(
+        insert(User).values(users).on_conflict_do_nothing(
+            index_elements=[func.lower(User.email)]).returning(
+            User.id, User.email, User.latitude, User.longitude)).fetchall()
+    session.commit()
+    for id, _, latitude, longitude in inserted:
+        users_index.add(id, latitude, longitude)
+    return [(id, email) for id, email, _, _ in inserted]
+
+
 def delete_user(session, email: str, password: str):
     """Delete specific user.
 
@@ -105,17 +264,32 @@ def delete_user(session, email: str, password: str):
         password (str): User (not hashed) password.
 
     Returns:
-        bool. If the user was found and deleted or not.
+        int. Deleted user id, None if the user was not found or the password
+        is wrong.
     """
-    hashed_password = hashlib.md5(password.encode()).hexdigest()
-    user = session.query(User).filter_by(email=email,
-                                         password=hashed_password).first()
-    if user is None:
-        return False
+    user = session.query(User.id, User.password).filter(
+        func.lower(User.email) == email).first()
+    if user is None or not run_in_pool(verify_password, password,
+                                       user.password):
+        return None
+    return user.id if delete_user_by_id(session, user.id) else None
+
 
-    session.delete(user)
+def delete_user_by_id(session, id: int):
+    """Delete specific user by id.
+
+    Args:
+        id (int): User id.
+        session (Session): DB session.
+
+    Returns:
+        bool. If the user was found and deleted or not.
+    """
+    deleted = session.execute(delete(User).where(User.id == id)).rowcount
     session.commit()
-    return True
+    users_index.remove(id)
+    users_cache.invalidate(id)
+    return deleted > 0
 
 
 def _get_distance(base_latitude, base_longitude, target_latitude,
@@ -125,41 +299,222 @@ def _get_distance(base_latitude, base_longitude, target_latitude,
     Notes:
         Debugging function.
     """
-    from math import sin, cos, sqrt, atan2, radians
-
     if logger:
         logger.debug("Calculating distance between (%f, %f), (%f, %f)",
                      base_latitude, base_longitude, target_latitude,
                      target_longitude)
 
-    R = 6373.0  # approximate radius of earth in km
-    lat1 = radians(base_latitude)
-    lon1 = radians(base_longitude)
-    lat2 = radians(target_latitude)
-    lon2 = radians(target_longitude)
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+    return get_distance(base_latitude, base_longitude, target_latitude,
+                        target_longitude)
 
 
-def get_near_users(session, latitude: float, longitude: float, radius: int):
-    """Get all users in range of radius (KM).
+def _in_bounding_box(latitude: float, longitude: float, radius: int):
+    """Get filter of the users inside the bounding box of a circle.
+
+    Args:
+        radius (int): Radius in KM.
+        latitude (float): Circle center latitude.
+        longitude (float): Circle center longitude.
+
+    Notes:
+        Uses the (latitude, longitude) index, so the exact distance is
+        calculated only for the users inside the box.
+    """
+    min_latitude, max_latitude, min_longitude, max_longitude = \
+        get_bounding_box(latitude, longitude, radius)
+    latitude_filter = User.latitude.between(min_latitude, max_latitude)
+
+    if min_longitude <= max_longitude:
+        return and_(latitude_filter,
+                    User.longitude.between(min_longitude, max_longitude))
+
+    # The box crosses the 180th meridian.
+    return and_(latitude_filter, or_(User.longitude >= min_longitude,
+                                     User.longitude <= max_longitude))
+
+
+def get_users_locations(session):
+    """Get the locations of all the users.
+
+    Args:
+        session (Session): DB session.
+
+    Returns:
+        iterable. (id, latitude, longitude) tuples.
+    """
+    return session.query(User.id, User.latitude, User.longitude).yield_per(
+        LOCATIONS_BATCH_SIZE)
+
+
+def get_users_locations_and_categories(session):
+    """Get the locations and categories of all the users.
+
+    Args:
+        session (Session): DB session.
+
+    Returns:
+        iterable. (id, latitude, longitude, categories ids) tuples.
+    """
+    return session.query(User.id, User.latitude, User.longitude,
+                         User.categories_ids).yield_per(LOCATIONS_BATCH_SIZE)
+
+
+def _get_users_by_distances(session, distances):
+    """Fetch users by their ids, keeping the distances order.
+
+    Args:
+        session (Session): DB session.
+        distances (list): (distance, id) tuples.
+
+    Returns:
+        list. (user row, distance) tuples.
+    """
+    if not distances:
+        return []
+
+    users = {user.id: user for user in session.query(*USER_COLUMNS).filter(
+        User.id.in_([id for _, id in distances]))}
+    return [(users[id], distance) for distance, id in distances
+            if id in users]
+
+
+def get_near_users(session, latitude: float, longitude: float, radius: int,
+                   limit: int = None, after: tuple = None):
+    """Get all users in range of radius (KM), sorted by distance.
 
     Args:
         radius (int): Radius in KM.
         session (Session): DB session.
         latitude (float): User home address latitude.
         longitude (float): User home address longitude.
+        limit (int): Max amount of users, all users when not given.
+        after (tuple): (distance, id) of the last user of the previous page.
 
     Returns:
-        list. User objects.
+        list. (user row, distance) tuples.
+
+    Notes:
+        Uses the in-memory locations index when it is loaded, and fetches
+        only the matching users by primary key.
     """
-    users_in_range = session.query(User).filter(
-        User.in_range(latitude, longitude, radius) <=
-        radius).order_by(asc(User.in_range(latitude, longitude, radius))).all()
-    return users_in_range
+    if users_index.is_loaded:
+        distances = users_index.search(latitude, longitude, radius)
+        if after is not None:
+            distances = [item for item in distances if item > tuple(after)]
+        return _get_users_by_distances(session, distances[:limit])
+
+    distance = User.in_range(latitude, longitude, radius)
+    query = session.query(*USER_COLUMNS, distance.label("distance")).filter(
+        _in_bounding_box(latitude, longitude, radius)).filter(
+        distance <= radius)
+    if after is not None:
+        query = query.filter(tuple_(distance, User.id) > tuple_(*after))
+    return [(user, user.distance) for user in query.order_by(
+        asc(distance), asc(User.id)).limit(limit)]
+
+
+def get_nearest_users(session, latitude: float, longitude: float, k: int):
+    """Get the k nearest users, sorted by distance.
+
+    Args:
+        k (int): Max amount of users.
+        session (Session): DB session.
+        latitude (float): Search location latitude.
+        longitude (float): Search location longitude.
+
+    Returns:
+        list. (user row, distance) tuples.
+
+    Notes:
+        Without the in-memory locations index, searches with growing radius
+        so every query is bounded by the location index.
+    """
+    if users_index.is_loaded:
+        return _get_users_by_distances(
+            session, users_index.nearest(latitude, longitude, k))
+
+    radius = NEAREST_INITIAL_RADIUS
+    while True:
+        users = get_near_users(session, latitude, longitude, radius, limit=k)
+        if len(users) == k or radius >= MAX_DISTANCE:
+            return users
+        radius = min(radius * 2, MAX_DISTANCE)
+
+
+def get_users_by_categories(session, categories_ids: list,
+                            match_all: bool = False, limit: int = None,
+                            after_id: int = None):
+    """Get users interested in categories, sorted by id.
+
+    Args:
+        session (Session): DB session.
+        categories_ids (list): Categories ids.
+        match_all (bool): Users interested in all the categories, or in any
+            of them.
+        limit (int): Max amount of users, all users when not given.
+        after_id (int): Get only users after this id (keyset pagination).
+
+    Returns:
+        list. Users rows.
+
+    Notes:
+        Overlap (&&) and containment (@>) are served by the categories GIN
+        index.
+    """
+    if match_all:
+        categories_filter = User.categories_ids.contains(categories_ids)
+    else:
+        categories_filter = User.categories_ids.overlap(categories_ids)
+
+    query = session.query(*USER_COLUMNS).filter(categories_filter)
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+    return query.order_by(User.id).limit(limit).all()
+
+
+def get_matching_users(session, latitude: float, longitude: float,
+                       radius: int, categories_ids: list,
+                       exclude_id: int = None):
+    """Get users in range of radius (KM) interested in any of categories.
+
+    Args:
+        radius (int): Radius in KM.
+        session (Session): DB session.
+        latitude (float): Search location latitude.
+        longitude (float): Search location longitude.
+        categories_ids (list): Categories ids.
+        exclude_id (int): User to leave out, like the book owner.
+
+    Returns:
+        list. (user row, distance) tuples, sorted by distance.
+
+    Notes:
+        The in-radius users from the in-memory locations index (or the
+        location index bounding box) are intersected with the categories
+        GIN index in one query, instead of checking each nearby user.
+    """
+    categories_filter = User.categories_ids.overlap(categories_ids)
+    if users_index.is_loaded:
+        distances = [item for item in users_index.search(latitude, longitude,
+                                                         radius)
+                     if item[1] != exclude_id]
+        if not distances:
+            return []
+
+        users = {user.id: user for user in session.query(
+            *USER_COLUMNS).filter(User.id.in_(
+                [id for _, id in distances])).filter(categories_filter)}
+        return [(users[id], distance) for distance, id in distances
+                if id in users]
+
+    distance = User.in_range(latitude, longitude, radius)
+    query = session.query(*USER_COLUMNS, distance.label("distance")).filter(
+        _in_bounding_box(latitude, longitude, radius)).filter(
+        distance <= radius).filter(categories_filter)
+    if exclude_id is not None:
+        query = query.filter(User.id != exclude_id)
+    return [(user, user.distance) for user in query.order_by(
+        asc(distance), asc(User.id))]
 
 
 def update_categories_to_user(session, user_id, categories_ids):
@@ -169,7 +524,14 @@ def update_categories_to_user(session, user_id, categories_ids):
         user_id (int): User id.
         session (Session): DB session.
         categories_ids (list): Categories ids.
+
+    Returns:
+        Row. Updated user id, location and categories, None if the user was
+        not found.
     """
-    session.query(User).filter(User.id == user_id).update(
-        {'categories_ids': categories_ids})
+    user = session.execute(update(User).where(User.id == user_id).values(
+        categories_ids=categories_ids).returning(
+        User.id, User.latitude, User.longitude, User.categories_ids)).first()
     session.commit()
+    users_cache.invalidate(user_id)
+    return user
@@ -0,0 +1,148 @@
+"""SQL statements timing, slow statements log and repeated statements
+detection.
+
+The engine cursor events time every statement, and add it to the stats of
+the HTTP request that issued it (set by the metrics middleware in a context
+variable, so it is shared with the threadpool the sync endpoints run in).
+"""
+import os
+import json
+import logging
+from time import perf_counter
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from prometheus_client import Histogram
+
+# Milliseconds, statements slower than this are logged. 0 disables the log.
+DB_SLOW_STATEMENT_THRESHOLD = int(os.environ.get(
+    "DB_SLOW_STATEMENT_THRESHOLD", "200"))
+# Debug mode, requests that repeat an identical statement (N+1 queries) are
+# logged.
+DB_STATEMENTS_DEBUG = os.environ.get("DB_STATEMENTS_DEBUG",
+                                     "false").lower() == "true"
+DB_REPEATED_STATEMENT_THRESHOLD = int(os.environ.get(
+    "DB_REPEATED_STATEMENT_THRESHOLD", "5"))
+
+STATEMENT_LATENCY = Histogram("db_statement_duration_seconds",
+                              "SQL statements execution time.",
+                              ["operation"])
+STATEMENT_ROWS = Histogram("db_statement_rows",
+                           "Rows returned or changed by SQL statements.",
+                           ["operation"],
+                           buckets=(0, 1, 10, 100, 1000, 10000, 100000))
+REQUEST_STATEMENTS = Histogram("db_request_statements",
+                               "SQL statements per HTTP request.", ["route"],
+                               buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    """SQL statements of an HTTP request.
+
+    Attributes:
+        route (str): Request route template.
+        statements (int): Amount of statements.
+        duration (float): Statements total time in seconds.
+        rows (int): Rows returned or changed by the statements.
+        repeated (Counter): Statement text -> amount, in debug mode.
+    """
+
+    def __init__(self, route):
+        self.route = route
+        self.statements = 0
+        self.duration = 0.0
+        self.rows = 0
+        self.repeated = Counter()
+
+
+_request_stats = ContextVar("request_stats", default=None)
+
+
+def _get_operation(statement):
+    """Get the SQL operation of a statement, like SELECT."""
+    words = statement.split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def _log(event_name, **fields):
+    """Log structured event as JSON."""
+    logger.warning(json.dumps(dict(event=event_name, **fields)))
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters,
+                           context, executemany):
+    connection.info.setdefault("statements_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters,
+                          context, executemany):
+    duration = perf_counter() - connection.info["statements_start"].pop()
+    # Unknown for server side cursors (-1).
+    rows = max(cursor.rowcount, 0)
+    operation = _get_operation(statement)
+    STATEMENT_LATENCY.labels(operation).observe(duration)
+    STATEMENT_ROWS.labels(operation).observe(rows)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.duration += duration
+        stats.rows += rows
+        if DB_STATEMENTS_DEBUG:
+            stats.repeated[statement] += 1
+
+    if DB_SLOW_STATEMENT_THRESHOLD and \
+            duration * 1000 >= DB_SLOW_STATEMENT_THRESHOLD:
+        _log("slow_statement", route=stats and stats.route,
+             duration_ms=round(duration * 1000, 3), rows=rows,
+             statement=statement)
+
+
+def _handle_error(exception_context):
+    # Failed statements don't reach the after execute event.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("statements_start"):
+        connection.info["statements_start"].pop()
+
+
+def instrument_engine(engine):
+    """Time the statements of engine.
+
+    Args:
+        engine (Engine): DB engine.
+
+    Returns:
+        Engine. The instrumented engine.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+
+@contextmanager
+def track_request_statements(route):
+    """Collect the statements of an HTTP request.
+
+    Args:
+        route (str): Request route template.
+
+    Returns:
+        contextmanager. Yields the request RequestStats.
+    """
+    stats = RequestStats(route)
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+
+    finally:
+        _request_stats.reset(token)
+        REQUEST_STATEMENTS.labels(route).observe(stats.statements)
+        for statement, amount in stats.repeated.items():
+            if amount >= DB_REPEATED_STATEMENT_THRESHOLD:
+                _log("repeated_statement", route=route, amount=amount,
+                     statement=statement)
@@ -2,7 +2,8 @@
 import datetime
 
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, ARRAY, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, func
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.hybrid import hybrid_method
 
 Base = declarative_base()
@@ -20,29 +21,28 @@ class User(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     join_date = Column(DateTime, default=datetime.datetime.utcnow)
 
+    # Bounding box prefilter of the geo search, and categories overlap and
+    # containment (&&, @>) search.
+    __table_args__ = (Index('ix_users_latitude_longitude', 'latitude',
+                            'longitude'),
+                      Index('ix_users_categories_ids', 'categories_ids',
+                            postgresql_using='gin'))
+
     def __repr__(self):
         return f"User {self.id}: [{(self.name, self.email)}"
 
     @hybrid_method
     def in_range(self, latitude, longitude, radius):
         """Check if user in range (radius in meters)."""
-        from math import sin, cos, sqrt, atan2, radians
-        R = 6373.0  # approximate radius of earth in km
-        lat1 = radians(self.latitude)
-        lon1 = radians(self.longitude)
-        lat2 = radians(latitude)
-        lon2 = radians(longitude)
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return R * c <= radius
+        from ..geo import get_distance
+        return get_distance(self.latitude, self.longitude, latitude,
+                            longitude) <= radius
 
     @in_range.expression
     def in_range(cls, latitude, longitude, radius):
         """Check if user in range (radius in meters)."""
-        R = 6373.0  # approximate radius of earth in km
         from sqlalchemy import func
+        from ..geo import EARTH_RADIUS as R
         lat1 = func.radians(cls.latitude)
         lon1 = func.radians(cls.longitude)
         lat2 = func.radians(latitude)
@@ -52,5 +52,8 @@ class User(Base):
         a = func.pow(func.sin(dlat / 2), 2) + func.cos(lat1) * func.cos(lat2) \
             * func.pow(func.sin(dlon / 2), 2)
         c = R * 2 * func.atan2(func.sqrt(a), func.sqrt(1 - a))
-        print(c)
         return c
+
+
+# Emails are looked up lowercased, and are unique regardless of case.
+Index('ix_users_email_lower', func.lower(User.email), unique=True)
@@ -0,0 +1,106 @@
+"""Geographic calculations utils."""
+from math import asin, atan2, cos, degrees, pi, radians, sin, sqrt
+
+import numpy as np
+
+EARTH_RADIUS = 6373.0  # approximate radius of earth in km
+MAX_DISTANCE = pi * EARTH_RADIUS  # half of the earth circumference
+MIN_LATITUDE, MAX_LATITUDE = -90.0, 90.0
+MIN_LONGITUDE, MAX_LONGITUDE = -180.0, 180.0
+
+
+def get_bounding_box(latitude, longitude, radius):
+    """Get the smallest coordinates box that contains a circle.
+
+    Args:
+        radius (float): Circle radius in KM.
+        latitude (float): Circle center latitude.
+        longitude (float): Circle center longitude.
+
+    Returns:
+        tuple. (min_latitude, max_latitude, min_longitude, max_longitude).
+
+    Notes:
+        When the box crosses the 180th meridian min_longitude is bigger than
+        max_longitude, and the box is the union of the two sides.
+    """
+    angular_radius = radius / EARTH_RADIUS
+    min_latitude = latitude - degrees(angular_radius)
+    max_latitude = latitude + degrees(angular_radius)
+
+    # A pole is inside the circle, all the longitudes are relevant.
+    if min_latitude <= MIN_LATITUDE or max_latitude >= MAX_LATITUDE:
+        return (max(min_latitude, MIN_LATITUDE),
+                min(max_latitude, MAX_LATITUDE),
+                MIN_LONGITUDE, MAX_LONGITUDE)
+
+    longitude_ratio = sin(angular_radius) / cos(radians(latitude))
+    if longitude_ratio >= 1:
+        return min_latitude, max_latitude, MIN_LONGITUDE, MAX_LONGITUDE
+
+    longitude_delta = degrees(asin(longitude_ratio))
+    min_longitude = longitude - longitude_delta
+    max_longitude = longitude + longitude_delta
+    if min_longitude < MIN_LONGITUDE:
+        min_longitude += 360
+    if max_longitude > MAX_LONGITUDE:
+        max_longitude -= 360
+    return min_latitude, max_latitude, min_longitude, max_longitude
+
+
+def get_distance(base_latitude, base_longitude, target_latitude,
+                 target_longitude):
+    """Get distance between two coordinates in KM (haversine formula)."""
+    lat1 = radians(base_latitude)
+    lon1 = radians(base_longitude)
+    lat2 = radians(target_latitude)
+    lon2 = radians(target_longitude)
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+
+def get_distances(latitude, longitude, latitudes, longitudes):
+    """Get distances between a coordinate and many coordinates in KM.
+
+    Args:
+        latitude (float): Base coordinate latitude.
+        longitude (float): Base coordinate longitude.
+        latitudes (np.ndarray): Target coordinates latitudes (float64).
+        longitudes (np.ndarray): Target coordinates longitudes (float64).
+
+    Returns:
+        np.ndarray. Distances, in the order of the target coordinates.
+    """
+    lat1 = radians(latitude)
+    lon1 = radians(longitude)
+    lat2 = np.radians(latitudes)
+    lon2 = np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def get_k_nearest(latitude, longitude, latitudes, longitudes, k):
+    """Get the k nearest coordinates to a coordinate.
+
+    Args:
+        k (int): Max amount of coordinates.
+        latitude (float): Base coordinate latitude.
+        longitude (float): Base coordinate longitude.
+        latitudes (np.ndarray): Target coordinates latitudes (float64).
+        longitudes (np.ndarray): Target coordinates longitudes (float64).
+
+    Returns:
+        tuple. (indices, distances) of the nearest coordinates sorted by
+        distance.
+    """
+    distances = get_distances(latitude, longitude, latitudes, longitudes)
+    if k < len(distances):
+        indices = np.argpartition(distances, k - 1)[:k]
+    else:
+        indices = np.arange(len(distances))
+    indices = indices[np.argsort(distances[indices], kind="stable")]
+    return indices, distances[indices]
@@ -0,0 +1,217 @@
+"""In-memory users locations index."""
+import os
+from math import floor, radians
+from threading import Lock
+
+import numpy as np
+
+from .geo import (get_bounding_box, get_distances, get_k_nearest,
+                  EARTH_RADIUS, MAX_DISTANCE)
+
+GEO_INDEX_ENABLED = os.environ.get("GEO_INDEX_ENABLED",
+                                   "false").lower() == "true"
+GEO_INDEX_CELL_SIZE = float(os.environ.get("GEO_INDEX_CELL_SIZE", "0.1"))
+
+
+class _Cell:
+    """Grid cell locations with cached contiguous coordinates arrays."""
+    __slots__ = ("locations", "_arrays")
+
+    def __init__(self):
+        self.locations = {}  # id -> (latitude, longitude)
+        self._arrays = None
+
+    def set(self, id, latitude, longitude):
+        self.locations[id] = (latitude, longitude)
+        self._arrays = None
+
+    def discard(self, id):
+        del self.locations[id]
+        self._arrays = None
+
+    @property
+    def arrays(self):
+        """(ids, latitudes, longitudes) arrays, rebuilt after changes."""
+        if self._arrays is None:
+            ids = np.fromiter(self.locations.keys(), dtype=np.int64,
+                              count=len(self.locations))
+            coordinates = np.array(list(self.locations.values()),
+                                   dtype=np.float64)
+            self._arrays = (ids, np.ascontiguousarray(coordinates[:, 0]),
+                            np.ascontiguousarray(coordinates[:, 1]))
+        return self._arrays
+
+
+class GridIndex:
+    """Users locations grouped into fixed size grid cells.
+
+    Attributes:
+        cell_size (float): Cell edge size in degrees.
+        is_loaded (bool): If the index was loaded and can answer searches.
+
+    Notes:
+        Updates are ignored until the index is loaded, so an index that was
+        never loaded can't return partial results.
+    """
+
+    def __init__(self, cell_size=GEO_INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.is_loaded = False
+        self._lock = Lock()
+        self._cells = {}  # (row, column) -> _Cell
+        self._locations = {}  # id -> (latitude, longitude)
+
+    def __len__(self):
+        return len(self._locations)
+
+    def _get_cell(self, latitude, longitude):
+        """Get the cell key of a coordinate."""
+        return (floor(latitude / self.cell_size),
+                floor(longitude / self.cell_size))
+
+    def _insert(self, id, latitude, longitude):
+        """Insert location to the index (lock should be acquired)."""
+        self._discard(id)
+        self._locations[id] = (latitude, longitude)
+        cell = self._get_cell(latitude, longitude)
+        if cell not in self._cells:
+            self._cells[cell] = _Cell()
+        self._cells[cell].set(id, latitude, longitude)
+
+    def _discard(self, id):
+        """Remove location from the index (lock should be acquired)."""
+        location = self._locations.pop(id, None)
+        if location is None:
+            return
+
+        cell = self._get_cell(*location)
+        self._cells[cell].discard(id)
+        if not self._cells[cell].locations:
+            del self._cells[cell]
+
+    def load(self, locations):
+        """Replace the index content.
+
+        Args:
+            locations (iterable): (id, latitude, longitude) tuples.
+        """
+        with self._lock:
+            self._cells = {}
+            self._locations = {}
+            for id, latitude, longitude in locations:
+                self._insert(id, latitude, longitude)
+            self.is_loaded = True
+
+    def clear(self):
+        """Empty the index and mark it as not loaded."""
+        with self._lock:
+            self._cells = {}
+            self._locations = {}
+            self.is_loaded = False
+
+    def add(self, id, latitude, longitude):
+        """Add or move user location.
+
+        Args:
+            id (int): User id.
+            latitude (float): User location latitude.
+            longitude (float): User location longitude.
+        """
+        with self._lock:
+            if self.is_loaded:
+                self._insert(id, latitude, longitude)
+
+    def remove(self, id):
+        """Remove user location.
+
+        Args:
+            id (int): User id.
+        """
+        with self._lock:
+            self._discard(id)
+
+    def _get_cells_in_box(self, min_latitude, max_latitude, min_longitude,
+                          max_longitude):
+        """Get the non empty cells that intersect with a coordinates box."""
+        min_row, min_column = self._get_cell(min_latitude, min_longitude)
+        max_row, max_column = self._get_cell(max_latitude, max_longitude)
+        rows = range(min_row, max_row + 1)
+        if min_column <= max_column:
+            columns = range(min_column, max_column + 1)
+        else:  # The box crosses the 180th meridian.
+            columns = list(range(min_column,
+                                 self._get_cell(0, 180)[1] + 1)) + \
+                      list(range(self._get_cell(0, -180)[1], max_column + 1))
+
+        # Big boxes are faster to scan by the non empty cells.
+        if len(rows) * len(columns) > len(self._cells):
+            columns = set(columns)
+            return [cell for (row, column), cell in self._cells.items()
+                    if row in rows and column in columns]
+
+        return [self._cells[(row, column)] for row in rows
+                for column in columns if (row, column) in self._cells]
+
+    def _get_candidates(self, latitude, longitude, radius):
+        """Get the locations in the cells around a circle.
+
+        Returns:
+            tuple. (ids, latitudes, longitudes) arrays.
+        """
+        box = get_bounding_box(latitude, longitude, radius)
+        with self._lock:
+            arrays = [cell.arrays for cell in self._get_cells_in_box(*box)]
+
+        if not arrays:
+            return (np.empty(0, dtype=np.int64), np.empty(0),
+                    np.empty(0))
+        return tuple(np.concatenate(array) for array in zip(*arrays))
+
+    def search(self, latitude, longitude, radius):
+        """Get all users in range of radius (KM).
+
+        Args:
+            radius (float): Radius in KM.
+            latitude (float): Search center latitude.
+            longitude (float): Search center longitude.
+
+        Returns:
+            list. (distance, id) tuples sorted by distance.
+        """
+        ids, latitudes, longitudes = self._get_candidates(latitude, longitude,
+                                                          radius)
+        distances = get_distances(latitude, longitude, latitudes, longitudes)
+        in_range = distances <= radius
+        ids, distances = ids[in_range], distances[in_range]
+        order = np.lexsort((ids, distances))
+        return list(zip(distances[order].tolist(), ids[order].tolist()))
+
+    def nearest(self, latitude, longitude, k):
+        """Get the k nearest users.
+
+        Args:
+            k (int): Max amount of users.
+            latitude (float): Search center latitude.
+            longitude (float): Search center longitude.
+
+        Returns:
+            list. (distance, id) tuples sorted by distance.
+
+        Notes:
+            Searches in growing radius, starting from the size of a cell, so
+            only the cells around the location are scanned.
+        """
+        radius = radians(self.cell_size) * EARTH_RADIUS
+        while True:
+            ids, latitudes, longitudes = self._get_candidates(
+                latitude, longitude, radius)
+            indices, distances = get_k_nearest(latitude, longitude,
+                                               latitudes, longitudes, k)
+            # Locations outside the searched box are farther than radius.
+            if (len(indices) == k and distances[-1] <= radius) or \
+                    radius >= MAX_DISTANCE:
+                return list(zip(distances.tolist(), ids[indices].tolist()))
+            radius = min(radius * 2, MAX_DISTANCE)
+
+
+users_index = GridIndex()
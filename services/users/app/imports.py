@@ -0,0 +1,243 @@
+"""Bulk users import from CSV or NDJSON.
+
+Usage (from the users service directory):
+    python -m app.imports users.csv [--format ndjson]
+"""
+import os
+import csv
+import sys
+import json
+import argparse
+
+from .passwords import hash_passwords
+from .db.config import Session
+from .db.crud import insert_users
+from .validators import is_valid_email, is_valid_location, normalize_email
+
+# Users per INSERT statement, bounded by the statement parameters limit.
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_FORMATS = ("csv", "ndjson")
+LINE_SEPARATOR = b"\n"
+USER_FIELDS = ("name", "email", "password", "address", "latitude",
+               "longitude")
+MAX_TEXT_LENGTH = 100  # Users text columns length.
+
+
+def parse_user(record):
+    """Validate imported user record.
+
+    Args:
+        record (dict): User fields.
+
+    Returns:
+        dict. User columns, with the not hashed password.
+
+    Raises:
+        ValueError. The record is invalid, with the reason.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("User should be an object.")
+
+    missing = [field for field in USER_FIELDS
+               if record.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}.")
+
+    user = {field: str(record[field]).strip()
+            for field in ("name", "email", "address")}
+    user["email"] = normalize_email(user["email"])
+    user["password"] = str(record["password"])
+    if any(len(user[field]) > MAX_TEXT_LENGTH for field in user):
+        raise ValueError("Fields are too long.")
+
+    # The DB text columns can't store them.
+    if any("\x00" in user[field] for field in ("name", "address")):
+        raise ValueError("Fields can't contain NUL characters.")
+
+    if not is_valid_email(user["email"]):
+        raise ValueError("Email is invalid.")
+
+    try:
+        user["latitude"] = float(record["latitude"])
+        user["longitude"] = float(record["longitude"])
+
+    except (TypeError, ValueError):
+        raise ValueError("Illegal latitude or longitude.")
+
+    if not is_valid_location(user["latitude"], user["longitude"]):
+        raise ValueError("Illegal latitude or longitude.")
+
+    user["categories_ids"] = []
+    return user
+
+
+class UsersImport:
+    """Bulk users import state: parsing, batching and errors report.
+
+    Attributes:
+        format (str): Input format, csv (with header line) or ndjson.
+        batch_size (int): Users inserted per statement.
+        imported (int): Amount of inserted users.
+        errors (list): (line number, error) tuples of the skipped lines.
+
+    Notes:
+        Lines are fed one by one and inserted in batches, so the input is
+        never loaded at once. CSV fields can't contain new lines.
+    """
+
+    def __init__(self, format, batch_size=IMPORT_BATCH_SIZE):
+        self.format = format
+        self.batch_size = batch_size
+        self.imported = 0
+        self.errors = []
+        self._header = None
+        self._line_number = 0
+        self._batch = []  # (line number, user) tuples
+
+    def _parse_line(self, line):
+        """Parse input line to record, None for the CSV header."""
+        if self.format == "ndjson":
+            try:
+                return json.loads(line)
+
+            except json.JSONDecodeError:
+                raise ValueError("Line is not valid JSON.")
+
+        try:
+            values = next(csv.reader([line]))
+
+        except csv.Error:  # Like too large field.
+            raise ValueError("Line is not valid CSV.")
+
+        if self._header is None:
+            self._header = [value.strip() for value in values]
+            return None
+
+        if len(values) != len(self._header):
+            raise ValueError(f"Expected {len(self._header)} values.")
+        return dict(zip(self._header, values))
+
+    def add_line(self, line):
+        """Parse and validate input line.
+
+        Args:
+            line (str): Input line.
+
+        Returns:
+            bool. If the batch is full and should be inserted.
+        """
+        self._line_number += 1
+        if not line.strip():
+            return False
+
+        try:
+            record = self._parse_line(line)
+            if record is not None:
+                self._batch.append((self._line_number, parse_user(record)))
+
+        except (TypeError, ValueError) as error:
+            self.errors.append((self._line_number, str(error)))
+
+        return len(self._batch) >= self.batch_size
+
+    def insert_batch(self, session):
+        """Insert the parsed users batch, reporting taken emails."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        users_lines = {}  # email -> line number
+        users = []
+        for line_number, user in batch:
+            if user["email"] in users_lines:
+                self.errors.append((line_number,
+                                    "Email is duplicated in the import."))
+                continue
+
+            users_lines[user["email"]] = line_number
+            users.append(user)
+
+        for user, hashed_password in zip(users, hash_passwords(
+                [user["password"] for user in users])):
+            user["password"] = hashed_password
+
+        inserted_emails = {email for _, email in insert_users(session,
+                                                              users)}
+        self.imported += len(inserted_emails)
+        self.errors.extend((line_number, "Email is already taken.")
+                           for email, line_number in users_lines.items()
+                           if email not in inserted_emails)
+
+    @property
+    def sorted_errors(self):
+        """Errors sorted by line number."""
+        return sorted(self.errors)
+
+
+async def iter_lines(chunks):
+    """Split async stream of bytes chunks to text lines.
+
+    Args:
+        chunks (AsyncIterable): Bytes chunks, like request body stream.
+
+    Returns:
+        AsyncGenerator. Lines (str) without the line separator.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(LINE_SEPARATOR)
+        for line in lines:
+            yield line.decode(errors="replace")
+
+    if buffer:
+        yield buffer.decode(errors="replace")
+
+
+def import_users(session, lines, format):
+    """Import users from input lines.
+
+    Args:
+        session (Session): DB session.
+        lines (iterable): Input lines.
+        format (str): Input format, csv or ndjson.
+
+    Returns:
+        UsersImport. Import report.
+    """
+    users_import = UsersImport(format)
+    for line in lines:
+        if users_import.add_line(line):
+            users_import.insert_batch(session)
+
+    users_import.insert_batch(session)
+    return users_import
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="Users file path.")
+    parser.add_argument("--format", choices=IMPORT_FORMATS,
+                        help="Input format, by the file extension by "
+                             "default.")
+    arguments = parser.parse_args()
+    format = arguments.format or \
+        ("ndjson" if arguments.path.endswith((".ndjson", ".jsonl"))
+         else "csv")
+
+    session = Session()
+    try:
+        with open(arguments.path, newline="") as users_file:
+            users_import = import_users(session, users_file, format)
+
+    finally:
+        session.close()
+
+    for line_number, error in users_import.sorted_errors:
+        print(f"Line {line_number}: {error}", file=sys.stderr)
+    print(f"Imported {users_import.imported} users, "
+          f"{len(users_import.errors)} errors.")
+
+
+if __name__ == "__main__":
+    main()
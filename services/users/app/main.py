@@ -1,92 +1,270 @@
 """Users service app."""
-import re
-from typing import List
-
-from fastapi import FastAPI, Depends, HTTPException
+import os
+from typing import List, Dict
+
+from fastapi import (FastAPI, Response, Depends, HTTPException, Query,
+                     Request, Header, BackgroundTasks)
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
+from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from starlette.status import (HTTP_201_CREATED, HTTP_400_BAD_REQUEST,
                               HTTP_200_OK, HTTP_404_NOT_FOUND,
                               HTTP_401_UNAUTHORIZED)
 
 from .db.tables import Base
-from .db.config import transaction, engine
+from .db.config import transaction, engine, Session, database
+from .geo_index import users_index, GEO_INDEX_ENABLED
+from .pagination import encode_cursor, decode_cursor
+from .metrics import MetricsMiddleware
+from .validators import is_valid_email, is_valid_location, normalize_email
+from .imports import UsersImport, iter_lines
+from .matching import rank_matches
+from .books_feed import (notify_user_updated, notify_user_deleted,
+                         is_replication_enabled)
+from .tokens import create_token, verify_token, SESSION_TOKEN_TTL
 from .schemas import (NewUserRequest, UserResponse, UserRequestType,
                       UserAuthenticationRequest, UserCategoriesRequest,
-                      CategoryResponse)
-from .db.crud import (add_user, get_user_by_email, get_user_by_id,
-                      is_authenticated_user, delete_user, get_near_users,
-                      update_categories_to_user)
-
+                      CategoryResponse, NearbyUserResponse,
+                      GeosearchResponse, ImportFormat, ImportReport,
+                      ImportRowError, UsersBatchRequest,
+                      SessionTokenResponse, INVALID_EMAIL_ERROR,
+                      UsersPage, CategoriesMatch, MatchResponse)
+from .db.crud import (add_user, delete_user,
+                      delete_user_by_id,
+                      get_near_users, update_categories_to_user,
+                      get_users_locations, get_nearest_users,
+                      fetch_user_by_id, fetch_user_by_email,
+                      fetch_user_categories, check_user_credentials,
+                      fetch_users_by_ids, get_users_by_categories,
+                      get_user_by_id, get_matching_users)
+
+
+GEOSEARCH_DEFAULT_LIMIT = 50
+GEOSEARCH_MAX_LIMIT = 500
+NEAREST_DEFAULT_K = 10
+NEAREST_MAX_K = 500
+USERS_PAGE_DEFAULT_LIMIT = 50
+USERS_PAGE_MAX_LIMIT = 500
+CATEGORIES_SEARCH_MAX_SIZE = 100
+MATCHES_DEFAULT_RADIUS = 10  # KM
+MATCHES_DEFAULT_LIMIT = 20
+MATCHES_MAX_LIMIT = 200
+USERS_BATCH_MAX_SIZE = int(os.environ.get("USERS_BATCH_MAX_SIZE", "500"))
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics")
+def metrics():
+    """Runtime metrics in Prometheus text format."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request, exc):
+    """Respond to invalid email fields with bad request, like the other
+    invalid fields that are checked by the endpoints."""
+    if any(error["msg"] == INVALID_EMAIL_ERROR for error in exc.errors()):
+        return JSONResponse(status_code=HTTP_400_BAD_REQUEST,
+                            content={"detail": INVALID_EMAIL_ERROR})
+    return await request_validation_exception_handler(request, exc)
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initiating DB."""
+    """Initiating DB and users locations index."""
     Base.metadata.create_all(engine)
+    await database.connect()
+    if GEO_INDEX_ENABLED:
+        session = Session()
+        users_index.load(get_users_locations(session))
+        session.close()
+
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Closing async DB connections."""
+    await database.disconnect()
 
-def is_valid_email(email):
-    """Check if it is valid email."""
-    regex = r'[\w\.-]+@[\w\.-]+(\.[\w]+)+'
-    if re.search(regex, email):
-        return True
-    return False
+
+def to_user_response(user):
+    """Create response of user row."""
+    return UserResponse(id=user["id"], email=user["email"], name=user["name"],
+                        address=user["address"], latitude=user["latitude"],
+                        longitude=user["longitude"])
+
+
+def to_nearby_user_response(user, distance):
+    """Create response of user with its distance from a location."""
+    return NearbyUserResponse(id=user.id, email=user.email, name=user.name,
+                              address=user.address, latitude=user.latitude,
+                              longitude=user.longitude, distance=distance)
 
 
 @app.post("/add_user", status_code=HTTP_201_CREATED)
-def add_new_user(user_data: NewUserRequest, session=Depends(transaction)):
+def add_new_user(user_data: NewUserRequest, background_tasks: BackgroundTasks,
+                 session=Depends(transaction)):
     """Adding new user to DB.
 
     Args:
         session (Session): DB session.
         user_data (UserCreate): New user target data.
+        background_tasks (BackgroundTasks): Tasks run after the response.
     """
-    if not is_valid_email(user_data.email):
-        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
-                            detail="Email is invalid.")
-
     if user_data.password != user_data.password2:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
                             detail="Password are not matching.")
 
-    user = get_user_by_email(session, user_data.email)
-    if user:
-        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
-                            detail="Email is already taken.")
-
     user = add_user(session, user_data.name, user_data.email,
                     user_data.password, user_data.address,
                     user_data.latitude, user_data.longitude)
+    if user is None:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Email is already taken.")
+
+    if is_replication_enabled():
+        background_tasks.add_task(notify_user_updated, user.id,
+                                  user.latitude, user.longitude,
+                                  user.categories_ids)
     return {"user_id": user.id}
 
 
+@app.post("/users/import", response_model=ImportReport)
+async def import_users(request: Request,
+                       format: ImportFormat = ImportFormat.csv,
+                       session=Depends(transaction)):
+    """Import users from CSV (with header line) or NDJSON request body.
+
+    Args:
+        request (Request): Request with users lines body. The users fields
+            are name, email, password, address, latitude and longitude.
+        format (ImportFormat): Body format.
+        session (Session): DB session.
+
+    Notes:
+        The body is streamed and inserted in batches. Invalid lines and taken
+        emails are skipped and reported.
+    """
+    users_import = UsersImport(format.value)
+    async for line in iter_lines(request.stream()):
+        if users_import.add_line(line):
+            await run_in_threadpool(users_import.insert_batch, session)
+
+    await run_in_threadpool(users_import.insert_batch, session)
+    return ImportReport(imported=users_import.imported,
+                        errors=[ImportRowError(line=line, error=error)
+                                for line, error in
+                                users_import.sorted_errors])
+
+
+def get_token_user_id(authorization):
+    """Get the user of bearer session token.
+
+    Args:
+        authorization (str): Authorization header, "Bearer <token>".
+
+    Returns:
+        int. User id.
+    """
+    scheme, _, token = authorization.partition(" ")
+    user_id = verify_token(token.strip()) \
+        if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise HTTPException(status_code=HTTP_401_UNAUTHORIZED,
+                            detail="Token is invalid or expired.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
+
 @app.delete("/delete_user", status_code=HTTP_200_OK)
-def remove_user(user_data: UserAuthenticationRequest,
+def remove_user(background_tasks: BackgroundTasks,
+                user_data: UserAuthenticationRequest = None,
+                authorization: str = Header(None),
                 session=Depends(transaction)):
     """Deleting existing user from DB.
 
     Args:
         session (Session): DB Session.
         user_data (UserAuthenticationRequest): User email and password.
+        authorization (str): Bearer session token, instead of the user
+            credentials.
+        background_tasks (BackgroundTasks): Tasks run after the response.
     """
-    if not is_valid_email(user_data.email):
-        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
-                            detail="Email is invalid.")
+    if authorization is not None:
+        user_id = get_token_user_id(authorization)
+        if not delete_user_by_id(session, user_id):
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                                detail="User is not exists.")
 
-    if not delete_user(session, user_data.email, user_data.password):
+        if is_replication_enabled():
+            background_tasks.add_task(notify_user_deleted, user_id)
+        return
+
+    if user_data is None:
+        raise HTTPException(status_code=HTTP_401_UNAUTHORIZED,
+                            detail="Credentials or token are required.",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+    user_id = delete_user(session, user_data.email, user_data.password)
+    if user_id is None:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
                             detail="User is not exists.")
 
+    if is_replication_enabled():
+        background_tasks.add_task(notify_user_deleted, user_id)
+
+
+# Declared before /users/{request_type}/{key}, which matches the same path.
+@app.get("/users/{id}/matches", response_model=List[MatchResponse])
+def search_user_matches(id: int,
+                        categories_ids: List[int] = Query(None),
+                        radius: int = Query(MATCHES_DEFAULT_RADIUS, gt=0),
+                        limit: int = Query(MATCHES_DEFAULT_LIMIT, gt=0,
+                                           le=MATCHES_MAX_LIMIT),
+                        session=Depends(transaction)):
+    """Get the best matching users around a user, by distance and
+    categories interest.
+
+    Args:
+        id (int): User id, like the owner of the book to exchange.
+        categories_ids (list): Searched categories ids (repeated parameter),
+            like the book categories. The user categories by default.
+        radius (int): Radius in KM.
+        limit (int): Max amount of users.
+        session (Session): DB session.
+    """
+    if categories_ids is not None and \
+            len(categories_ids) > CATEGORIES_SEARCH_MAX_SIZE:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Too many categories ids.")
+
+    user = get_user_by_id(session, id)
+    if user is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND,
+                            detail="User was not found.")
+
+    if categories_ids is None:
+        categories_ids = user.categories_ids or []
+    if not categories_ids:
+        return []
+
+    candidates = get_matching_users(session, user.latitude, user.longitude,
+                                    radius, categories_ids, exclude_id=id)
+    return [MatchResponse(score=score,
+                          **to_nearby_user_response(match, distance).dict())
+            for match, distance, score in rank_matches(
+                candidates, categories_ids, radius, limit)]
+
 
 @app.get("/users/{request_type}/{key}", response_model=UserResponse)
-def search_user(request_type: UserRequestType, key: str,
-                session=Depends(transaction)):
+async def search_user(request_type: UserRequestType, key: str):
     """Get users from the db.
 
     Args:
         key (str): User search key.
-        session (Session): DB session.
         request_type (UserRequestType): Search by email or user id.
 
     Notes:
@@ -101,112 +279,224 @@ def search_user(request_type: UserRequestType, key: str,
             raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
                                 detail="ID must by a number.")
 
-        user = get_user_by_id(session, id_key)
+        user = await fetch_user_by_id(database, id_key)
 
     if request_type == UserRequestType.email:
+        key = normalize_email(key)
         if not is_valid_email(key):
             raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
-                                detail="Email is invalid.")
+                                detail=INVALID_EMAIL_ERROR)
 
-        user = get_user_by_email(session, key)
+        user = await fetch_user_by_email(database, key)
 
     if user is None:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND,
                             detail="User was not found.")
-    return UserResponse(id=user.id, email=user.email, name=user.name,
-                        address=user.address, latitude=user.latitude,
-                        longitude=user.longitude)
+    return to_user_response(user)
+
+
+@app.post("/users/batch", response_model=Dict[int, UserResponse])
+async def search_users_batch(users_data: UsersBatchRequest):
+    """Get many users by ids.
+
+    Args:
+        users_data (UsersBatchRequest): Users ids.
+
+    Notes:
+        Users that were not found are missing from the response map.
+    """
+    if len(users_data.ids) > USERS_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Too many ids.")
+
+    users = await fetch_users_by_ids(database, users_data.ids)
+    return {id: to_user_response(user) for id, user in users.items()}
+
+
+# Declared before /users/{email}, which matches the same path.
+@app.get("/users/by_categories", response_model=UsersPage)
+def search_users_by_categories(ids: List[int] = Query(...),
+                               match: CategoriesMatch = CategoriesMatch.any,
+                               limit: int = Query(USERS_PAGE_DEFAULT_LIMIT,
+                                                  gt=0,
+                                                  le=USERS_PAGE_MAX_LIMIT),
+                               cursor: str = None,
+                               session=Depends(transaction)):
+    """Get users interested in categories, sorted by id.
+
+    Args:
+        ids (list): Categories ids (repeated parameter).
+        match (CategoriesMatch): Users interested in any or all of the
+            categories.
+        limit (int): Max amount of users in the page.
+        cursor (str): Next page cursor from the previous page.
+        session (Session): DB session.
+    """
+    if len(ids) > CATEGORIES_SEARCH_MAX_SIZE:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Too many categories ids.")
+
+    after_id = None
+    if cursor is not None:
+        try:
+            after_id, = decode_cursor(cursor, keys_amount=1)
+
+        except ValueError:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                                detail="Cursor is invalid.")
+
+    # Fetching one more user to know if there is a next page.
+    users = get_users_by_categories(session, ids,
+                                    match == CategoriesMatch.all,
+                                    limit + 1, after_id)
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id)
+
+    return UsersPage(users=[to_user_response(user._asdict())
+                            for user in users],
+                     next_cursor=next_cursor)
+
+
+@app.get("/users/nearest", response_model=List[NearbyUserResponse])
+def search_nearest_users(lat: float, lon: float,
+                         k: int = Query(NEAREST_DEFAULT_K, gt=0,
+                                        le=NEAREST_MAX_K),
+                         session=Depends(transaction)):
+    """Get the k nearest users, sorted by distance.
+
+    Args:
+        lat (float): Location latitude.
+        lon (float): Location longitude.
+        k (int): Max amount of users.
+        session (Session): DB session.
+    """
+    if not is_valid_location(lat, lon):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                            detail="Illegal latitude or longitude.")
+
+    users = get_nearest_users(session, lat, lon, k)
+    if not users:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND,
+                            detail="User was not found.")
+    return [to_nearby_user_response(user, distance)
+            for user, distance in users]
 
 
 @app.get("/users/{email}", response_model=UserResponse)
-def search_user_by_email(email: str, session=Depends(transaction)):
+async def search_user_by_email(email: str):
     """Get users from the db.
 
     Args:
         email (str): User email.
-        session (Session): DB session.
 
     Notes:
         Filtering the users with naive contains.
     """
-    user = get_user_by_email(session, email)
+    user = await fetch_user_by_email(database, normalize_email(email))
     if user is None:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND,
                             detail="User was not found.")
-    return UserResponse(id=user.id, email=user.email, name=user.name,
-                        address=user.address, latitude=user.latitude,
-                        longitude=user.longitude)
+    return to_user_response(user)
 
 
-@app.get("/geosearch", response_model=List[UserResponse])
+@app.get("/geosearch", response_model=GeosearchResponse)
 def search_nearby_users(latitude: float, longitude: float, radius: int,
-                        session=Depends(transaction)):
-    """Get nearest users.
+                        limit: int = Query(GEOSEARCH_DEFAULT_LIMIT, gt=0,
+                                           le=GEOSEARCH_MAX_LIMIT),
+                        cursor: str = None, session=Depends(transaction)):
+    """Get nearest users, sorted by distance.
 
     Args:
         radius (int): Radius in KM.
         session (Session): DB session.
         latitude (float): User location latitude.
         longitude (float): User location longitude.
+        limit (int): Max amount of users in the page.
+        cursor (str): Next page cursor from the previous page.
     """
-    if not (-180 < longitude < 180 and -90 < latitude < 90):
+    if not is_valid_location(latitude, longitude):
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
                             detail="Illegal latitude or longitude.")
 
-    users = get_near_users(session, latitude, longitude, radius)
-    if not users:
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor, keys_amount=2)
+
+        except ValueError:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
+                                detail="Cursor is invalid.")
+
+    # Fetching one more user to know if there is a next page.
+    users = get_near_users(session, latitude, longitude, radius, limit + 1,
+                           after)
+    if not users and cursor is None:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND,
                             detail="User was not found.")
-    return [UserResponse(id=user.id, email=user.email, name=user.name,
-                         address=user.address, latitude=user.latitude,
-                         longitude=user.longitude) for user in users]
 
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        last_user, last_distance = users[-1]
+        next_cursor = encode_cursor(last_distance, last_user.id)
 
-@app.post("/authenticate_user", status_code=HTTP_200_OK)
-def authenticate_user(user_data: UserAuthenticationRequest,
-                      session=Depends(transaction)):
-    """Authenticate user.
+    return GeosearchResponse(users=[to_nearby_user_response(user, distance)
+                                    for user, distance in users],
+                             next_cursor=next_cursor)
+
+
+@app.post("/authenticate_user", response_model=SessionTokenResponse,
+          status_code=HTTP_200_OK)
+async def authenticate_user(user_data: UserAuthenticationRequest):
+    """Authenticate user and create session token.
 
     Args:
-        session (Session): DB session.
         user_data (UserAuthenticationRequest): User credentials.
     """
-    if not is_valid_email(user_data.email):
-        raise HTTPException(status_code=HTTP_400_BAD_REQUEST,
-                            detail="Email is invalid.")
-
-    if not is_authenticated_user(session, user_data.email, user_data.password):
+    user_id = await check_user_credentials(database, user_data.email,
+                                           user_data.password)
+    if user_id is None:
         raise HTTPException(status_code=HTTP_401_UNAUTHORIZED,
                             detail="Email or password are wrong.")
+    return SessionTokenResponse(token=create_token(user_id),
+                                expires_in=SESSION_TOKEN_TTL)
 
 
 @app.put("/update_user_categories", status_code=HTTP_200_OK)
 def update_user_categories(user_data: UserCategoriesRequest,
+                           background_tasks: BackgroundTasks,
                            session=Depends(transaction)):
     """Update user categories..
 
     Args:
         session (Session): DB session.
         user_data (UserCategoriesRequest): User categories.
+        background_tasks (BackgroundTasks): Tasks run after the response.
     """
-    user = get_user_by_id(session, user_data.id)
-    if not user:
+    user = update_categories_to_user(session, user_data.id,
+                                     user_data.category_ids)
+    if user is None:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND,
                             detail="User was not found.")
-    update_categories_to_user(session, user_data.id, user_data.category_ids)
+
+    if is_replication_enabled():
+        background_tasks.add_task(notify_user_updated, user.id,
+                                  user.latitude, user.longitude,
+                                  user.categories_ids)
 
 
 @app.get("/user_categories/{id}", status_code=HTTP_200_OK)
-def get_user_categories(id: int, session=Depends(transaction)):
+async def get_user_categories(id: int):
     """Get user categories.
 
     Args:
         id (int): User id.
-        session (Session): DB session.
     """
-    user = get_user_by_id(session, id)
-    if not user:
+    categories_ids = await fetch_user_categories(database, id)
+    if categories_ids is None:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND,
                             detail="User was not found.")
     return [CategoryResponse(id=category_id) for category_id in
-            user.categories_ids]
+            categories_ids]
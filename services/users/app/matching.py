@@ -0,0 +1,62 @@
+"""Books exchange matching, by distance and categories interest.
+
+A candidate score is between 0 and 1: the weighted sum of its closeness
+(1 at the searched location, 0 at the search radius) and of the fraction of
+the searched categories it is interested in.
+"""
+import os
+import heapq
+
+MATCH_DISTANCE_WEIGHT = float(os.environ.get("MATCH_DISTANCE_WEIGHT", "0.5"))
+
+
+def get_match_score(distance, radius, common_categories, categories_amount,
+                    distance_weight=MATCH_DISTANCE_WEIGHT):
+    """Get score of a candidate.
+
+    Args:
+        distance (float): Candidate distance in KM.
+        radius (float): Search radius in KM.
+        common_categories (int): Searched categories the candidate is
+            interested in.
+        categories_amount (int): Searched categories amount.
+        distance_weight (float): Closeness weight, the categories weight is
+            the rest.
+
+    Returns:
+        float. Candidate score, higher is better.
+    """
+    closeness = max(0.0, 1 - distance / radius) if radius > 0 else 1.0
+    interest = common_categories / categories_amount \
+        if categories_amount else 0.0
+    return distance_weight * closeness + (1 - distance_weight) * interest
+
+
+def rank_matches(candidates, categories_ids, radius, limit=None):
+    """Score and rank candidates.
+
+    Args:
+        candidates (iterable): (user row, distance) tuples, the rows have
+            id and categories_ids.
+        categories_ids (list): Searched categories ids.
+        radius (float): Search radius in KM.
+        limit (int): Max amount of matches, all matches when not given.
+
+    Returns:
+        list. (user row, distance, score) tuples, sorted by score, then by
+        distance and id.
+    """
+    categories_ids = set(categories_ids)
+    matches = ((user, distance, get_match_score(
+        distance, radius, len(categories_ids.intersection(
+            user.categories_ids or ())), len(categories_ids)))
+        for user, distance in candidates)
+
+    def sort_key(match):
+        user, distance, score = match
+        return -score, distance, user.id
+
+    # Partial sort, only the top of the candidates is ordered.
+    if limit is not None:
+        return heapq.nsmallest(limit, matches, key=sort_key)
+    return sorted(matches, key=sort_key)
@@ -0,0 +1,93 @@
+"""HTTP requests metrics, exposed at /metrics."""
+from time import perf_counter
+
+from starlette.routing import Match
+from prometheus_client import Counter, Gauge, Histogram
+
+from .db.query_stats import track_request_statements
+
+# Requests that match no route share one label, so unknown paths can't grow
+# the metrics without limit.
+UNMATCHED_ROUTE = "<unmatched>"
+RESPONSE_SIZE_BUCKETS = (100, 1000, 10 * 1000, 100 * 1000, 1000 * 1000,
+                         10 * 1000 * 1000)  # Bytes.
+
+REQUESTS = Counter("http_requests_total", "HTTP requests.",
+                   ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds",
+                            "HTTP requests latency, until the response is "
+                            "sent.", ["method", "route"])
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress",
+                             "HTTP requests being handled.",
+                             ["method", "route"])
+RESPONSE_SIZE = Histogram("http_response_size_bytes",
+                          "HTTP responses body size.", ["method", "route"],
+                          buckets=RESPONSE_SIZE_BUCKETS)
+
+
+def get_route_template(scope):
+    """Get the path template of the route that handles a request.
+
+    Args:
+        scope (dict): ASGI HTTP scope.
+
+    Returns:
+        str. Route path template, like /users/{email}.
+    """
+    partial_route = None
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+
+        # Path matches but not the method.
+        if match == Match.PARTIAL and partial_route is None:
+            partial_route = route.path
+
+    return partial_route or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records requests count, latency, in progress
+    requests and responses size, labelled by route template.
+
+    Notes:
+        Pure ASGI, the messages are passed through without wrapping the
+        request or buffering the response body. The request SQL statements
+        are tracked with its route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = get_route_template(scope)
+        status = 500  # Unless a response is started.
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = perf_counter()
+        try:
+            with track_request_statements(route):
+                await self.app(scope, receive, send_wrapper)
+
+        finally:
+            REQUEST_LATENCY.labels(method, route).observe(
+                perf_counter() - start)
+            in_progress.dec()
+            REQUESTS.labels(method, route, str(status)).inc()
+            RESPONSE_SIZE.labels(method, route).observe(size)
@@ -0,0 +1,123 @@
+"""Passwords hashing.
+
+Passwords are hashed with scrypt and a random salt per password, stored as
+"scrypt$n$r$p$salt$hash" (base64 salt and hash). Hashes of older rows are
+unsalted MD5 hex digests, they are still verified and should be rehashed.
+"""
+import os
+import hmac
+import asyncio
+import hashlib
+from threading import Lock
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from concurrent.futures import ProcessPoolExecutor
+
+# Scrypt cost: CPU/memory cost (power of 2), block size and parallelization.
+SCRYPT_N = int(os.environ.get("PASSWORDS_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("PASSWORDS_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("PASSWORDS_SCRYPT_P", "1"))
+SALT_SIZE = 16  # Bytes.
+HASH_SIZE = 32  # Bytes.
+SCRYPT_PREFIX = "scrypt"
+# Processes hashing passwords, None for the CPU count. Hashing requests
+# beyond it wait in the pool queue instead of competing for the CPU.
+PASSWORDS_HASH_WORKERS = int(os.environ.get("PASSWORDS_HASH_WORKERS",
+                                            "0")) or None
+PASSWORDS_HASH_CHUNK_SIZE = 16
+
+_pool = None
+_pool_lock = Lock()
+
+
+def _encode(content):
+    return urlsafe_b64encode(content).decode().rstrip("=")
+
+
+def _decode(text):
+    return urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=HASH_SIZE)
+
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Hash password for storing.
+
+    Args:
+        password (str): Not hashed password.
+        n (int): Scrypt CPU/memory cost.
+        r (int): Scrypt block size.
+        p (int): Scrypt parallelization.
+
+    Returns:
+        str. Hashed password with its salt and cost.
+    """
+    salt = os.urandom(SALT_SIZE)
+    return "$".join((SCRYPT_PREFIX, str(n), str(r), str(p), _encode(salt),
+                     _encode(_scrypt(password, salt, n, r, p))))
+
+
+def verify_password(password, hashed_password):
+    """Check if password matches stored hash.
+
+    Args:
+        password (str): Not hashed password.
+        hashed_password (str): Stored hash, scrypt or legacy MD5.
+
+    Returns:
+        bool. If the password matches.
+    """
+    if not hashed_password.startswith(SCRYPT_PREFIX + "$"):
+        return hmac.compare_digest(
+            hashlib.md5(password.encode()).hexdigest(), hashed_password)
+
+    _, n, r, p, salt, password_hash = hashed_password.split("$")
+    return hmac.compare_digest(
+        _scrypt(password, _decode(salt), int(n), int(r), int(p)),
+        _decode(password_hash))
+
+
+def needs_rehash(hashed_password):
+    """Check if stored hash is legacy or has different cost than current."""
+    return not hashed_password.startswith(
+        f"{SCRYPT_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+def _get_pool():
+    """Get the hashing processes pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PASSWORDS_HASH_WORKERS)
+        return _pool
+
+
+def run_in_pool(function, *args):
+    """Run hashing function in the processes pool and wait for it.
+
+    Notes:
+        For sync code, the calling thread is blocked.
+    """
+    return _get_pool().submit(function, *args).result()
+
+
+async def run_in_pool_async(function, *args):
+    """Run hashing function in the processes pool, without blocking the
+    event loop."""
+    return await asyncio.get_event_loop().run_in_executor(_get_pool(),
+                                                          function, *args)
+
+
+def hash_passwords(passwords):
+    """Hash many passwords in parallel processes.
+
+    Args:
+        passwords (list): Not hashed passwords.
+
+    Returns:
+        list. Hashed passwords, in the order of the passwords.
+    """
+    return list(_get_pool().map(hash_password, passwords,
+                                chunksize=PASSWORDS_HASH_CHUNK_SIZE))
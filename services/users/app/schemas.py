@@ -1,12 +1,25 @@
 """Users API endpoints models."""
 from enum import Enum
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, constr, validator
+
+from .validators import MAX_EMAIL_LENGTH, is_valid_email, normalize_email
+
+INVALID_EMAIL_ERROR = "Email is invalid."
+
+
+def validate_email(email):
+    """Normalize valid email, for email fields validators."""
+    email = normalize_email(email)
+    if not is_valid_email(email):
+        raise ValueError(INVALID_EMAIL_ERROR)
+    return email
 
 
 class NewUserRequest(BaseModel):
     """User request."""
-    email: str
+    email: constr(max_length=MAX_EMAIL_LENGTH)
     name: str
     address: str
     password: str
@@ -14,6 +27,8 @@ class NewUserRequest(BaseModel):
     latitude: int
     longitude: int
 
+    _validate_email = validator("email", allow_reuse=True)(validate_email)
+
 
 class GeosearchRequest(BaseModel):
     radius: int
@@ -28,9 +43,23 @@ class UserCategoriesRequest(BaseModel):
 
 class UserAuthenticationRequest(BaseModel):
     """User authentication request."""
-    email: str
+    email: constr(max_length=MAX_EMAIL_LENGTH)
     password: str
 
+    _validate_email = validator("email", allow_reuse=True)(validate_email)
+
+
+class UsersBatchRequest(BaseModel):
+    """Many users lookup request."""
+    ids: List[int]
+
+
+class SessionTokenResponse(BaseModel):
+    """Session token of authenticated user."""
+    token: str
+    token_type: str = "bearer"
+    expires_in: int  # Seconds.
+
 
 class UserResponse(BaseModel):
     id: int
@@ -41,6 +70,33 @@ class UserResponse(BaseModel):
     longitude: float
 
 
+class NearbyUserResponse(UserResponse):
+    """User with its distance (KM) from the search location."""
+    distance: float
+
+
+class MatchResponse(NearbyUserResponse):
+    """Matching user with its score, between 0 and 1."""
+    score: float
+
+
+class GeosearchResponse(BaseModel):
+    """Geo search results page."""
+    users: List[NearbyUserResponse]
+    next_cursor: Optional[str]
+
+
+class UsersPage(BaseModel):
+    """Users results page, sorted by id."""
+    users: List[UserResponse]
+    next_cursor: Optional[str]
+
+
+class CategoriesMatch(str, Enum):
+    any = "any"
+    all = "all"
+
+
 class UserRequestType(str, Enum):
     id = "id"
     email = "email"
@@ -48,3 +104,20 @@ class UserRequestType(str, Enum):
 
 class CategoryResponse(BaseModel):
     id: int
+
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class ImportRowError(BaseModel):
+    """Skipped input line of bulk import."""
+    line: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    """Bulk import results."""
+    imported: int
+    errors: List[ImportRowError]
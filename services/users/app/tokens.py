@@ -0,0 +1,102 @@
+"""Signed expiring session tokens.
+
+A token is "payload.signature": the base64 JSON payload with the user id and
+the expiration time, and its base64 HMAC-SHA256 signature.
+"""
+import os
+import hmac
+import json
+import time
+import hashlib
+from binascii import Error as DecodeError
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from .cache import TTLCache
+
+# Should be shared by all the service processes, a random secret makes the
+# tokens valid only in the process that issued them.
+SESSION_TOKEN_SECRET = os.environ.get("SESSION_TOKEN_SECRET",
+                                      os.urandom(32).hex()).encode()
+SESSION_TOKEN_TTL = int(os.environ.get("SESSION_TOKEN_TTL", "3600"))  # Sec.
+TOKENS_CACHE_SIZE = int(os.environ.get("TOKENS_CACHE_SIZE", "10000"))
+TOKENS_CACHE_TTL = float(os.environ.get("TOKENS_CACHE_TTL", "300"))  # Sec.
+
+# Token -> (user id, expiration) of verified tokens.
+tokens_cache = TTLCache("session_tokens", TOKENS_CACHE_SIZE, TOKENS_CACHE_TTL)
+
+
+def _encode(content):
+    return urlsafe_b64encode(content).decode().rstrip("=")
+
+
+def _decode(text):
+    return urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return _encode(hmac.new(SESSION_TOKEN_SECRET, payload.encode(),
+                            hashlib.sha256).digest())
+
+
+def create_token(user_id, ttl=SESSION_TOKEN_TTL):
+    """Create session token of user.
+
+    Args:
+        user_id (int): User id.
+        ttl (int): Seconds until the token expires.
+
+    Returns:
+        str. Signed session token.
+    """
+    payload = _encode(json.dumps({"sub": user_id,
+                                  "exp": int(time.time()) + ttl}).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def _parse_token(token):
+    """Check token signature.
+
+    Returns:
+        tuple. (user id, expiration), None if the token is malformed or its
+        signature is wrong.
+    """
+    payload, _, signature = token.partition(".")
+    # Compared as bytes, compare_digest rejects non ASCII strings (the
+    # headers are decoded as latin-1).
+    if not hmac.compare_digest(
+            _sign(payload).encode(),
+            signature.encode("utf-8", "surrogateescape")):
+        return None
+
+    try:
+        claims = json.loads(_decode(payload))
+        return int(claims["sub"]), claims["exp"]
+
+    except (DecodeError, ValueError, TypeError, KeyError):
+        return None
+
+
+def verify_token(token):
+    """Get the user of valid session token.
+
+    Args:
+        token (str): Session token.
+
+    Returns:
+        int. User id, None if the token is invalid or expired.
+
+    Notes:
+        Verified tokens are cached, so repeated requests only check the
+        expiration.
+    """
+    claims = tokens_cache.get(token)
+    if claims is None:
+        claims = _parse_token(token)
+        if claims is None:
+            return None
+        tokens_cache.set(token, claims)
+
+    user_id, expiration = claims
+    if expiration <= time.time():
+        return None
+    return user_id
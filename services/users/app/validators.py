@@ -0,0 +1,23 @@
+"""Users fields validations."""
+import re
+
+# The domain labels can't contain dots, so there is a single way to split an
+# email and the matching time is linear.
+EMAIL_REGEX = re.compile(r'[\w.-]+@(?:[\w-]+\.)+\w+')
+MAX_EMAIL_LENGTH = 100  # Like the users email column.
+
+
+def is_valid_location(latitude, longitude):
+    """Check if it is valid location."""
+    return -180 < longitude < 180 and -90 < latitude < 90
+
+
+def is_valid_email(email):
+    """Check if it is valid email (the whole text)."""
+    return len(email) <= MAX_EMAIL_LENGTH and \
+        EMAIL_REGEX.fullmatch(email) is not None
+
+
+def normalize_email(email):
+    """Get the canonical form of email, as it is stored."""
+    return email.strip().lower()
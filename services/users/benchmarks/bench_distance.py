@@ -0,0 +1,39 @@
+"""Micro benchmark of scalar vs vectorized distance calculation.
+
+Usage (from the users service directory):
+    python -m benchmarks.bench_distance [sizes...]
+"""
+import sys
+from timeit import timeit
+
+import numpy as np
+
+from app.db.crud import _get_distance
+from app.geo import get_distances
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+REPEATS = 10
+BASE_COORDINATES = (32.852310, 35.096149)
+
+
+def main(sizes):
+    random = np.random.default_rng(0)
+    print(f"{'points':>8} {'scalar (ms)':>12} {'vectorized (ms)':>16} "
+          f"{'speedup':>8}")
+    for size in sizes:
+        latitudes = random.uniform(29.5, 33.3, size)
+        longitudes = random.uniform(34.2, 35.9, size)
+        coordinates = list(zip(latitudes.tolist(), longitudes.tolist()))
+
+        scalar = timeit(lambda: [_get_distance(*BASE_COORDINATES, *location)
+                                 for location in coordinates],
+                        number=REPEATS) / REPEATS * 1000
+        vectorized = timeit(lambda: get_distances(*BASE_COORDINATES,
+                                                  latitudes, longitudes),
+                            number=REPEATS) / REPEATS * 1000
+        print(f"{size:>8} {scalar:>12.3f} {vectorized:>16.3f} "
+              f"{scalar / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
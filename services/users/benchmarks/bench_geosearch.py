@@ -0,0 +1,83 @@
+"""Benchmark geo search latency by users table size.
+
+Usage (from the users service directory):
+    python -m benchmarks.bench_geosearch [sizes...]
+"""
+import sys
+import random
+from time import perf_counter
+
+from sqlalchemy import asc, create_engine
+from sqlalchemy.orm import sessionmaker
+from psycopg2.extras import execute_values
+from testing.postgresql import Postgresql
+
+from app.db.tables import Base, User
+from app.db.crud import get_near_users
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+INSERT_CHUNK_SIZE = 10000
+SEARCHES = 20
+RADIUS = 5  # KM
+
+
+def seed_users(engine, count):
+    """Insert random users spread over Israel area."""
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            for start in range(0, count, INSERT_CHUNK_SIZE):
+                rows = [(f"user{index}@test.com", "name", "address",
+                         "password", random.uniform(29.5, 33.3),
+                         random.uniform(34.2, 35.9), [])
+                        for index in range(start, min(start +
+                                                      INSERT_CHUNK_SIZE,
+                                                      count))]
+                execute_values(cursor, "INSERT INTO users (email, name, "
+                                       "address, password, latitude, "
+                                       "longitude, categories_ids) "
+                                       "VALUES %s", rows)
+        connection.commit()
+    finally:
+        connection.close()
+    engine.execute("ANALYZE users")
+
+
+def full_scan_search(session, latitude, longitude, radius):
+    """Geo search without the bounding box prefilter."""
+    distance = User.in_range(latitude, longitude, radius)
+    return session.query(User).filter(distance <= radius).order_by(
+        asc(distance)).all()
+
+
+def measure(session, search):
+    """Get the average search latency in milliseconds."""
+    random.seed(0)
+    start = perf_counter()
+    for _ in range(SEARCHES):
+        search(session, random.uniform(29.5, 33.3),
+               random.uniform(34.2, 35.9), RADIUS)
+    return (perf_counter() - start) / SEARCHES * 1000
+
+
+def main(sizes):
+    with Postgresql() as database:
+        engine = create_engine(database.url())
+        Session = sessionmaker(bind=engine)
+        print(f"{'users':>10} {'full scan (ms)':>16} "
+              f"{'bounding box (ms)':>18}")
+        for size in sizes:
+            Base.metadata.drop_all(engine)
+            Base.metadata.create_all(engine)
+            seed_users(engine, size)
+            session = Session()
+            try:
+                full_scan = measure(session, full_scan_search)
+                bounding_box = measure(session, get_near_users)
+            finally:
+                session.close()
+            print(f"{size:>10} {full_scan:>16.2f} {bounding_box:>18.2f}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
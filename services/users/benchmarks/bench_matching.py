@@ -0,0 +1,111 @@
+"""Benchmark books exchange matching latency by users table size.
+
+Compares geo search followed by a categories lookup per nearby user (the
+/geosearch and /user_categories flow) with the matching engine, with and
+without the in-memory locations index.
+
+Usage (from the users service directory):
+    python -m benchmarks.bench_matching [sizes...]
+"""
+import sys
+import random
+from time import perf_counter
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from psycopg2.extras import execute_values
+from testing.postgresql import Postgresql
+
+from app.db.tables import Base, User
+from app.geo_index import users_index
+from app.matching import rank_matches
+from app.db.crud import (get_near_users, get_matching_users,
+                         get_users_locations)
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+INSERT_CHUNK_SIZE = 10000
+SEARCHES = 20
+RADIUS = 5  # KM
+LIMIT = 20
+CATEGORIES_AMOUNT = 50
+USER_CATEGORIES_AMOUNT = 3
+
+
+def seed_users(engine, count):
+    """Insert random users spread over Israel area, with random categories."""
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            for start in range(0, count, INSERT_CHUNK_SIZE):
+                rows = [(f"user{index}@test.com", "name", "address",
+                         "password", random.uniform(29.5, 33.3),
+                         random.uniform(34.2, 35.9),
+                         random.sample(range(CATEGORIES_AMOUNT),
+                                       USER_CATEGORIES_AMOUNT))
+                        for index in range(start, min(start +
+                                                      INSERT_CHUNK_SIZE,
+                                                      count))]
+                execute_values(cursor, "INSERT INTO users (email, name, "
+                                       "address, password, latitude, "
+                                       "longitude, categories_ids) "
+                                       "VALUES %s", rows)
+        connection.commit()
+    finally:
+        connection.close()
+    engine.execute("ANALYZE users")
+
+
+def lookup_per_user_match(session, latitude, longitude, categories_ids):
+    """Match by geo search and a categories query per nearby user."""
+    candidates = []
+    for user, distance in get_near_users(session, latitude, longitude,
+                                         RADIUS):
+        user_categories, = session.query(User.categories_ids).filter(
+            User.id == user.id).one()
+        if set(user_categories).intersection(categories_ids):
+            candidates.append((user, distance))
+    return rank_matches(candidates, categories_ids, RADIUS, LIMIT)
+
+
+def engine_match(session, latitude, longitude, categories_ids):
+    """Match by the spatial and categories indexes intersection."""
+    return rank_matches(get_matching_users(session, latitude, longitude,
+                                           RADIUS, categories_ids),
+                        categories_ids, RADIUS, LIMIT)
+
+
+def measure(session, match):
+    """Get the average match latency in milliseconds."""
+    random.seed(0)
+    start = perf_counter()
+    for _ in range(SEARCHES):
+        match(session, random.uniform(29.5, 33.3), random.uniform(34.2, 35.9),
+              random.sample(range(CATEGORIES_AMOUNT), 2))
+    return (perf_counter() - start) / SEARCHES * 1000
+
+
+def main(sizes):
+    with Postgresql() as database:
+        engine = create_engine(database.url())
+        Session = sessionmaker(bind=engine)
+        print(f"{'users':>10} {'lookup per user (ms)':>21} "
+              f"{'engine (ms)':>12} {'engine + index (ms)':>20}")
+        for size in sizes:
+            Base.metadata.drop_all(engine)
+            Base.metadata.create_all(engine)
+            seed_users(engine, size)
+            session = Session()
+            try:
+                lookup_per_user = measure(session, lookup_per_user_match)
+                engine_only = measure(session, engine_match)
+                users_index.load(get_users_locations(session))
+                with_index = measure(session, engine_match)
+            finally:
+                users_index.clear()
+                session.close()
+            print(f"{size:>10} {lookup_per_user:>21.2f} {engine_only:>12.2f} "
+                  f"{with_index:>20.2f}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
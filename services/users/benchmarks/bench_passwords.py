@@ -0,0 +1,44 @@
+"""Benchmark passwords verification throughput by scrypt cost.
+
+Usage (from the users service directory):
+    python -m benchmarks.bench_passwords [n costs...]
+"""
+import os
+import sys
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+from app.passwords import hash_password, verify_password, SCRYPT_R, SCRYPT_P
+
+DEFAULT_COSTS = (2 ** 12, 2 ** 14, 2 ** 15)
+VERIFICATIONS = 200
+
+
+def verify_serially(hashed_password, count):
+    """Verify password count times in this process."""
+    for _ in range(count):
+        verify_password("password", hashed_password)
+
+
+def main(costs):
+    workers = os.cpu_count()
+    print(f"{workers} cores")
+    print(f"{'n':>8} {'ms/auth':>8} {'auth/s/core':>12} {'auth/s (pool)':>14}")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for n in costs:
+            hashed_password = hash_password("password", n, SCRYPT_R,
+                                            SCRYPT_P)
+            start = perf_counter()
+            verify_serially(hashed_password, VERIFICATIONS // 10)
+            serial = (perf_counter() - start) / (VERIFICATIONS // 10)
+
+            start = perf_counter()
+            list(pool.map(verify_password, ["password"] * VERIFICATIONS,
+                          [hashed_password] * VERIFICATIONS))
+            pool_rate = VERIFICATIONS / (perf_counter() - start)
+            print(f"{n:>8} {serial * 1000:>8.1f} {1 / serial:>12.1f} "
+                  f"{pool_rate:>14.1f}")
+
+
+if __name__ == "__main__":
+    main([int(cost) for cost in sys.argv[1:]] or DEFAULT_COSTS)
@@ -0,0 +1,65 @@
+"""Benchmark /add_user and /authenticate_user requests parsing.
+
+Compares the schemas validation (compiled anchored email pattern) to the
+previous parsing followed by the per call regex search.
+
+Usage (from the users service directory):
+    python -m benchmarks.bench_request_parsing [requests amount]
+"""
+import re
+import sys
+import json
+from timeit import timeit
+
+from pydantic import BaseModel
+
+from app.schemas import NewUserRequest, UserAuthenticationRequest
+
+DEFAULT_REQUESTS = 100000
+OLD_EMAIL_REGEX = r'[\w\.-]+@[\w\.-]+(\.[\w]+)+'
+
+
+class OldNewUserRequest(BaseModel):
+    email: str
+    name: str
+    address: str
+    password: str
+    password2: str
+    latitude: int
+    longitude: int
+
+
+class OldUserAuthenticationRequest(BaseModel):
+    email: str
+    password: str
+
+
+def parse_old(model, body):
+    """Parse request like the endpoints did before."""
+    request = model.parse_raw(body)
+    return re.search(OLD_EMAIL_REGEX, request.email) is not None
+
+
+def main(requests):
+    add_user_body = json.dumps(dict(email="User.Name@Example.com",
+                                    name="User", address="Address",
+                                    password="password",
+                                    password2="password", latitude=32,
+                                    longitude=34))
+    authenticate_body = json.dumps(dict(email="User.Name@Example.com",
+                                        password="password"))
+    cases = (("/add_user", NewUserRequest, OldNewUserRequest,
+              add_user_body),
+             ("/authenticate_user", UserAuthenticationRequest,
+              OldUserAuthenticationRequest, authenticate_body))
+
+    print(f"{'endpoint':>20} {'before (req/s)':>15} {'schema (req/s)':>15}")
+    for endpoint, model, old_model, body in cases:
+        before = timeit(lambda: parse_old(old_model, body), number=requests)
+        after = timeit(lambda: model.parse_raw(body), number=requests)
+        print(f"{endpoint:>20} {requests / before:>15.0f} "
+              f"{requests / after:>15.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS)
@@ -1,8 +1,12 @@
 """Testing API calls."""
+from unittest.mock import AsyncMock
+
 from faker import Faker
 from starlette.testclient import TestClient
+from prometheus_client import REGISTRY
 
 from app.main import app
+from app.tokens import create_token, verify_token
 
 fake = Faker()
 client = TestClient(app)
@@ -12,6 +16,8 @@ invalid_emails = ["INVALID_EMAIL", "12311", "idoa.com", "i@."]
 
 class MockedUser:
     """Mocked user object."""
+    categories_ids = []
+
     def __init__(self, id, name, email, address, latitude, longitude):
         self.id = id
         self.name = name
@@ -20,6 +26,10 @@ class MockedUser:
         self.latitude = latitude
         self.longitude = longitude
 
+    def _asdict(self):
+        """Mapping of the columns, like the query rows."""
+        return dict(self.__dict__)
+
 
 class NewMockedUser(MockedUser):
     def __init__(self, id, name, email, address, latitude, longitude,
@@ -41,8 +51,8 @@ def send_add_user_request(mocker, id, name, email, address, latitude,
     """
     mocked_user = NewMockedUser(id, name, email, address, latitude,
                                 longitude, password, password2)
-    mocker.patch('app.main.get_user_by_email', return_value=user_exists)
-    mocker.patch('app.main.add_user', return_value=mocked_user)
+    mocker.patch('app.main.add_user',
+                 return_value=None if user_exists else mocked_user)
     return client.post("/add_user", json=mocked_user.__dict__)
 
 
@@ -57,6 +67,17 @@ def test_add_valid_user(mocker):
     assert response.json()["user_id"] == 1
 
 
+def test_add_user_normalized_email(mocker):
+    """Test adding user with the email lowercased."""
+    add = mocker.patch('app.main.add_user',
+                       return_value=MockedUser(1, "", "", "", 0, 0))
+    user = NewMockedUser(1, fake.name(), "User@Gmail.com", fake.address(), 0,
+                         0, "password", "password")
+    response = client.post("/add_user", json=user.__dict__)
+    assert response.status_code == 201
+    assert add.call_args[0][2] == "user@gmail.com"
+
+
 def test_add_already_exist_user(mocker):
     """Test adding valid user."""
     password = fake.password()
@@ -89,30 +110,104 @@ def test_add_invalid_user(mocker):
     assert response.status_code == 400
 
 
+# Test /users/import endpoint.
+
+def test_import_users(mocker):
+    """Test importing users from CSV body with errors report."""
+    insert = mocker.patch('app.imports.insert_users',
+                          return_value=[(1, "first@gmail.com")])
+    body = "name,email,password,address,latitude,longitude\n" \
+           "User,first@gmail.com,password,Address,32.1,34.8\n" \
+           "User,taken@gmail.com,password,Address,32.1,34.8\n" \
+           "User,invalid,password,Address,32.1,34.8\n"
+    response = client.post("/users/import", data=body.encode())
+    assert response.status_code == 200
+    assert response.json() == {
+        "imported": 1,
+        "errors": [{"line": 3, "error": "Email is already taken."},
+                   {"line": 4, "error": "Email is invalid."}]}
+    assert len(insert.call_args[0][1]) == 2
+
+
+def test_import_users_ndjson(mocker):
+    """Test importing users from NDJSON body."""
+    mocker.patch('app.imports.insert_users', return_value=[])
+    response = client.post("/users/import", params={"format": "ndjson"},
+                           data=b"{invalid")
+    assert response.status_code == 200
+    assert response.json()["errors"] == [
+        {"line": 1, "error": "Line is not valid JSON."}]
+
+    # Non scalar coordinates are reported, and the import goes on.
+    body = b'{"name": "User", "email": "first@gmail.com", ' \
+           b'"password": "password", "address": "Address", ' \
+           b'"latitude": [32.1], "longitude": 34.8}\n' \
+           b'{"name": "User", "email": "second@gmail.com", ' \
+           b'"password": "password", "address": "Address", ' \
+           b'"latitude": {"value": 32.1}, "longitude": 34.8}\n'
+    response = client.post("/users/import", params={"format": "ndjson"},
+                           data=body)
+    assert response.status_code == 200
+    assert response.json()["errors"] == [
+        {"line": 1, "error": "Illegal latitude or longitude."},
+        {"line": 2, "error": "Illegal latitude or longitude."}]
+
+    response = client.post("/users/import", params={"format": "xml"},
+                           data=b"")
+    assert response.status_code == 422
+
+
 # Test /delete_user endpoint.
 
 def test_delete_exists_user(mocker):
     """Test delete exists user functionality."""
-    user_exists = True
     email = fake.email()
     password = fake.password()
-    mocker.patch('app.main.delete_user', return_value=user_exists)
+    mocker.patch('app.main.delete_user', return_value=7)
+    mocker.patch('app.main.is_replication_enabled', return_value=True)
+    notify = mocker.patch('app.main.notify_user_deleted')
     delete_request = {'email': email, 'password': password}
     response = client.delete("/delete_user", json=delete_request)
     assert response.status_code == 200
+    notify.assert_called_with(7)
 
 
 def test_delete_not_exists_user(mocker):
     """Test delete not exists user functionality."""
-    user_exists = False
     email = fake.email()
     password = fake.password()
-    mocker.patch('app.main.delete_user', return_value=user_exists)
+    mocker.patch('app.main.delete_user', return_value=None)
     delete_request = {'email': email, 'password': password}
     response = client.delete("/delete_user", json=delete_request)
     assert response.status_code == 400
 
 
+def test_delete_user_by_token(mocker):
+    """Test delete user with session token functionality."""
+    delete = mocker.patch('app.main.delete_user_by_id', return_value=True)
+    headers = {"Authorization": f"Bearer {create_token(7)}"}
+    response = client.delete("/delete_user", headers=headers)
+    assert response.status_code == 200
+    delete.assert_called_with(mocker.ANY, 7)
+
+    delete.return_value = False
+    response = client.delete("/delete_user", headers=headers)
+    assert response.status_code == 400
+
+
+def test_delete_user_by_invalid_token(mocker):
+    """Test delete user with invalid or expired token functionality."""
+    delete = mocker.patch('app.main.delete_user_by_id', return_value=True)
+    for token in ("invalid", create_token(7, ttl=-1), "x.\xe9"):
+        response = client.delete("/delete_user",
+                                 headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 401
+    assert not delete.called
+
+    response = client.delete("/delete_user")
+    assert response.status_code == 401
+
+
 # Test /user/ endpoint.
 
 def test_get_exists_user_by_id(mocker):
@@ -121,7 +216,8 @@ def test_get_exists_user_by_id(mocker):
     mocked_user = MockedUser(fake_user_id, fake.name(), fake.email(),
                              fake.address(), float(fake.latitude()),
                              float(fake.longitude()))
-    mocker.patch('app.main.get_user_by_id', return_value=mocked_user)
+    mocker.patch('app.main.fetch_user_by_id', new_callable=AsyncMock,
+                 return_value=mocked_user.__dict__)
     response = client.get(f"/users/id/{fake_user_id}")
     assert response.status_code == 200
     assert mocked_user.__dict__ == response.json()
@@ -130,7 +226,8 @@ def test_get_exists_user_by_id(mocker):
 def test_get_not_exists_user_by_id(mocker):
     """Test get not-exists user by id functionality."""
     fake_user_id = 1012
-    mocker.patch('app.main.get_user_by_id', return_value=None)
+    mocker.patch('app.main.fetch_user_by_id', new_callable=AsyncMock,
+                 return_value=None)
     response = client.get(f"/users/id/{fake_user_id}")
     assert response.status_code == 404
 
@@ -148,7 +245,8 @@ def test_get_exists_user_by_email(mocker):
     mocked_user = MockedUser(1, fake.name(), fake_user_email,
                              fake.address(), float(fake.latitude()),
                              float(fake.longitude()))
-    mocker.patch('app.main.get_user_by_email', return_value=mocked_user)
+    mocker.patch('app.main.fetch_user_by_email', new_callable=AsyncMock,
+                 return_value=mocked_user.__dict__)
     response = client.get(f"/users/email/{fake_user_email}")
     assert response.status_code == 200
     assert mocked_user.__dict__ == response.json()
@@ -156,7 +254,8 @@ def test_get_exists_user_by_email(mocker):
 
 def test_get_not_exists_user_by_email(mocker):
     """Test get not-exists user by id functionality."""
-    mocker.patch('app.main.get_user_by_email', return_value=None)
+    mocker.patch('app.main.fetch_user_by_email', new_callable=AsyncMock,
+                 return_value=None)
     response = client.get(f"/users/email/{fake.email()}")
     assert response.status_code == 404
 
@@ -168,19 +267,47 @@ def test_get_type_user_by_invalid_email():
         assert response.status_code == 400
 
 
+# Test /users/batch endpoint.
+
+def test_get_users_batch(mocker):
+    """Test getting map of users by ids."""
+    users = {id: MockedUser(id, fake.name(), fake.email(), fake.address(),
+                            float(fake.latitude()),
+                            float(fake.longitude())).__dict__
+             for id in (1, 3)}
+    fetch = mocker.patch('app.main.fetch_users_by_ids',
+                         new_callable=AsyncMock, return_value=users)
+    response = client.post("/users/batch", json={"ids": [1, 3, 404]})
+    assert response.status_code == 200
+    assert set(response.json()) == {"1", "3"}
+    assert response.json()["3"]["email"] == users[3]["email"]
+    fetch.assert_called_with(mocker.ANY, [1, 3, 404])
+
+
+def test_get_too_many_users_batch(mocker):
+    """Test getting users by ids over the batch size limit."""
+    mocker.patch('app.main.USERS_BATCH_MAX_SIZE', 2)
+    response = client.post("/users/batch", json={"ids": [1, 2, 3]})
+    assert response.status_code == 400
+
+
 # Test /authenticate_user endpoint.
 
 def test_exists_user_authentication(mocker):
     """Test get not-exists user by id functionality."""
-    mocker.patch('app.main.is_authenticated_user', return_value=True)
+    mocker.patch('app.main.check_user_credentials', new_callable=AsyncMock,
+                 return_value=1)
     fake_user = {'email': fake.email(), 'password': fake.password()}
     response = client.post("/authenticate_user", json=fake_user)
     assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+    assert verify_token(response.json()["token"]) == 1
 
 
 def test_not_exists_user_authentication(mocker):
     """Test get not-exists user by id functionality."""
-    mocker.patch('app.main.is_authenticated_user', return_value=False)
+    mocker.patch('app.main.check_user_credentials', new_callable=AsyncMock,
+                 return_value=None)
     fake_user = {'email': fake.email(), 'password': fake.password()}
     response = client.post("/authenticate_user", json=fake_user)
     assert response.status_code == 401
@@ -194,17 +321,322 @@ def test_authentication_with_invalid_email():
         assert response.status_code == 400
 
 
+def test_authentication_with_too_long_email():
+    """Test authentication with email over the email column length."""
+    fake_user = {'email': "a@" + "a." * 16000 + "!",
+                 'password': fake.password()}
+    response = client.post("/authenticate_user", json=fake_user)
+    assert response.status_code == 422
+
+
+def test_get_user_by_email_path(mocker):
+    """Test get user by email (without search type) functionality."""
+    mocked_user = MockedUser(1, fake.name(), "abc@gmail.com", fake.address(),
+                             float(fake.latitude()), float(fake.longitude()))
+    mocker.patch('app.main.fetch_user_by_email', new_callable=AsyncMock,
+                 return_value=mocked_user.__dict__)
+    response = client.get(f"/users/{mocked_user.email}")
+    assert response.status_code == 200
+    assert mocked_user.__dict__ == response.json()
+
+
+# Test /update_user_categories endpoint.
+
+def test_update_user_categories(mocker):
+    """Test update user categories functionality."""
+    user = MockedUser(1, fake.name(), fake.email(), fake.address(), 32.8,
+                      35.1)
+    user.categories_ids = [1, 5]
+    update_categories = mocker.patch('app.main.update_categories_to_user',
+                                     return_value=user)
+    enabled = mocker.patch('app.main.is_replication_enabled',
+                           return_value=True)
+    notify = mocker.patch('app.main.notify_user_updated')
+    response = client.put("/update_user_categories",
+                          json={"id": 1, "category_ids": [1, 5]})
+    assert response.status_code == 200
+    assert update_categories.call_args[0][1:] == (1, [1, 5])
+    notify.assert_called_with(1, 32.8, 35.1, [1, 5])
+
+    notify.reset_mock()
+    enabled.return_value = False
+    response = client.put("/update_user_categories",
+                          json={"id": 1, "category_ids": [1, 5]})
+    assert response.status_code == 200
+    notify.assert_not_called()
+
+
+def test_update_not_exists_user_categories(mocker):
+    """Test update categories of not exists user functionality."""
+    mocker.patch('app.main.update_categories_to_user', return_value=None)
+    response = client.put("/update_user_categories",
+                          json={"id": 1, "category_ids": [1, 5]})
+    assert response.status_code == 404
+
+
+# Test /user_categories endpoint.
+
+def test_get_user_categories(mocker):
+    """Test get user categories functionality."""
+    mocker.patch('app.main.fetch_user_categories', new_callable=AsyncMock,
+                 return_value=[1, 5])
+    response = client.get("/user_categories/1")
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1}, {"id": 5}]
+
+
+def test_get_not_exists_user_categories(mocker):
+    """Test get categories of not exists user functionality."""
+    mocker.patch('app.main.fetch_user_categories', new_callable=AsyncMock,
+                 return_value=None)
+    response = client.get("/user_categories/1")
+    assert response.status_code == 404
+
+
 # Test /geosearch endpoint.
 
 def test_get_exists_users_by_location(mocker):
     """Test get exists user by id functionality."""
-    mocked_users = [MockedUser(id, fake.name(), fake.email(),
-                               fake.address(), float(fake.latitude()),
-                               float(fake.longitude())) for id in range(10)]
+    mocked_users = [(MockedUser(id, fake.name(), fake.email(),
+                                fake.address(), float(fake.latitude()),
+                                float(fake.longitude())), float(id))
+                    for id in range(10)]
     mocker.patch('app.main.get_near_users', return_value=mocked_users)
     response = client.get("/geosearch",
                           params={"longitude": fake.longitude(),
                                   "latitude": fake.latitude(),
                                   "radius": 50})
     assert response.status_code == 200
-    assert response.json() == [user.__dict__ for user in mocked_users]
+    assert response.json() == {"users": [dict(user.__dict__,
+                                              distance=distance)
+                                         for user, distance in mocked_users],
+                               "next_cursor": None}
+
+
+def test_get_not_exists_users_by_location(mocker):
+    """Test get users by location without users in range."""
+    mocker.patch('app.main.get_near_users', return_value=[])
+    response = client.get("/geosearch",
+                          params={"longitude": fake.longitude(),
+                                  "latitude": fake.latitude(),
+                                  "radius": 50})
+    assert response.status_code == 404
+
+
+def test_get_users_by_location_pages(mocker):
+    """Test paginating nearby users with cursor."""
+    limit = 3
+    mocked_users = [(MockedUser(id, fake.name(), fake.email(),
+                                fake.address(), float(fake.latitude()),
+                                float(fake.longitude())), id * 0.5)
+                    for id in range(limit + 1)]
+    get_near_users = mocker.patch('app.main.get_near_users',
+                                  return_value=mocked_users)
+    params = {"longitude": 35.1, "latitude": 32.8, "radius": 50,
+              "limit": limit}
+    response = client.get("/geosearch", params=params)
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()["users"]] == [0, 1, 2]
+    next_cursor = response.json()["next_cursor"]
+    assert next_cursor is not None
+
+    # Next page starts after the last user of the previous page.
+    get_near_users.return_value = mocked_users[limit:]
+    response = client.get("/geosearch",
+                          params=dict(params, cursor=next_cursor))
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()["users"]] == [3]
+    assert response.json()["next_cursor"] is None
+    assert get_near_users.call_args[0][-2:] == (limit + 1, (1.0, 2))
+
+    # Last page may be empty.
+    get_near_users.return_value = []
+    response = client.get("/geosearch",
+                          params=dict(params, cursor=next_cursor))
+    assert response.status_code == 200
+    assert response.json() == {"users": [], "next_cursor": None}
+
+
+def test_get_users_by_location_invalid_page(mocker):
+    """Test paginating nearby users with invalid limit or cursor."""
+    mocker.patch('app.main.get_near_users', return_value=[])
+    params = {"longitude": 35.1, "latitude": 32.8, "radius": 50}
+    for invalid_params in ({"cursor": "INVALID"}, {"limit": 0},
+                           {"limit": 100000}):
+        response = client.get("/geosearch",
+                              params=dict(params, **invalid_params))
+        assert response.status_code in (400, 422)
+
+
+# Test /users/by_categories endpoint.
+
+def test_get_users_by_categories(mocker):
+    """Test getting users interested in any or all of categories."""
+    mocked_users = [MockedUser(id, fake.name(), fake.email(), fake.address(),
+                               float(fake.latitude()),
+                               float(fake.longitude()))
+                    for id in range(3)]
+    get_users = mocker.patch('app.main.get_users_by_categories',
+                             return_value=mocked_users)
+    response = client.get("/users/by_categories", params={"ids": [1, 2]})
+    assert response.status_code == 200
+    assert response.json() == {"users": [user.__dict__
+                                         for user in mocked_users],
+                               "next_cursor": None}
+    assert get_users.call_args[0][1:] == ([1, 2], False, 51, None)
+
+    response = client.get("/users/by_categories",
+                          params={"ids": [1, 2], "match": "all"})
+    assert response.status_code == 200
+    assert get_users.call_args[0][1:3] == ([1, 2], True)
+
+
+def test_get_users_by_categories_pages(mocker):
+    """Test paginating users by categories with cursor."""
+    limit = 2
+    mocked_users = [MockedUser(id, fake.name(), fake.email(), fake.address(),
+                               float(fake.latitude()),
+                               float(fake.longitude()))
+                    for id in range(limit + 1)]
+    get_users = mocker.patch('app.main.get_users_by_categories',
+                             return_value=mocked_users)
+    params = {"ids": [1], "limit": limit}
+    response = client.get("/users/by_categories", params=params)
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()["users"]] == [0, 1]
+    next_cursor = response.json()["next_cursor"]
+    assert next_cursor is not None
+
+    get_users.return_value = mocked_users[limit:]
+    response = client.get("/users/by_categories",
+                          params=dict(params, cursor=next_cursor))
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] is None
+    assert get_users.call_args[0][1:] == ([1], False, limit + 1, 1)
+
+
+def test_get_users_by_categories_invalid_request(mocker):
+    """Test getting users by categories with invalid parameters."""
+    mocker.patch('app.main.get_users_by_categories', return_value=[])
+    mocker.patch('app.main.CATEGORIES_SEARCH_MAX_SIZE', 2)
+    for params in ({}, {"ids": [1], "match": "some"},
+                   {"ids": [1], "cursor": "INVALID"}, {"ids": [1, 2, 3]},
+                   {"ids": [1], "limit": 0}):
+        response = client.get("/users/by_categories", params=params)
+        assert response.status_code in (400, 422)
+
+
+# Test /users/{id}/matches endpoint.
+
+def test_get_user_matches(mocker):
+    """Test getting ranked matches around user."""
+    user = MockedUser(1, fake.name(), fake.email(), fake.address(), 32.8,
+                      35.1)
+    user.categories_ids = [1, 2]
+    candidates = []
+    for id, categories_ids, distance in ((2, [1], 1.0), (3, [1, 2], 5.0)):
+        candidate = MockedUser(id, fake.name(), fake.email(), fake.address(),
+                               32.8, 35.1)
+        candidate.categories_ids = categories_ids
+        candidates.append((candidate, distance))
+    mocker.patch('app.main.get_user_by_id', return_value=user)
+    get_matching_users = mocker.patch('app.main.get_matching_users',
+                                      return_value=candidates)
+    response = client.get("/users/1/matches", params={"radius": 10})
+    assert response.status_code == 200
+    assert [match["id"] for match in response.json()] == [3, 2]
+    assert response.json()[0]["score"] == 0.75
+    get_matching_users.assert_called_with(mocker.ANY, 32.8, 35.1, 10,
+                                          [1, 2], exclude_id=1)
+
+    # Matching a book of the user, by the book categories.
+    response = client.get("/users/1/matches",
+                          params={"categories_ids": [2], "limit": 1})
+    assert response.status_code == 200
+    assert [match["id"] for match in response.json()] == [3]
+    assert get_matching_users.call_args[0][4] == [2]
+
+
+def test_get_user_matches_invalid_request(mocker):
+    """Test getting matches of missing user or without categories."""
+    mocker.patch('app.main.get_user_by_id', return_value=None)
+    response = client.get("/users/1/matches")
+    assert response.status_code == 404
+
+    user = MockedUser(1, fake.name(), fake.email(), fake.address(), 32.8,
+                      35.1)
+    user.categories_ids = []
+    mocker.patch('app.main.get_user_by_id', return_value=user)
+    get_matching_users = mocker.patch('app.main.get_matching_users')
+    response = client.get("/users/1/matches")
+    assert response.status_code == 200
+    assert response.json() == []
+    get_matching_users.assert_not_called()
+    response = client.get("/users/1/matches", params={"radius": 0})
+    assert response.status_code == 422
+
+
+# Test /users/nearest endpoint.
+
+def test_get_nearest_users(mocker):
+    """Test get k nearest users functionality."""
+    mocked_users = [(MockedUser(id, fake.name(), fake.email(),
+                                fake.address(), float(fake.latitude()),
+                                float(fake.longitude())), float(id))
+                    for id in range(3)]
+    get_nearest_users = mocker.patch('app.main.get_nearest_users',
+                                     return_value=mocked_users)
+    response = client.get("/users/nearest",
+                          params={"lat": 32.8, "lon": 35.1, "k": 3})
+    assert response.status_code == 200
+    assert response.json() == [dict(user.__dict__, distance=distance)
+                               for user, distance in mocked_users]
+    assert get_nearest_users.call_args[0][1:] == (32.8, 35.1, 3)
+
+
+def test_get_nearest_users_invalid_request(mocker):
+    """Test get k nearest users with invalid location or k."""
+    mocker.patch('app.main.get_nearest_users', return_value=[])
+    response = client.get("/users/nearest", params={"lat": 91, "lon": 35.1})
+    assert response.status_code == 400
+    response = client.get("/users/nearest",
+                          params={"lat": 32.8, "lon": 35.1, "k": 0})
+    assert response.status_code == 422
+    response = client.get("/users/nearest", params={"lat": 32.8, "lon": 35.1})
+    assert response.status_code == 404
+
+
+# Test /metrics endpoint.
+
+def test_metrics():
+    """Test exposing metrics in Prometheus text format."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "db_pool_checkout_wait_seconds_count" in response.text
+
+
+def get_requests_count(route, status):
+    """Get the recorded amount of GET requests of route and status."""
+    return REGISTRY.get_sample_value(
+        "http_requests_total",
+        {"method": "GET", "route": route, "status": status}) or 0
+
+
+def test_requests_metrics(mocker):
+    """Test recording requests metrics labelled by route template."""
+    count = get_requests_count("/users/nearest", "400")
+    response = client.get("/users/nearest", params={"lat": 91, "lon": 35.1})
+    assert response.status_code == 400
+    assert get_requests_count("/users/nearest", "400") == count + 1
+
+    count = get_requests_count("<unmatched>", "404")
+    assert client.get("/not/a/route").status_code == 404
+    assert get_requests_count("<unmatched>", "404") == count + 1
+
+    response = client.get("/metrics")
+    for metric in ("http_request_duration_seconds_bucket",
+                   "http_requests_in_progress",
+                   "http_response_size_bytes_sum"):
+        assert metric in response.text
+    assert 'route="/users/nearest"' in response.text
@@ -0,0 +1,73 @@
+"""Testing users replication to the books service."""
+import pytest
+import requests
+
+from app.books_feed import (notify_user_updated, notify_user_deleted,
+                            resync_users)
+
+
+@pytest.fixture
+def books_service(mocker):
+    """Enable replication to mocked books service, without retry delay."""
+    mocker.patch('app.books_feed.BOOKS_SERVICE_URL', "http://books")
+    mocker.patch('app.books_feed.BOOKS_SERVICE_RETRY_DELAY', 0)
+    return mocker.patch('app.books_feed.requests.request',
+                        return_value=mocker.Mock(status_code=200))
+
+
+def test_notify_user_updated(mocker, books_service):
+    """Test sending user location and categories to the books service."""
+    notify_user_updated(1, 32.8, 35.1, None)
+    books_service.assert_called_with("PUT", "http://books/feed/users/1",
+                                     timeout=mocker.ANY,
+                                     json={"latitude": 32.8,
+                                           "longitude": 35.1,
+                                           "categories_ids": []})
+    notify_user_deleted(1)
+    books_service.assert_called_with("DELETE", "http://books/feed/users/1",
+                                     timeout=mocker.ANY)
+
+
+def test_notify_disabled_or_failed(mocker, books_service):
+    """Test notifications without books service URL, or when it fails."""
+    books_service.side_effect = requests.ConnectionError
+    mocker.patch('app.books_feed.BOOKS_SERVICE_URL', None)
+    notify_user_deleted(1)
+    books_service.assert_not_called()
+
+    mocker.patch('app.books_feed.BOOKS_SERVICE_URL', "http://books")
+    mocker.patch('app.books_feed.BOOKS_SERVICE_RETRIES', 2)
+    notify_user_deleted(1)
+    assert books_service.call_count == 3
+
+
+def test_notify_retries(mocker, books_service):
+    """Test failed notifications are retried, client errors are not."""
+    books_service.side_effect = [requests.Timeout(),
+                                 mocker.Mock(status_code=503),
+                                 mocker.Mock(status_code=200)]
+    notify_user_updated(1, 32.8, 35.1, [1])
+    assert books_service.call_count == 3
+
+    books_service.reset_mock(side_effect=True)
+    books_service.return_value = mocker.Mock(status_code=404)
+    notify_user_deleted(1)  # Already removed.
+    books_service.assert_called_once()
+
+
+def test_resync_users(mocker, books_service):
+    """Test replicating all the users and removing deleted users."""
+    mocker.patch('app.books_feed.get_users_locations_and_categories',
+                 return_value=[(1, 32.8, 35.1, [1]), (2, 32.7, 35.0, None)])
+    books_service.return_value.json.return_value = [1, 3]
+    assert resync_users(None) == (2, 1)
+    assert [call[0] for call in books_service.call_args_list] == [
+        ("GET", "http://books/feed/users"),
+        ("PUT", "http://books/feed/users/1"),
+        ("PUT", "http://books/feed/users/2"),
+        ("DELETE", "http://books/feed/users/3")]
+
+    books_service.return_value.raise_for_status.side_effect = \
+        requests.HTTPError
+    with pytest.raises(requests.HTTPError):
+        resync_users(None)
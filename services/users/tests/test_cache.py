@@ -0,0 +1,60 @@
+"""Testing in-memory caches."""
+from prometheus_client import REGISTRY
+
+from app.cache import TTLCache, UsersCache
+
+
+def test_cache_get_and_set():
+    """Test caching values and counting hits and misses."""
+    cache = TTLCache("test_get_and_set", max_size=10, ttl=60)
+    assert cache.get("key") is None
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    labels = {"cache": "test_get_and_set"}
+    assert REGISTRY.get_sample_value("cache_hits_total", labels) == 1
+    assert REGISTRY.get_sample_value("cache_misses_total", labels) == 1
+
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_cache_expiration():
+    """Test expired entries are not returned."""
+    cache = TTLCache("test_expiration", max_size=10, ttl=0)
+    cache.set("key", "value")
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_cache_lru_eviction():
+    """Test evicting the least recently used entry."""
+    cache = TTLCache("test_eviction", max_size=2, ttl=60)
+    cache.set(1, "first")
+    cache.set(2, "second")
+    # Using the first entry, so the second is the least recently used.
+    assert cache.get(1) == "first"
+    cache.set(3, "third")
+    assert cache.get(2) is None
+    assert cache.get(1) == "first"
+    assert cache.get(3) == "third"
+
+
+def test_users_cache():
+    """Test caching users by id and email."""
+    cache = UsersCache(max_size=10, ttl=60)
+    user = {"id": 1, "email": "a@gmail.com"}
+    cache.set(user)
+    assert cache.get_by_id(1) == user
+    assert cache.get_by_email("a@gmail.com") == user
+
+    cache.invalidate(1)
+    assert cache.get_by_id(1) is None
+    assert cache.get_by_email("a@gmail.com") is None
+
+
+def test_users_cache_mixed_case_email():
+    """Test caching user stored with mixed case email, by lowercased email."""
+    cache = UsersCache(max_size=10, ttl=60)
+    user = {"id": 1, "email": "Alice@X.com"}
+    cache.set(user)
+    assert cache.get_by_email("alice@x.com") == user
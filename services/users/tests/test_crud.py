@@ -1,16 +1,28 @@
 """Testing CRUD calls."""
+import asyncio
+import hashlib
 import logging
 
 from faker import Faker
+from databases import Database
 
-from app.db.tables import Base
+from app.db.tables import Base, User
 from sqlalchemy import create_engine
 from contextlib2 import contextmanager
 from sqlalchemy.orm import sessionmaker
 from testing.postgresql import Postgresql
+from app.cache import users_cache
+from app.geo_index import users_index
 from app.db.crud import (get_near_users, add_user, get_all_users, delete_user,
                          get_user_by_id, is_authenticated_user,
-                         get_user_by_email, update_categories_to_user)
+                         get_user_by_email, update_categories_to_user,
+                         get_users_locations, get_nearest_users,
+                         get_users_locations_and_categories,
+                         fetch_user_by_id, fetch_user_by_email,
+                         fetch_user_categories, check_user_credentials,
+                         insert_users, fetch_users_by_ids,
+                         delete_user_by_id, get_users_by_categories,
+                         get_matching_users)
 
 # Tests logger.
 logger = logging.getLogger()
@@ -39,6 +51,15 @@ def mocked_transaction():
         s.close()
 
 
+def run_async_crud(crud_function, *args):
+    """Run async CRUD function with connection to the tests temp db."""
+    async def run():
+        async with Database(temp_test_db.url()) as database:
+            return await crud_function(database, *args)
+
+    return asyncio.run(run())
+
+
 def setup_function():
     """Initiating tests temp db in each test.
 
@@ -47,6 +68,7 @@ def setup_function():
     """
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
+    users_cache.clear()
     logger.info("Tests temp db was initiated")
 
 
@@ -173,10 +195,36 @@ def test_get_near_users():
         assert len(get_all_users(session)) == len(out_of_range_coordinates) + \
                len(in_range_coordinates)
 
-        result_users = get_near_users(session, latitude=base_coordinates[0],
-                                      longitude=base_coordinates[1],
-                                      radius=RADIUS)
+        result = get_near_users(session, latitude=base_coordinates[0],
+                                longitude=base_coordinates[1], radius=RADIUS)
+    result_users = [user for user, _ in result]
+    distances = [distance for _, distance in result]
     assert set(result_users) == set(in_range_users)
+    assert distances == sorted(distances)
+    assert distances[-1] <= RADIUS
+
+
+def test_get_near_users_pages():
+    """Test paginating nearby users with keyset cursor."""
+    RADIUS = 2  # KM
+    base_coordinates = (32.852310, 35.096149)
+    with mocked_transaction() as session:
+        # Two users on the same location are sorted by id.
+        for coordinate in [(32.853418, 35.092406), (32.853418, 35.092406),
+                           (32.852408, 35.090430), (32.845414, 35.078663)]:
+            add_user(session, fake.name(), fake.email(), fake.password(),
+                     fake.address(), coordinate[0], coordinate[1])
+
+        all_users = get_near_users(session, *base_coordinates, RADIUS)
+        first_page = get_near_users(session, *base_coordinates, RADIUS,
+                                    limit=2)
+        last_user, last_distance = first_page[-1]
+        second_page = get_near_users(session, *base_coordinates, RADIUS,
+                                     limit=2,
+                                     after=(last_distance, last_user.id))
+        assert first_page + second_page == all_users
+        assert get_near_users(session, *base_coordinates, RADIUS, limit=2,
+                              after=(RADIUS, 0)) == []
 
 
 def test_update_user_categories():
@@ -187,6 +235,297 @@ def test_update_user_categories():
         user = add_user(session, fake.name(), fake.email(), fake.password(),
                         fake.address(), fake.latitude(), fake.longitude())
         assert user is not None
-        update_categories_to_user(session, user.id, categories_ids)
+        updated = update_categories_to_user(session, user.id, categories_ids)
+        assert updated.id == user.id
+        assert updated.categories_ids == categories_ids
+        assert (updated.latitude, updated.longitude) == (user.latitude,
+                                                         user.longitude)
+        assert tuple(updated) in map(tuple, get_users_locations_and_categories(
+            session))
         user = get_user_by_id(session, user.id)
         assert user.categories_ids == categories_ids
+        assert update_categories_to_user(session, -1, categories_ids) is None
+
+
+def test_get_users_by_categories():
+    """Test getting users interested in any or all of categories."""
+    with mocked_transaction() as session:
+        users_ids = []
+        for categories_ids in ([1, 2], [2, 3], [1, 2, 3], [4]):
+            user = add_user(session, fake.name(), fake.email(),
+                            fake.password(), fake.address(), fake.latitude(),
+                            fake.longitude())
+            update_categories_to_user(session, user.id, categories_ids)
+            users_ids.append(user.id)
+
+        def get_ids(*args, **kwargs):
+            return [user.id for user in get_users_by_categories(
+                session, *args, **kwargs)]
+
+        assert get_ids([1, 3]) == users_ids[:3]
+        assert get_ids([1, 3], match_all=True) == [users_ids[2]]
+        assert get_ids([5]) == []
+        assert get_ids([2], limit=2) == users_ids[:2]
+        assert get_ids([2], limit=2, after_id=users_ids[1]) == \
+            [users_ids[2]]
+
+
+def test_get_matching_users():
+    """Test getting nearby users with overlapping categories."""
+    RADIUS = 2  # KM
+    base_coordinates = (32.852310, 35.096149)
+    with mocked_transaction() as session:
+        users_ids = []
+        for coordinate, categories_ids in [
+                ((32.853418, 35.092406), [1, 2]),  # 0.37 KM
+                ((32.852408, 35.090430), [3]),  # 0.54 KM
+                ((32.845414, 35.078663), [2, 5]),  # 1.81 KM
+                ((32.834380, 35.103056), [1])]:  # 2.09 KM
+            user = add_user(session, fake.name(), fake.email(),
+                            fake.password(), fake.address(), *coordinate)
+            update_categories_to_user(session, user.id, categories_ids)
+            users_ids.append(user.id)
+
+        for loaded in (False, True):
+            if loaded:
+                users_index.load(get_users_locations(session))
+            try:
+                matches = get_matching_users(session, *base_coordinates,
+                                             RADIUS, [1, 2])
+                assert [user.id for user, _ in matches] == \
+                    [users_ids[0], users_ids[2]]
+                assert matches[0][1] < matches[1][1] <= RADIUS
+                matches = get_matching_users(session, *base_coordinates,
+                                             RADIUS, [1, 2],
+                                             exclude_id=users_ids[0])
+                assert [user.id for user, _ in matches] == [users_ids[2]]
+            finally:
+                users_index.clear()
+
+
+def test_cached_user_invalidation():
+    """Test updating user invalidates the cached user."""
+    with mocked_transaction() as session:
+        user = add_user(session, fake.name(), fake.email(), "password",
+                        fake.address(), fake.latitude(), fake.longitude())
+        id, email = user.id, user.email
+        assert run_async_crud(fetch_user_categories, id) == []
+        assert users_cache.get_by_id(id) is not None
+        assert users_cache.get_by_email(email) is None
+
+        update_categories_to_user(session, id, [3])
+        assert users_cache.get_by_id(id) is None
+        assert run_async_crud(fetch_user_categories, id) == [3]
+
+        assert run_async_crud(fetch_user_by_email, email)["id"] == id
+        assert users_cache.get_by_email(email) is not None
+        delete_user(session, email, "password")
+        assert run_async_crud(fetch_user_by_email, email) is None
+
+
+def test_get_near_users_across_antimeridian():
+    """Test getting nearby users on both sides of the 180th meridian."""
+    RADIUS = 10  # KM
+    with mocked_transaction() as session:
+        in_range_users = [add_user(session, fake.name(), fake.email(),
+                                   fake.password(), fake.address(), 0,
+                                   longitude)
+                          for longitude in (179.99, -179.99)]
+        add_user(session, fake.name(), fake.email(), fake.password(),
+                 fake.address(), 0, 179.5)
+        result = get_near_users(session, latitude=0, longitude=179.95,
+                                radius=RADIUS)
+    assert [user for user, _ in result] == in_range_users
+
+
+def test_get_near_users_from_index():
+    """Test getting nearby users with the in-memory locations index."""
+    RADIUS = 2  # KM
+    base_coordinates = (32.852310, 35.096149)
+    with mocked_transaction() as session:
+        far_user = add_user(session, fake.name(), fake.email(),
+                            fake.password(), fake.address(), 32.834380,
+                            35.103056)  # 2.09 KM
+        try:
+            users_index.load(get_users_locations(session))
+            assert len(users_index) == 1
+
+            # Index is updated by the CRUD calls.
+            near_user = add_user(session, fake.name(), fake.email(),
+                                 "password", fake.address(), 32.853418,
+                                 35.092406)  # 0.37 KM
+            result = get_near_users(session, *base_coordinates, RADIUS)
+            assert [user for user, _ in result] == [near_user]
+
+            delete_user(session, near_user.email, "password")
+            assert get_near_users(session, *base_coordinates, RADIUS) == []
+            assert len(users_index) == 1
+            assert far_user.id in [id for _, id in users_index.search(
+                *base_coordinates, 3)]
+
+        finally:
+            users_index.clear()
+
+
+def test_get_nearest_users():
+    """Test getting the k nearest users with and without index."""
+    base_coordinates = (32.852310, 35.096149)
+    with mocked_transaction() as session:
+        users = [add_user(session, fake.name(), fake.email(),
+                          fake.password(), fake.address(), *coordinate)
+                 for coordinate in [(32.853418, 35.092406),  # 0.37 KM
+                                    (32.845414, 35.078663),  # 1.81 KM
+                                    (31.768319, 35.213710)]]  # 121 KM
+        result = get_nearest_users(session, *base_coordinates, 2)
+        assert [user for user, _ in result] == users[:2]
+        result = get_nearest_users(session, *base_coordinates, 5)
+        assert [user for user, _ in result] == users
+
+        try:
+            users_index.load(get_users_locations(session))
+            result = get_nearest_users(session, *base_coordinates, 2)
+            assert [user for user, _ in result] == users[:2]
+
+        finally:
+            users_index.clear()
+
+
+def test_fetch_exist_user():
+    """Test search exists user by id and email (async)."""
+    categories_ids = [1, 2]
+    with mocked_transaction() as session:
+        user = add_user(session, fake.name(), fake.email(), "password",
+                        fake.address(), fake.latitude(), fake.longitude())
+        update_categories_to_user(session, user.id, categories_ids)
+        id, email = user.id, user.email
+
+    assert run_async_crud(fetch_user_by_id, id)["email"] == email
+    assert run_async_crud(fetch_user_by_email, email)["id"] == id
+    assert run_async_crud(fetch_user_categories, id) == categories_ids
+    assert run_async_crud(check_user_credentials, email, "password") == id
+    assert run_async_crud(check_user_credentials, email, "wrong") is None
+
+
+def test_fetch_not_exist_user():
+    """Test search not exists user by id and email (async)."""
+    assert run_async_crud(fetch_user_by_id, -1) is None
+    assert run_async_crud(fetch_user_by_email, "not_existing_email") is None
+    assert run_async_crud(fetch_user_categories, -1) is None
+    # Out of the id column range.
+    assert run_async_crud(fetch_user_by_id, 2 ** 31) is None
+    assert run_async_crud(fetch_user_categories, 3000000000) is None
+    assert not run_async_crud(check_user_credentials, "not_existing_email",
+                              "password")
+
+
+def test_users_rows_projection():
+    """Test users rows have only the response fields."""
+    with mocked_transaction() as session:
+        user = add_user(session, fake.name(), fake.email(), fake.password(),
+                        fake.address(), fake.latitude(), fake.longitude())
+        user = get_user_by_email(session, user.email)
+        assert "password" not in user._fields
+        assert "join_date" not in user._fields
+        assert get_all_users(session)[0].id == user.id
+
+
+def test_insert_users():
+    """Test inserting many users, skipping taken emails."""
+    users_index.load([])
+    with mocked_transaction() as session:
+        taken_user = add_user(session, fake.name(), fake.email(),
+                              fake.password(), fake.address(), 32.1, 34.8)
+        users = [dict(name=fake.name(), email=email, password="hash",
+                      address=fake.address(), latitude=32.1, longitude=34.8,
+                      categories_ids=[])
+                 for email in (fake.email(), taken_user.email)]
+        inserted = insert_users(session, users)
+        assert [email for _, email in inserted] == [users[0]["email"]]
+        assert len(get_all_users(session)) == 2
+        assert len(users_index) == 2
+        assert insert_users(session, []) == []
+    users_index.clear()
+
+
+def test_fetch_users_by_ids():
+    """Test getting many users by ids (async, cached)."""
+    with mocked_transaction() as session:
+        ids = [add_user(session, fake.name(), fake.email(), fake.password(),
+                        fake.address(), fake.latitude(),
+                        fake.longitude()).id for _ in range(3)]
+
+    run_async_crud(fetch_user_by_id, ids[0])
+    users = run_async_crud(fetch_users_by_ids, ids + [-1, 2 ** 31])
+    assert set(users) == set(ids)
+    assert all(users[id]["id"] == id for id in ids)
+    assert users_cache.get_by_id(ids[2]) is not None
+    assert run_async_crud(fetch_users_by_ids, []) == {}
+
+
+def test_rehash_legacy_password():
+    """Test legacy MD5 password is rehashed after authentication."""
+    with mocked_transaction() as session:
+        user = add_user(session, fake.name(), fake.email(), "password",
+                        fake.address(), fake.latitude(), fake.longitude())
+        email = user.email
+        session.query(User).filter(User.email == email).update(
+            {"password": hashlib.md5(b"password").hexdigest()})
+        session.commit()
+
+    assert not run_async_crud(check_user_credentials, email, "wrong")
+    assert run_async_crud(check_user_credentials, email, "password")
+    with mocked_transaction() as session:
+        hashed_password = session.query(User.password).filter(
+            User.email == email).scalar()
+        assert hashed_password.startswith("scrypt$")
+        assert is_authenticated_user(session, email, "password")
+
+
+def test_delete_user_by_id():
+    """Test deleting user by id."""
+    with mocked_transaction() as session:
+        user = add_user(session, fake.name(), fake.email(), fake.password(),
+                        fake.address(), fake.latitude(), fake.longitude())
+        assert delete_user_by_id(session, user.id)
+        assert get_user_by_id(session, user.id) is None
+        assert not delete_user_by_id(session, user.id)
+
+
+def test_add_user_taken_email():
+    """Test adding user with taken email returns None."""
+    with mocked_transaction() as session:
+        email = fake.email()
+        user = add_user(session, fake.name(), email, fake.password(),
+                        fake.address(), fake.latitude(), fake.longitude())
+        assert user.email == email
+        assert "password" not in user.keys()
+        assert add_user(session, fake.name(), email, fake.password(),
+                        fake.address(), fake.latitude(),
+                        fake.longitude()) is None
+        assert len(get_all_users(session)) == 1
+
+
+def test_mixed_case_stored_email():
+    """Test users stored with mixed case emails, before the emails were
+    normalized, are found, authenticated and deleted by lowercased email."""
+    with mocked_transaction() as session:
+        user = add_user(session, fake.name(), "Alice@X.com", "password",
+                        fake.address(), fake.latitude(), fake.longitude())
+        assert get_user_by_email(session, "alice@x.com").id == user.id
+        assert is_authenticated_user(session, "alice@x.com", "password")
+        assert run_async_crud(fetch_user_by_email, "alice@x.com").id == \
+            user.id
+        assert run_async_crud(check_user_credentials, "alice@x.com",
+                              "password") == user.id
+
+        # A case variant of the email is taken.
+        assert add_user(session, fake.name(), "alice@x.com", "password",
+                        fake.address(), fake.latitude(),
+                        fake.longitude()) is None
+        assert insert_users(session, [dict(
+            name="name", email="alice@x.com", password="hash",
+            address="address", latitude=0, longitude=0,
+            categories_ids=[])]) == []
+
+        assert delete_user(session, "alice@x.com", "password") == user.id
+        assert get_user_by_email(session, "alice@x.com") is None
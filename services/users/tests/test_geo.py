@@ -0,0 +1,62 @@
+"""Testing geographic calculations."""
+import numpy as np
+
+from app.geo import (get_bounding_box, get_distance, get_distances,
+                     get_k_nearest)
+
+BASE_COORDINATES = (32.852310, 35.096149)
+COORDINATES = np.array([(32.845414, 35.078663),  # 1.81 KM
+                        (32.853418, 35.092406),  # 0.37 KM
+                        (32.832722, 35.081751),  # 2.56 KM
+                        (32.852408, 35.090430)])  # 0.54 KM
+
+
+def test_bounding_box_contains_radius():
+    """Test bounding box edges are in the radius distance."""
+    min_latitude, max_latitude, min_longitude, max_longitude = \
+        get_bounding_box(32.852310, 35.096149, 2)
+    # 2 KM are ~0.018 latitude degrees.
+    assert round(32.852310 - min_latitude, 3) == 0.018
+    assert round(max_latitude - 32.852310, 3) == 0.018
+    assert min_longitude < 35.096149 < max_longitude
+    # Longitude degrees are shorter than latitude degrees far from equator.
+    assert max_longitude - 35.096149 > max_latitude - 32.852310
+
+
+def test_bounding_box_crosses_antimeridian():
+    """Test bounding box that crosses the 180th meridian."""
+    _, _, min_longitude, max_longitude = get_bounding_box(0, 179.99, 10)
+    assert min_longitude > max_longitude
+    assert 179.9 < min_longitude < 179.99
+    assert -180 < max_longitude < -179.9
+
+
+def test_bounding_box_contains_pole():
+    """Test bounding box that contains the north pole."""
+    min_latitude, max_latitude, min_longitude, max_longitude = \
+        get_bounding_box(89.95, 10, 20)
+    assert max_latitude == 90
+    assert min_latitude < 89.95
+    assert (min_longitude, max_longitude) == (-180, 180)
+
+
+def test_distances_match_scalar_distance():
+    """Test vectorized distances equal the scalar calculation."""
+    distances = get_distances(*BASE_COORDINATES, COORDINATES[:, 0],
+                              COORDINATES[:, 1])
+    expected = [get_distance(*BASE_COORDINATES, latitude, longitude)
+                for latitude, longitude in COORDINATES]
+    assert np.allclose(distances, expected)
+
+
+def test_k_nearest():
+    """Test getting the k nearest coordinates sorted by distance."""
+    indices, distances = get_k_nearest(*BASE_COORDINATES, COORDINATES[:, 0],
+                                       COORDINATES[:, 1], 3)
+    assert indices.tolist() == [1, 3, 0]
+    assert distances.tolist() == sorted(distances.tolist())
+
+    # k bigger than the coordinates amount.
+    indices, _ = get_k_nearest(*BASE_COORDINATES, COORDINATES[:, 0],
+                               COORDINATES[:, 1], 10)
+    assert indices.tolist() == [1, 3, 0, 2]
@@ -0,0 +1,93 @@
+"""Testing in-memory users locations index."""
+from app.geo_index import GridIndex
+
+BASE_COORDINATES = (32.852310, 35.096149)
+IN_RANGE_LOCATIONS = [(1, 32.853418, 35.092406),  # 0.37 KM
+                      (2, 32.852408, 35.090430),  # 0.54 KM
+                      (3, 32.845414, 35.078663)]  # 1.81 KM
+OUT_OF_RANGE_LOCATIONS = [(4, 32.834380, 35.103056),  # 2.09 KM
+                          (5, 32.840005, 35.069641)]  # 2.83 KM
+RADIUS = 2  # KM
+
+
+def get_loaded_index():
+    """Create index with the tests locations."""
+    index = GridIndex(cell_size=0.01)
+    index.load(IN_RANGE_LOCATIONS + OUT_OF_RANGE_LOCATIONS)
+    return index
+
+
+def test_search_in_radius():
+    """Test searching users in radius sorted by distance."""
+    index = get_loaded_index()
+    result = index.search(*BASE_COORDINATES, RADIUS)
+    assert [id for _, id in result] == [1, 2, 3]
+    distances = [distance for distance, _ in result]
+    assert distances == sorted(distances)
+    assert 1.8 < distances[-1] < RADIUS
+
+
+def test_search_with_big_radius():
+    """Test searching with radius that covers the whole globe."""
+    index = get_loaded_index()
+    result = index.search(*BASE_COORDINATES, 30000)
+    assert [id for _, id in result] == [1, 2, 3, 4, 5]
+
+
+def test_search_across_antimeridian():
+    """Test searching users on both sides of the 180th meridian."""
+    index = GridIndex()
+    index.load([(1, 0, 179.99), (2, 0, -179.99), (3, 0, 179.5)])
+    assert [id for _, id in index.search(0, 179.95, 10)] == [1, 2]
+
+
+def test_add_move_and_remove():
+    """Test keeping the index updated."""
+    index = get_loaded_index()
+    index.add(6, 32.852310, 35.096149)
+    assert index.search(*BASE_COORDINATES, RADIUS)[0] == (0, 6)
+
+    # Moving user location.
+    index.add(6, 0, 0)
+    assert 6 not in [id for _, id in index.search(*BASE_COORDINATES, RADIUS)]
+    assert len(index) == 6
+
+    index.remove(6)
+    index.remove(1)
+    assert [id for _, id in index.search(*BASE_COORDINATES, RADIUS)] == [2, 3]
+    assert len(index) == 4
+
+
+def test_not_loaded_index_ignores_updates():
+    """Test that updates before loading are ignored."""
+    index = GridIndex()
+    index.add(1, *BASE_COORDINATES)
+    assert not index.is_loaded
+    assert len(index) == 0
+
+    index.load([])
+    index.add(1, *BASE_COORDINATES)
+    assert len(index) == 1
+
+    index.clear()
+    assert not index.is_loaded
+    assert len(index) == 0
+
+
+def test_nearest():
+    """Test getting the k nearest users."""
+    index = get_loaded_index()
+    assert [id for _, id in index.nearest(*BASE_COORDINATES, 2)] == [1, 2]
+    assert [id for _, id in index.nearest(*BASE_COORDINATES, 10)] == \
+        [1, 2, 3, 4, 5]
+
+
+def test_nearest_far_users():
+    """Test getting nearest users far from the location."""
+    index = get_loaded_index()
+    index.add(6, -33.86, 151.2)
+    result = index.nearest(-33.8, 151, 2)
+    assert len(result) == 2
+    assert result[0][1] == 6
+    assert result[1][0] > 10000
+    assert GridIndex().nearest(*BASE_COORDINATES, 3) == []
@@ -0,0 +1,109 @@
+"""Testing bulk users import."""
+import json
+
+import pytest
+
+from app.passwords import verify_password
+from app.imports import UsersImport, parse_user, import_users
+
+CSV_HEADER = "name,email,password,address,latitude,longitude"
+
+
+def create_record(email="user@gmail.com", latitude=32.1, longitude=34.8):
+    """Create valid user record."""
+    return {"name": "User", "email": email, "password": "password",
+            "address": "Address", "latitude": latitude,
+            "longitude": longitude}
+
+
+def mock_insert_users(mocker, taken_emails=()):
+    """Mock users insertion, emails that are taken are not inserted."""
+    taken_emails = set(taken_emails)
+
+    def insert_users(session, users):
+        inserted = [(id, user["email"]) for id, user in enumerate(users)
+                    if user["email"] not in taken_emails]
+        taken_emails.update(email for _, email in inserted)
+        return inserted
+
+    return mocker.patch('app.imports.insert_users', side_effect=insert_users)
+
+
+def test_parse_user():
+    """Test validating imported user."""
+    user = parse_user(dict(create_record(), latitude="0", longitude="1.5"))
+    assert (user["latitude"], user["longitude"]) == (0, 1.5)
+    assert user["categories_ids"] == []
+
+    with pytest.raises(ValueError, match="Missing fields: password"):
+        parse_user(dict(create_record(), password=""))
+
+    with pytest.raises(ValueError, match="Email is invalid"):
+        parse_user(create_record(email="invalid"))
+
+    with pytest.raises(ValueError, match="Illegal latitude"):
+        parse_user(create_record(latitude="north"))
+
+    with pytest.raises(ValueError, match="Illegal latitude"):
+        parse_user(create_record(latitude=100))
+
+    for coordinate in ([32.1], {"value": 32.1}):
+        with pytest.raises(ValueError, match="Illegal latitude"):
+            parse_user(create_record(latitude=coordinate))
+
+    with pytest.raises(ValueError, match="NUL characters"):
+        parse_user(dict(create_record(), name="User\x00"))
+
+
+def test_import_csv(mocker):
+    """Test importing CSV lines in batches, with errors report."""
+    insert = mock_insert_users(mocker, taken_emails={"taken@gmail.com"})
+    lines = [CSV_HEADER,
+             "User,first@gmail.com,password,\"Street 1, City\",32.1,34.8",
+             "User,invalid,password,Address,32.1,34.8",
+             "",
+             "User,taken@gmail.com,password,Address,32.1,34.8",
+             "User,second@gmail.com,password,Address,32.1,34.8",
+             "User,first@gmail.com,password,Address,32.1,34.8",
+             "User,third@gmail.com"]
+    users_import = UsersImport("csv", batch_size=2)
+    for line in lines:
+        if users_import.add_line(line):
+            users_import.insert_batch(None)
+    users_import.insert_batch(None)
+
+    assert users_import.imported == 2
+    assert users_import.sorted_errors == [
+        (3, "Email is invalid."), (5, "Email is already taken."),
+        (7, "Email is already taken."), (8, "Expected 6 values.")]
+    assert insert.call_count == 2
+    first_user = insert.call_args_list[0][0][1][0]
+    assert first_user["address"] == "Street 1, City"
+    assert verify_password("password", first_user["password"])
+
+
+def test_import_invalid_csv_lines(mocker):
+    """Test CSV lines the CSV reader rejects are reported."""
+    mock_insert_users(mocker)
+    lines = [CSV_HEADER,
+             "User,first@gmail.com,password," + "a" * 200 * 1000 +
+             ",32.1,34.8",
+             "User\x00,second@gmail.com,password,Address,32.1,34.8",
+             "User,third@gmail.com,password,Address,32.1,34.8"]
+    users_import = import_users(None, lines, "csv")
+    assert users_import.imported == 1
+    assert users_import.sorted_errors[0] == (2, "Line is not valid CSV.")
+    assert users_import.sorted_errors[1][0] == 3
+
+
+def test_import_ndjson(mocker):
+    """Test importing NDJSON lines."""
+    mock_insert_users(mocker)
+    lines = [json.dumps(create_record("first@gmail.com")), "{invalid",
+             json.dumps(create_record("first@gmail.com")), "[]"]
+    users_import = import_users(None, lines, "ndjson")
+    assert users_import.imported == 1
+    assert users_import.sorted_errors == [
+        (2, "Line is not valid JSON."),
+        (3, "Email is duplicated in the import."),
+        (4, "User should be an object.")]
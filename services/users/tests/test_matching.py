@@ -0,0 +1,30 @@
+"""Testing books exchange matching scores and ranking."""
+from collections import namedtuple
+
+from app.matching import get_match_score, rank_matches
+
+Candidate = namedtuple("Candidate", ("id", "categories_ids"))
+RADIUS = 10  # KM
+
+
+def test_match_score():
+    """Test scoring by closeness and categories interest."""
+    assert get_match_score(0, RADIUS, 2, 2) == 1
+    assert get_match_score(RADIUS, RADIUS, 0, 2) == 0
+    assert get_match_score(5, RADIUS, 1, 2, distance_weight=0.5) == 0.5
+    assert get_match_score(5, RADIUS, 2, 2, distance_weight=0) == 1
+    assert get_match_score(5, RADIUS, 2, 2, distance_weight=1) == 0.5
+
+
+def test_rank_matches():
+    """Test ranking by score, then by distance and id."""
+    candidates = [(Candidate(1, [1]), 1.0),
+                  (Candidate(2, [1, 2]), 1.0),
+                  (Candidate(3, [1, 2, 7]), 9.0),
+                  (Candidate(4, [2]), 1.0),
+                  (Candidate(5, None), 0.0)]
+    matches = rank_matches(candidates, [1, 2], RADIUS)
+    assert [user.id for user, _, _ in matches] == [2, 1, 4, 3, 5]
+    scores = [score for _, _, score in matches]
+    assert scores == sorted(scores, reverse=True)
+    assert rank_matches(candidates, [1, 2], RADIUS, limit=2) == matches[:2]
@@ -0,0 +1,46 @@
+"""Testing passwords hashing."""
+import hashlib
+
+from app.passwords import (hash_password, hash_passwords, verify_password,
+                           needs_rehash, run_in_pool, SCRYPT_N)
+
+# Low cost for fast tests.
+TEST_COST = dict(n=2 ** 8, r=8, p=1)
+
+
+def test_hash_password():
+    """Test hashing is salted and hides the password."""
+    hashed_password = hash_password("password", **TEST_COST)
+    assert hashed_password.startswith("scrypt$256$8$1$")
+    assert hashed_password != hash_password("password", **TEST_COST)
+    assert "password" not in hashed_password
+    # Fits the users password column.
+    assert len(hash_password("password")) < 100
+
+
+def test_verify_password():
+    """Test verifying scrypt and legacy MD5 hashes."""
+    hashed_password = hash_password("password", **TEST_COST)
+    assert verify_password("password", hashed_password)
+    assert not verify_password("other password", hashed_password)
+
+    legacy_hash = hashlib.md5(b"password").hexdigest()
+    assert verify_password("password", legacy_hash)
+    assert not verify_password("other password", legacy_hash)
+
+
+def test_needs_rehash():
+    """Test legacy and outdated cost hashes need rehash."""
+    assert needs_rehash(hashlib.md5(b"password").hexdigest())
+    assert needs_rehash(hash_password("password", **TEST_COST))
+    assert not needs_rehash(hash_password("password", n=SCRYPT_N))
+
+
+def test_hash_passwords():
+    """Test hashing many passwords in the pool keeps their order."""
+    passwords = [f"password{index}" for index in range(20)]
+    hashed_passwords = hash_passwords(passwords)
+    assert all(verify_password(password, hashed_password)
+               for password, hashed_password in zip(passwords,
+                                                    hashed_passwords))
+    assert run_in_pool(verify_password, passwords[0], hashed_passwords[0])
@@ -0,0 +1,39 @@
+"""Testing session tokens."""
+from app.tokens import create_token, verify_token, tokens_cache
+
+
+def setup_function():
+    """Emptying the verified tokens cache in each test.
+
+    Notes:
+        Startup function.
+    """
+    tokens_cache.clear()
+
+
+def test_verify_token():
+    """Test verifying issued token."""
+    token = create_token(1)
+    assert verify_token(token) == 1
+    # Second verification is served from the cache.
+    assert len(tokens_cache) == 1
+    assert verify_token(token) == 1
+
+
+def test_verify_invalid_token():
+    """Test verifying forged, malformed and expired tokens."""
+    payload, signature = create_token(1).split(".")
+    other_payload = create_token(2).split(".")[0]
+    assert verify_token(f"{other_payload}.{signature}") is None
+    assert verify_token(payload) is None
+    assert verify_token("") is None
+    assert verify_token(create_token(1, ttl=-1)) is None
+    assert len(tokens_cache) == 1  # Only the expired, validly signed one.
+
+
+def test_verify_non_ascii_token():
+    """Test verifying tokens with non ASCII characters."""
+    payload, signature = create_token(1).split(".")
+    assert verify_token(f"{payload}.\xe9") is None
+    assert verify_token(f"{payload}.{signature}\xe9") is None
+    assert verify_token(f"\xe9{payload}.{signature}") is None
@@ -0,0 +1,49 @@
+"""Testing users fields validations."""
+from time import perf_counter
+
+import pytest
+from pydantic import ValidationError
+
+from app.schemas import NewUserRequest, UserAuthenticationRequest
+from app.validators import EMAIL_REGEX, is_valid_email, normalize_email
+
+
+def test_is_valid_email():
+    """Test the whole text should be an email."""
+    assert is_valid_email("user.name@mail.example.com")
+    assert not is_valid_email("user@mail")
+    assert not is_valid_email("text user@mail.com")
+    assert not is_valid_email("user@mail.com text")
+    assert not is_valid_email("user@" + "mail." * 20 + "com")
+
+
+def test_is_valid_email_long_input():
+    """Test emails are matched in linear time, without backtracking."""
+    email = "a@" + "a." * 16000 + "!"
+    start = perf_counter()
+    assert EMAIL_REGEX.fullmatch(email) is None
+    assert perf_counter() - start < 0.5
+    assert not is_valid_email(email)
+
+
+def test_normalize_email():
+    """Test emails are compared lowercased and without spaces."""
+    assert normalize_email(" User@Mail.COM ") == "user@mail.com"
+
+
+def test_requests_email_validation():
+    """Test requests normalize valid emails and reject invalid ones."""
+    request = UserAuthenticationRequest(email="User@Mail.com",
+                                        password="password")
+    assert request.email == "user@mail.com"
+    with pytest.raises(ValidationError):
+        UserAuthenticationRequest(email="user@", password="password")
+
+    with pytest.raises(ValidationError):
+        UserAuthenticationRequest(email="a@" + "a." * 16000 + "!",
+                                  password="password")
+
+    with pytest.raises(ValidationError):
+        NewUserRequest(email="invalid", name="User", address="Address",
+                       password="password", password2="password",
+                       latitude=0, longitude=0)